@@ -0,0 +1,194 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Assignment of labels to memories.
+
+Every label is kept by one memory, and a memory may keep several labels.
+Labels may be grouped consecutively (as many labels per memory), in
+arbitrary groups, by the subtrees at a level of a hierarchy of labels, or
+by clustering the features of labels. Vectors are partitioned among
+memories with one sort, so memories are filled in bulk whatever their
+number.
+"""
+
+import json
+import numpy as np
+
+import constants
+from running_stats import RunningStats
+
+
+class LabelAssignment(object):
+    """ The memory of every label.
+    """
+
+    def __init__(self, memory_of):
+        memory_of = np.asarray(memory_of, dtype=int)
+        if (memory_of.ndim != 1) or (len(memory_of) == 0) or (memory_of.min() < 0):
+            raise ValueError('Every label must have a memory')
+        self.memory_of = memory_of
+        self.n_memories = int(memory_of.max()) + 1
+        if np.any(np.bincount(memory_of, minlength=self.n_memories) == 0):
+            raise ValueError('Every memory must have a label')
+
+    @property
+    def n_labels(self):
+        return len(self.memory_of)
+
+    def memories(self, labels):
+        """ Returns the memory of every label given.
+        """
+        return self.memory_of[np.asarray(labels, dtype=int)]
+
+    def labels(self, memory):
+        return np.nonzero(self.memory_of == memory)[0]
+
+    def partition(self, memories):
+        """ Returns the order that groups items by memory, and the bounds of groups.
+
+        Items of memory m are order[bounds[m]:bounds[m+1]], in their
+        original order. Items with no memory (negative) are left out.
+        """
+        memories = np.asarray(memories, dtype=int)
+        order = np.argsort(memories, kind='stable')
+        order = order[memories[order] >= 0]
+        counts = np.bincount(memories[order], minlength=self.n_memories)
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        return order, bounds
+
+    def split(self, vectors, labels):
+        """ Returns the vectors of every memory, according to their labels.
+        """
+        order, bounds = self.partition(self.memories(labels))
+        grouped = vectors[order]
+        return [grouped[bounds[m]:bounds[m+1]] for m in range(self.n_memories)]
+
+    def fit(self, features, labels):
+        """ Returns the assignment for the features of a fold: itself, as it is fixed.
+        """
+        return self
+
+
+def grouped(labels_per_memory, n_labels = constants.n_labels) -> LabelAssignment:
+    """ Assigns consecutive labels to memories, as many to each one.
+    """
+    if labels_per_memory < 1:
+        raise ValueError('There must be at least a label per memory, not ' + str(labels_per_memory))
+    return LabelAssignment(np.arange(n_labels) // labels_per_memory)
+
+
+def from_groups(groups, n_labels = constants.n_labels) -> LabelAssignment:
+    """ Assigns the labels of every group (a sequence of labels) to a memory.
+    """
+    memory_of = np.full(n_labels, -1)
+    for m, group in enumerate(groups):
+        if np.any(memory_of[list(group)] >= 0):
+            raise ValueError('Labels may only be in a group')
+        memory_of[list(group)] = m
+    return LabelAssignment(memory_of)
+
+
+def _leaves(tree):
+    if isinstance(tree, (list, tuple)):
+        return [label for subtree in tree for label in _leaves(subtree)]
+    return [tree]
+
+
+def _subtrees(tree, level):
+    if (level == 0) or not isinstance(tree, (list, tuple)):
+        return [tree]
+    return [s for subtree in tree for s in _subtrees(subtree, level - 1)]
+
+
+def hierarchical(tree, level, n_labels = constants.n_labels) -> LabelAssignment:
+    """ Assigns to a memory the labels of every subtree at a level of a hierarchy.
+
+    The hierarchy is given as nested lists with labels as leaves; level 1
+    makes a memory per child of the root, and deeper levels finer memories.
+    """
+    return from_groups([_leaves(s) for s in _subtrees(tree, level)], n_labels)
+
+
+def clustered(features, labels, n_memories, n_labels = constants.n_labels,
+        rng = None, iterations = 100) -> LabelAssignment:
+    """ Assigns labels to memories by k-means of the means of their features.
+
+    Labels whose features are alike end up in the same memory. Clusters
+    that get empty keep the label farthest from its centre, among those of
+    clusters with more than a label.
+    """
+    rng = np.random.default_rng(rng)
+    features = np.asarray(features).reshape((len(labels), -1))
+    stats = RunningStats(n_labels, features.shape[1])
+    stats.add(features, labels)
+    means = stats.mean
+
+    centres = means[rng.choice(n_labels, n_memories, replace=False)]
+    memory_of = np.full(n_labels, -1)
+    for i in range(iterations):
+        distances = np.square(means[:, np.newaxis, :] - centres[np.newaxis, :, :]).sum(axis=2)
+        nearest = distances.argmin(axis=1)
+        sizes = np.bincount(nearest, minlength=n_memories)
+        for m in np.nonzero(sizes == 0)[0]:
+            # Only labels of clusters that keep some other label may leave.
+            spread = np.where(sizes[nearest] > 1, distances[np.arange(n_labels), nearest], -1)
+            farthest = spread.argmax()
+            sizes[nearest[farthest]] -= 1
+            sizes[m] = 1
+            nearest[farthest] = m
+            distances[farthest] = 0
+        if np.array_equal(nearest, memory_of):
+            break
+        memory_of = nearest
+        centres = np.stack([means[memory_of == m].mean(axis=0) for m in range(n_memories)])
+    return LabelAssignment(memory_of)
+
+
+class Clustering(object):
+    """ Assignment by clustering, made from the features of every fold.
+
+    It takes the place of a LabelAssignment until fit, which returns the
+    assignment of the fold.
+    """
+
+    def __init__(self, n_memories, seed = None, n_labels = constants.n_labels):
+        if not (0 < n_memories <= n_labels):
+            raise ValueError('There must be between 1 and ' + str(n_labels)
+                + ' clusters, not ' + str(n_memories))
+        self.n_memories = n_memories
+        self.n_labels = n_labels
+        self.seed = seed
+
+    def fit(self, features, labels) -> LabelAssignment:
+        return clustered(features, labels, self.n_memories, self.n_labels, self.seed)
+
+
+def read_groups(filename, n_labels = constants.n_labels) -> LabelAssignment:
+    """ Reads an assignment from a JSON file.
+
+    The file holds either a list of groups of labels, or an object with the
+    hierarchy of labels ("tree") and the level of its subtrees ("level").
+    """
+    with open(filename) as f:
+        groups = json.load(f)
+    if isinstance(groups, dict):
+        return hierarchical(groups['tree'], groups['level'], n_labels)
+    return from_groups(groups, n_labels)
+
+
+def experiment_assignment(experiment) -> LabelAssignment:
+    """ Returns the assignment of the memories measured by an experiment.
+    """
+    return grouped(constants.labels_per_memory[experiment])
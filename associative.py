@@ -16,10 +16,14 @@
 # File originally create by Raul Peralta-Lozada.
 
 import numpy as np
-import random
+import copy
+import struct
+import threading
 import time
 
 import constants
+import executors
+import instrumentation
 
 class AssociativeMemoryError(Exception):
     pass
@@ -39,6 +43,9 @@ class AssociativeMemory(object):
         self.m = m
         self.t = tolerance
 
+        # Number of vectors registered in the memory.
+        self.fill = 0
+
         # it is m+1 to handle partial functions.
         self.relation = np.zeros((self.m, self.n), dtype=np.bool)
 
@@ -82,6 +89,7 @@ class AssociativeMemory(object):
                 new_relation.dtype == np.bool and
                 new_relation.shape == (self.m, self.n)):
             self._relation = new_relation
+            self._sampling = None
         else:
             raise ValueError('Invalid relation assignment.')
 
@@ -89,13 +97,25 @@ class AssociativeMemory(object):
     def entropy(self) -> float:
         """Return the entropy of the Associative Memory."""
         e = 0.0  # entropy
-        v = self.relation.sum(axis=0)  # number of marked cells in the columns
+        v = self.column_counts()  # number of marked cells in the columns
         for vi in v:
             if vi != 0:
                 e += np.log2(1.0 / vi)
         e *= (-1.0 / self.n)
         return e
 
+    def save(self, filename) -> None:
+        """Saves the memory in the compact format of save_memories."""
+        save_memories({0: self}, filename)
+
+    @classmethod
+    def load(cls, filename, mmap = True) -> 'AssociativeMemory':
+        """Loads a memory saved with save (or the first one in a container)."""
+        ams = load_memories(filename, mmap)
+        if len(ams) == 0:
+            raise AssociativeMemoryError('No memories stored in ' + str(filename))
+        return ams[min(ams)]
+
     # @classmethod
     # def from_relation(cls, relation: np.ndarray) -> 'AssociativeMemory':
     #     associative_mem = cls(relation.shape[1], relation.shape[0])
@@ -120,42 +140,11 @@ class AssociativeMemory(object):
         return relation
 
 
-    # Choose a value for feature i.
-    def choose(self, i, v):
-
-        if self.is_undefined(v) or not self.relation[v,i]:
-            values = []
-            for j in range(self.m):
-                if self.relation[j,i]:
-                    values.append(j)
-            if len(values) == 0:
-                return self.undefined
-            else:
-                j = random.randrange(len(values))
-                k = values[j]
-                return k
-        else:
-            min = v
-            max = v
-
-            for j in range(v, -1, -1):
-                if self.relation[j,i]:
-                    min = j
-                else:
-                    break
-
-            for j in range(v, self.m):
-                if self.relation[j,i]:
-                    max = j
-                else:
-                    break
-
-            if min == max:
-                return v
-            else:
-                k = round(random.triangular(min, max, v))
-                return k
-                 
+    def column(self, i):
+        """ Returns the cells of the relation for feature i.
+        """
+        return self.relation[:, i]
+
 
     def abstract(self, r_io) -> None:
         self.relation = self.relation | r_io
@@ -166,12 +155,91 @@ class AssociativeMemory(object):
 
 
     # Reduces a relation to a function
-    def lreduce(self, vector):
-        v = np.full(self.n, self.undefined)
+    def lreduce(self, vector, rng = None):
+        return self.lreduce_many(np.ravel(vector)[np.newaxis, :], rng)[0]
+
+
+    def sampling_tables(self):
+        """ Returns the tables lreduce_many samples from, computing them if needed.
+
+        For every cell of the relation, the first and last values of the run
+        of marked cells it belongs to (the limits of the triangular
+        distribution of lreduce_many), and per column, the number of marked cells
+        and their values sorted at the top of the column. The tables are
+        kept until the relation changes.
+        """
+        if self._sampling is None:
+            relation = self.relation
+            values = np.arange(self.m)[:, np.newaxis]
+            last_unmarked = np.maximum.accumulate(
+                np.where(relation, -1, values), axis=0)
+            next_unmarked = np.minimum.accumulate(
+                np.where(relation, self.m, values)[::-1], axis=0)[::-1]
+            counts = np.count_nonzero(relation, axis=0)
+            marked = np.argsort(~relation, axis=0, kind='stable')
+            self._sampling = (last_unmarked + 1, next_unmarked - 1, counts, marked)
+        return self._sampling
+
+
+    def runs(self, values):
+        """ Tells which cells (values, feature) are marked, and their runs limits.
+
+        values is a matrix with a row per vector, and each value must be
+        within the range of the memory.
+        """
+        lower, upper, _, _ = self.sampling_tables()
+        columns = np.arange(self.n)
+        return self.contains(values), lower[values, columns], upper[values, columns]
+
+
+    def column_counts(self):
+        """ Returns the number of marked cells per feature.
+        """
+        if self._sampling is None:
+            return np.count_nonzero(self.relation, axis=0)
+        return self._sampling[2]
+
+
+    def marked(self, k, columns):
+        """ Returns the k-th marked value (from the bottom) of the columns given.
+        """
+        return self.sampling_tables()[3][k, columns]
 
-        for i in range(self.n):
-            v[i] = self.choose(i, vector[i])
 
+    def lreduce_many(self, vectors, rng = None):
+        """ Reduces the relation to a function for every row of vectors.
+
+        A feature whose value is marked takes a value from the triangular
+        distribution over the run of marked cells it belongs to, with its
+        mode at the value; any other feature takes one of the marked values
+        of its column at random, or is undefined if there is none. All the
+        variates are drawn at once from rng, which may be a numpy Generator,
+        a SeedSequence or a seed (a new generator is used if it is None).
+        """
+        rng = np.random.default_rng(rng)
+        vectors = np.asarray(vectors).reshape((-1, self.n))
+        self.sampling_tables()
+        counts = self.column_counts()
+        columns = np.broadcast_to(np.arange(self.n), vectors.shape)
+
+        defined = ~np.isnan(vectors) & (vectors >= 0) & (vectors < self.m)
+        values = np.where(defined, vectors, 0).astype(int)
+        inside, low, high = self.runs(values)
+        inside = defined & inside
+        triangular = inside & (low < high)
+        exact = inside & (low == high)
+        uniform = ~inside & (counts[columns] > 0)
+
+        v = np.full(vectors.shape, self.undefined)
+        v[exact] = values[exact]
+        if triangular.any():
+            v[triangular] = np.round(rng.triangular(
+                low[triangular], values[triangular], high[triangular]))
+        if uniform.any():
+            k = rng.integers(0, counts[columns[uniform]])
+            v[uniform] = self.marked(k, columns[uniform])
+        if _original_methods:
+            _count_branches(self, inside, exact, uniform)
         return v
 
 
@@ -191,6 +259,62 @@ class AssociativeMemory(object):
 
         r_io = self.vector_to_relation(vector)
         self.abstract(r_io)
+        self.fill += 1
+
+
+    def register_many(self, vectors) -> None:
+        """ Registers all the rows of a matrix of vectors at once.
+        """
+        vectors = np.asarray(vectors).reshape((-1, self.n))
+        if len(vectors) == 0:
+            return
+        if vectors.max() > self.m or vectors.min() < 0:
+            raise ValueError('Values in the input vectors are invalid.')
+
+        # As in vector_to_relation, vectors out of range register nothing.
+        valid = vectors[(vectors < self.m).all(axis=1)]
+        self.relation[valid, np.arange(self.n)] = True
+        self._sampling = None
+        self.fill += len(vectors)
+
+
+    def cell_keys(self, vectors):
+        """ Returns the (sorted, unique) keys feature*m + value of the cells
+        registering vectors would mark.
+        """
+        vectors = np.asarray(vectors).reshape((-1, self.n))
+        if len(vectors) == 0:
+            return np.zeros(0, dtype=np.int64)
+        if vectors.max() > self.m or vectors.min() < 0:
+            raise ValueError('Values in the input vectors are invalid.')
+        valid = vectors[(vectors < self.m).all(axis=1)].astype(np.int64)
+        return np.unique(np.arange(self.n)*self.m + valid)
+
+
+    def unmarked_counts(self, vectors):
+        """ Returns, per feature, the number of cells not yet marked that
+        registering vectors would mark.
+        """
+        keys = self.cell_keys(vectors)
+        new = keys[~self.relation[keys % self.m, keys // self.m]]
+        return np.bincount(new // self.m, minlength=self.n)
+
+
+    def copy(self) -> 'AssociativeMemory':
+        """ Returns a copy of the memory that can be changed on its own.
+        """
+        other = copy.copy(self)
+        other._relation = np.array(self._relation)
+        return other
+
+
+    def merge(self, other) -> None:
+        """ Adds to this memory all that has been registered in other.
+        """
+        if (self.n != other.n) or (self.m != other.m):
+            raise AssociativeMemoryError('Cannot merge memories of different sizes.')
+        self.abstract(other.relation)
+        self.fill += other.fill
 
 
     def recognize(self, vector):
@@ -207,14 +331,567 @@ class AssociativeMemory(object):
         return np.count_nonzero(r_io == False)
 
 
-    def recall(self, vector):
+    def recall(self, vector, rng = None):
 
         accept = self.mismatches(vector) <= self.t
 
         if accept:
             # r_io = self.lreduce(r_io)
-            r_io = self.lreduce(vector)
+            r_io = self.lreduce(vector, rng)
         else:
             r_io = np.full(self.n, self.undefined)
 
         return r_io, accept
+
+
+    def mismatches_many(self, vectors):
+        """ Returns the number of mismatches of every row of a matrix of vectors.
+        """
+        vectors = np.asarray(vectors).reshape((-1, self.n))
+        if len(vectors) == 0:
+            return np.zeros(0, dtype=int)
+        if vectors.max() > self.m or vectors.min() < 0:
+            raise ValueError('Values in the input vectors are invalid.')
+
+        # As in vector_to_relation, vectors out of range have no mismatches.
+        valid = (vectors < self.m).all(axis=1)
+        rows = np.where(valid[:, None], vectors, 0)
+        counts = self.n - np.count_nonzero(self.contains(rows), axis=1)
+        counts[~valid] = 0
+        if _original_methods:
+            counters['scan']['mismatches'] += rows.size
+        return counts
+
+
+    def contains(self, vectors):
+        """ Tells which cells (value, feature) of every vector are marked.
+        """
+        return self.relation[vectors, np.arange(self.n)]
+
+
+    def recognize_many(self, vectors):
+        return self.mismatches_many(vectors) <= self.t
+
+
+    def recall_many(self, vectors, rng = None):
+        """ Recalls every row of a matrix of vectors.
+
+        Returns the matrix of recalled vectors, with undefined rows for
+        those not accepted, and the array of acceptances. Values are drawn
+        from rng, as in lreduce_many.
+        """
+        vectors = np.asarray(vectors).reshape((-1, self.n))
+        accept = self.recognize_many(vectors)
+        recalls = np.full(vectors.shape, self.undefined)
+        if accept.any():
+            recalls[accept] = self.lreduce_many(vectors[accept], rng)
+        return recalls, accept
+
+
+# Fraction of marked cells over which sparse memories become dense. Sparse
+# memories take eight bytes per marked cell, and dense ones a byte per cell.
+sparse_density = 1.0/8
+
+
+class SparseAssociativeMemory(AssociativeMemory):
+    """ Associative memory that keeps only the marked cells of its relation.
+
+    Cells are kept as a sorted array of keys (feature*m + value), so the
+    marked values of every feature are contiguous and sorted, and memory
+    and the cost of registering, recognizing and recalling go with the
+    number of marked cells, not with m*n. When the fraction of marked cells
+    goes over density, the memory is promoted to the dense relation of
+    AssociativeMemory, which it keeps from then on.
+
+    While the memory is sparse, its relation is built whenever the relation
+    property is read, and changing it does not change the memory.
+    """
+
+    def __init__(self, n: int, m: int, tolerance = 0, density = sparse_density):
+        self.density = density
+        self._keys = np.zeros(0, dtype=np.int64)
+        super().__init__(n, m, tolerance)
+
+    @property
+    def sparse(self):
+        return self._keys is not None
+
+    @property
+    def relation(self):
+        if not self.sparse:
+            return self._relation
+        relation = np.zeros((self.n, self.m), dtype=np.bool)
+        relation.flat[self._keys] = True
+        return relation.T
+
+    @relation.setter
+    def relation(self, new_relation: np.ndarray):
+        AssociativeMemory.relation.fset(self, new_relation)
+        if self.sparse:
+            self._relation = None
+            self.update(np.flatnonzero(new_relation.T))
+
+    def update(self, keys) -> None:
+        """ Keeps the (sorted) keys of marked cells, or promotes the memory.
+        """
+        self._sampling = None
+        if len(keys) > self.density*self.m*self.n:
+            relation = np.zeros((self.n, self.m), dtype=np.bool)
+            relation.flat[keys] = True
+            self._keys = None
+            self._relation = np.ascontiguousarray(relation.T)
+        else:
+            self._keys = keys
+
+
+    def column(self, i):
+        if not self.sparse:
+            return super().column(i)
+        start, end = np.searchsorted(self._keys, [i*self.m, (i+1)*self.m])
+        column = np.zeros(self.m, dtype=np.bool)
+        column[self._keys[start:end] - i*self.m] = True
+        return column
+
+
+    def abstract(self, r_io) -> None:
+        if not self.sparse:
+            super().abstract(r_io)
+        else:
+            self.update(np.union1d(self._keys, np.flatnonzero(np.asarray(r_io).T)))
+
+
+    def register(self, vector) -> None:
+        if not self.sparse:
+            super().register(vector)
+        else:
+            vector = np.ravel(vector)
+            self.validate(vector)
+            self.register_many(vector)
+
+
+    def register_many(self, vectors) -> None:
+        if not self.sparse:
+            super().register_many(vectors)
+            return
+        vectors = np.asarray(vectors).reshape((-1, self.n))
+        if len(vectors) == 0:
+            return
+        if vectors.max() > self.m or vectors.min() < 0:
+            raise ValueError('Values in the input vectors are invalid.')
+
+        # As in vector_to_relation, vectors out of range register nothing.
+        valid = vectors[(vectors < self.m).all(axis=1)]
+        keys = (np.arange(self.n)*self.m + valid).ravel()
+        self.update(np.union1d(self._keys, keys))
+        self.fill += len(vectors)
+
+
+    def unmarked_counts(self, vectors):
+        if not self.sparse:
+            return super().unmarked_counts(vectors)
+        new = np.setdiff1d(self.cell_keys(vectors), self._keys, assume_unique=True)
+        return np.bincount(new // self.m, minlength=self.n)
+
+
+    def copy(self) -> 'SparseAssociativeMemory':
+        if not self.sparse:
+            return super().copy()
+        # Keys are replaced, never changed in place, so they can be shared.
+        return copy.copy(self)
+
+
+    def merge(self, other) -> None:
+        if not (self.sparse and isinstance(other, SparseAssociativeMemory) and other.sparse):
+            super().merge(other)
+            return
+        if (self.n != other.n) or (self.m != other.m):
+            raise AssociativeMemoryError('Cannot merge memories of different sizes.')
+        self.update(np.union1d(self._keys, other._keys))
+        self.fill += other.fill
+
+
+    def recognize(self, vector):
+        return self.mismatches(vector) <= self.t
+
+
+    def mismatches(self, vector):
+        if not self.sparse:
+            return super().mismatches(vector)
+        vector = np.ravel(vector)
+        self.validate(vector)
+        return self.mismatches_many(vector)[0]
+
+
+    def contains(self, vectors):
+        if not self.sparse:
+            return super().contains(vectors)
+        if len(self._keys) == 0:
+            return np.zeros(np.shape(vectors), dtype=bool)
+        queries = vectors + np.arange(self.n)*self.m
+        positions = np.minimum(np.searchsorted(self._keys, queries), len(self._keys) - 1)
+        return self._keys[positions] == queries
+
+
+    def sampling_tables(self):
+        """ Returns the tables lreduce_many samples from, computing them if needed.
+
+        While the memory is sparse, the tables have, for every marked cell,
+        the first and last values of the run of marked cells it belongs to,
+        and per column, the number of marked cells and the position of the
+        first of them among the keys.
+        """
+        if not self.sparse:
+            return super().sampling_tables()
+        if self._sampling is None:
+            keys = self._keys
+            values = keys % self.m
+            positions = np.arange(len(keys))
+            # A run starts at a cell not following the previous one in its column.
+            first = np.ones(len(keys), dtype=bool)
+            first[1:] = (np.diff(keys) != 1) | (values[1:] == 0)
+            last = np.ones(len(keys), dtype=bool)
+            last[:-1] = first[1:]
+            run_first = np.maximum.accumulate(np.where(first, positions, 0))
+            run_last = np.minimum.accumulate(
+                np.where(last, positions, len(keys))[::-1])[::-1]
+            starts = np.searchsorted(keys, np.arange(self.n + 1)*self.m)
+            self._sampling = (values[run_first], values[run_last], np.diff(starts), starts)
+        return self._sampling
+
+
+    def runs(self, values):
+        if not self.sparse:
+            return super().runs(values)
+        lower, upper, _, _ = self.sampling_tables()
+        if len(self._keys) == 0:
+            nothing = np.zeros(values.shape, dtype=int)
+            return nothing.astype(bool), nothing, nothing
+        queries = values + np.arange(self.n)*self.m
+        positions = np.minimum(np.searchsorted(self._keys, queries), len(self._keys) - 1)
+        return self._keys[positions] == queries, lower[positions], upper[positions]
+
+
+    def column_counts(self):
+        if not self.sparse:
+            return super().column_counts()
+        if self._sampling is None:
+            return np.bincount(self._keys // self.m, minlength=self.n)
+        return self._sampling[2]
+
+
+    def marked(self, k, columns):
+        if not self.sparse:
+            return super().marked(k, columns)
+        starts = self.sampling_tables()[3]
+        return self._keys[starts[columns] + k] - columns*self.m
+
+
+class PackedAssociativeMemory(AssociativeMemory):
+    """ Read only associative memory over its relation packed as bits.
+
+    Every row of the relation (a value for all features) keeps eight
+    features per byte, as written by save_memories, and may be a read only
+    memory map of the file, so recognizing reads only the bytes of the
+    cells asked for. The relation is unpacked whenever the relation property
+    is read, and changing it does not change the memory. A memory that can
+    be changed is got with copy.
+    """
+
+    def __init__(self, n: int, m: int, packed, tolerance = 0, fill = 0):
+        self.n = n
+        self.m = m
+        self.t = tolerance
+        self.fill = fill
+        self._packed = packed
+        self._sampling = None
+
+    @property
+    def relation(self):
+        return np.unpackbits(self._packed, axis=1, count=self.n).view(np.bool)
+
+    @relation.setter
+    def relation(self, new_relation: np.ndarray):
+        raise AssociativeMemoryError('Packed memories are read only.')
+
+
+    def abstract(self, r_io) -> None:
+        raise AssociativeMemoryError('Packed memories are read only.')
+
+
+    def register(self, vector) -> None:
+        raise AssociativeMemoryError('Packed memories are read only.')
+
+
+    def register_many(self, vectors) -> None:
+        raise AssociativeMemoryError('Packed memories are read only.')
+
+
+    def copy(self) -> AssociativeMemory:
+        other = AssociativeMemory(self.n, self.m, self.t)
+        other.relation = self.relation
+        other.fill = self.fill
+        return other
+
+
+    def column(self, i):
+        return (self._packed[:, i >> 3] >> (7 - (i & 7))) & 1 == 1
+
+
+    def recognize(self, vector):
+        return self.mismatches(vector) <= self.t
+
+
+    def mismatches(self, vector):
+        vector = np.ravel(vector)
+        self.validate(vector)
+        return self.mismatches_many(vector)[0]
+
+
+    def contains(self, vectors):
+        columns = np.arange(self.n)
+        return (self._packed[vectors, columns >> 3] >> (7 - (columns & 7))) & 1 == 1
+
+
+def fill_shard(n, m, vectors, labels = None, tolerance = 0, memory_class = AssociativeMemory):
+    """ Fills partial memories of memory_class with a chunk of the filling corpus.
+
+    If labels is None, a single memory is returned; otherwise, a dictionary
+    with a memory per label in the chunk.
+    """
+    if labels is None:
+        am = memory_class(n, m, tolerance)
+        am.register_many(vectors)
+        return am
+
+    labels = np.asarray(labels)
+    ams = {}
+    for label in np.unique(labels):
+        am = memory_class(n, m, tolerance)
+        am.register_many(vectors[labels == label])
+        ams[label.item()] = am
+    return ams
+
+
+def merge_memories(shards):
+    """ Merges partial memories (or dictionaries of them) into one.
+
+    Merged memories are of the class of the first shard merged into them.
+    """
+    merged = None
+    for shard in shards:
+        if isinstance(shard, AssociativeMemory):
+            if merged is None:
+                merged = type(shard)(shard.n, shard.m, shard.t)
+            merged.merge(shard)
+        else:
+            if merged is None:
+                merged = {}
+            for key in shard:
+                if key not in merged:
+                    merged[key] = type(shard[key])(shard[key].n, shard[key].m, shard[key].t)
+                merged[key].merge(shard[key])
+    return merged
+
+
+def sharded_fill(n, m, vectors, labels = None, tolerance = 0, executor = None,
+        memory_class = AssociativeMemory):
+    """ Fills memories splitting the corpus among the workers of an executor.
+
+    Every worker fills partial memories of memory_class with its chunk,
+    which are merged afterwards by joining their relations and adding their
+    fill counts. The executor is chosen by workload if None.
+    """
+    executor = executors.Executor() if executor is None else executor
+    vectors = np.asarray(vectors)
+    n_shards = max(1, min(executor.n_jobs, len(vectors)))
+    chunks = np.array_split(np.arange(len(vectors)), n_shards)
+    shards = executor.map(fill_shard,
+        [(n, m, vectors[chunk], None if labels is None else np.asarray(labels)[chunk],
+            tolerance, memory_class) for chunk in chunks], vectors.size)
+    return merge_memories(shards)
+
+
+def rank_memories(ams, cues, k = None):
+    """ Ranks memories by their number of mismatches with every cue.
+
+    Returns the keys of the memories (in the order of the columns of the
+    matrix), the matrix of mismatches (cues x memories), and the keys and
+    mismatches of the k memories with less mismatches per cue, in order.
+    Memories with the same mismatches are ranked in the order of their keys.
+    """
+    keys = np.array(sorted(ams))
+    mismatches = np.stack([ams[key].mismatches_many(cues) for key in keys], axis=1)
+    k = len(keys) if k is None else min(k, len(keys))
+
+    # Ranks are unique, so ties are also kept in key order by the partition.
+    ranks = mismatches.astype(np.int64)*len(keys) + np.arange(len(keys))
+    if k < len(keys):
+        top = np.argpartition(ranks, k-1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(len(keys)), mismatches.shape)
+    order = np.argsort(np.take_along_axis(ranks, top, axis=1), axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    return keys, mismatches, keys[top], np.take_along_axis(mismatches, top, axis=1)
+
+
+# Counters for the hot paths of the memories.
+#
+# When enabled, the methods of memory classes (their own overrides included)
+# are replaced by versions that count their calls and time. Only the
+# outermost counted call of a thread is counted, so calls made by other
+# methods (recall_many calling lreduce_many, or an override calling the
+# method it overrides) add neither calls nor time twice, and lreduce_many counts the branches taken by
+# every feature (under 'sample'); the cells of relations tested by
+# mismatches_many and lreduce_many are counted under 'scan'. When disabled, the original
+# methods are restored, so counting costs nothing while it is off.
+counters = {}
+_counted_methods = ['register', 'register_many', 'recognize', 'mismatches', 'mismatches_many',
+    'recall', 'recall_many', 'lreduce', 'lreduce_many']
+_counted_classes = [AssociativeMemory, SparseAssociativeMemory, PackedAssociativeMemory]
+_original_methods = {}
+# Whether a counted call is running in the thread.
+_counting = threading.local()
+
+
+def reset_counters():
+    counters.clear()
+    for name in _counted_methods:
+        counters[name] = {'calls': 0, 'time': 0.0}
+    counters['recall']['rejected'] = 0
+    counters['recall_many']['rejected'] = 0
+    counters['sample'] = {'features': 0, 'undefined_branch': 0, 'empty_column': 0,
+        'triangular_branch': 0, 'exact_value': 0}
+    counters['scan'] = {'mismatches': 0, 'sample': 0}
+
+
+def counters_snapshot():
+    return {name: dict(counters[name]) for name in counters}
+
+
+def _timed(name, method):
+    def timed_method(self, *args, **kwargs):
+        if getattr(_counting, 'active', False):
+            return method(self, *args, **kwargs)
+        _counting.active = True
+        start = time.perf_counter()
+        try:
+            result = method(self, *args, **kwargs)
+        finally:
+            _counting.active = False
+        counts = counters[name]
+        counts['time'] += time.perf_counter() - start
+        counts['calls'] += 1
+        if name == 'recall':
+            counts['rejected'] += not result[1]
+        elif name == 'recall_many':
+            counts['rejected'] += int(np.count_nonzero(~result[1]))
+        return result
+    timed_method.__name__ = method.__name__
+    timed_method.__doc__ = method.__doc__
+    return timed_method
+
+
+def _count_branches(self, inside, exact, uniform):
+    """ Counts the branches taken by features in lreduce_many.
+
+    Features whose value is marked take the triangular branch, unless their
+    run is the value alone (exact value); the rest take the undefined one.
+    """
+    counts = counters['sample']
+    counts['features'] += inside.size
+    counts['undefined_branch'] += int(np.count_nonzero(~inside))
+    counts['empty_column'] += int(np.count_nonzero(~inside & ~uniform))
+    counts['triangular_branch'] += int(np.count_nonzero(inside & ~exact))
+    counts['exact_value'] += int(np.count_nonzero(exact))
+    # A cell of the relation is tested per feature.
+    counters['scan']['sample'] += inside.size
+
+
+def enable_counters():
+    if _original_methods:
+        return
+    reset_counters()
+    for cls in _counted_classes:
+        for name in _counted_methods:
+            if name in cls.__dict__:
+                _original_methods[(cls, name)] = cls.__dict__[name]
+                setattr(cls, name, _timed(name, cls.__dict__[name]))
+
+
+def disable_counters():
+    for (cls, name), method in _original_methods.items():
+        setattr(cls, name, method)
+    _original_methods.clear()
+
+
+instrumentation.add_counters('associative', enable_counters, counters_snapshot)
+
+
+# Persistent format for memories.
+#
+# The file starts with a header (magic string, format version and number of
+# memories), followed by one block per memory. Each block has its own header
+# (key, n, m, tolerance and fill count) and the relation packed as bits, one
+# row of ceil(n/8) bytes per value of the range. Blocks can then be read
+# through a read-only memory map without loading the whole file.
+memories_magic = b'AMEM'
+memories_version = 1
+_file_header = struct.Struct('<4sHI')
+_block_header = struct.Struct('<qIIIQ')
+
+
+def _packed_row_size(n):
+    return (n + 7) // 8
+
+
+def save_memories(ams, filename) -> None:
+    """ Saves a dictionary (or a list) of associative memories in one file.
+    """
+    if not isinstance(ams, dict):
+        ams = dict(enumerate(ams))
+
+    with open(filename, 'wb') as f:
+        f.write(_file_header.pack(memories_magic, memories_version, len(ams)))
+        for key in ams:
+            am = ams[key]
+            f.write(_block_header.pack(int(key), am.n, am.m, am.t, am.fill))
+            packed = np.packbits(am.relation, axis=1)
+            f.write(packed.tobytes())
+
+
+def load_memories(filename, mmap = True) -> dict:
+    """ Loads the associative memories saved with save_memories.
+
+    If mmap is True, memories are read only PackedAssociativeMemory objects
+    over a read only memory map of the file, and their relations stay packed.
+    Otherwise, they are AssociativeMemory objects with relations in memory.
+    """
+    if mmap:
+        buffer = np.memmap(filename, dtype=np.uint8, mode='r')
+    else:
+        buffer = np.fromfile(filename, dtype=np.uint8)
+
+    magic, version, count = _file_header.unpack_from(buffer, 0)
+    if magic != memories_magic:
+        raise AssociativeMemoryError(str(filename) + ' is not a memories file.')
+    if version > memories_version:
+        raise AssociativeMemoryError('Unsupported version ' + str(version) \
+            + ' of memories file ' + str(filename))
+
+    ams = {}
+    offset = _file_header.size
+    for _ in range(count):
+        key, n, m, tolerance, fill = _block_header.unpack_from(buffer, offset)
+        offset += _block_header.size
+        row_size = _packed_row_size(n)
+        packed = buffer[offset:offset + m*row_size].reshape((m, row_size))
+        offset += m*row_size
+
+        if mmap:
+            am = PackedAssociativeMemory(n, m, packed, tolerance, fill)
+        else:
+            am = AssociativeMemory(n, m, tolerance)
+            am.relation = np.unpackbits(packed, axis=1, count=n).view(np.bool)
+            am.fill = fill
+        ams[key] = am
+    return ams
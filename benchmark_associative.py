@@ -0,0 +1,212 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Benchmarks for the associative memory core.
+
+Operations of AssociativeMemory are timed on synthetic quantized features,
+sweeping the domain size, the memory size and the fraction of the filling
+corpus registered. Features are generated with fixed seeds, so every run
+measures exactly the same work. Results are written to a JSON file, and can
+be compared against a previous (baseline) one to flag regressions.
+"""
+
+import sys
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+
+import numpy as np
+
+import constants
+from associative import AssociativeMemory, SparseAssociativeMemory
+
+# Default sweep.
+domains = [64, constants.domain]
+memory_sizes = [4, 32, constants.ideal_memory_size, 1024]
+fill_fractions = [0.01, 0.1, 1.0]
+
+corpus_size = 1000
+queries_size = 100
+n_prototypes = constants.n_labels
+
+min_time = 0.2
+
+
+def print_error(*s):
+    print('Error:', *s, file = sys.stderr)
+
+
+def synthetic_features(rng, count, domain, msize):
+    """ Quantized features scattered around a few prototypes, as classes are.
+    """
+    prototypes = rng.integers(0, msize, (n_prototypes, domain))
+    which = rng.integers(0, n_prototypes, count)
+    noise = rng.normal(0.0, msize/8.0, (count, domain))
+    features = np.round(prototypes[which] + noise)
+    return np.clip(features, 0, msize-1).astype(np.int16)
+
+
+def time_op(op):
+    """ Runs op until min_time has passed and returns the seconds per run.
+
+    Also returns the peak of memory allocated by a single run.
+    """
+    tracemalloc.start()
+    op()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    runs = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        op()
+        runs += 1
+        elapsed = time.perf_counter() - start
+    return elapsed/runs, peak
+
+
+def bench_case(domain, msize, fill, seed, memory = AssociativeMemory):
+    rng = np.random.default_rng(seed)
+    corpus = synthetic_features(rng, corpus_size, domain, msize)
+    queries = synthetic_features(rng, queries_size, domain, msize)
+    filling = corpus[:max(1, int(round(fill*corpus_size)))]
+
+    am = memory(domain, msize, domain)
+    for vector in filling:
+        am.register(vector)
+
+    def register():
+        m = memory(domain, msize)
+        for vector in filling:
+            m.register(vector)
+
+    def recognize():
+        for q in queries:
+            am.recognize(q)
+
+    def mismatches():
+        for q in queries:
+            am.mismatches(q)
+
+    def recall():
+        rng = np.random.default_rng(seed)
+        for q in queries[:queries_size//10]:
+            am.recall(q, rng)
+
+    def recall_many():
+        am.recall_many(queries, np.random.default_rng(seed))
+
+    def entropy():
+        am.entropy
+
+    ops = {
+        'register': (register, len(filling)),
+        'recognize': (recognize, queries_size),
+        'mismatches': (mismatches, queries_size),
+        'recall': (recall, queries_size//10),
+        'recall_many': (recall_many, queries_size),
+        'entropy': (entropy, 1)
+        }
+
+    results = []
+    for name in ops:
+        op, items = ops[name]
+        seconds, peak = time_op(op)
+        results.append({
+            'op': name, 'domain': domain, 'msize': msize, 'fill': fill,
+            'memory': memory.__name__,
+            'items': items,
+            'ops_per_sec': items/seconds,
+            'ns_per_feature': seconds*1e9/(items*domain),
+            'peak_bytes': peak
+            })
+    return results
+
+
+def case_key(r):
+    key = f"{r['op']}-n{r['domain']}-m{r['msize']}-f{r['fill']}"
+    if r.get('memory', AssociativeMemory.__name__) != AssociativeMemory.__name__:
+        key += '-sparse'
+    return key
+
+
+def compare(results, baseline, threshold):
+    """ Returns the cases whose throughput dropped more than threshold.
+    """
+    previous = {case_key(r): r for r in baseline['results']}
+    regressions = []
+    for r in results:
+        key = case_key(r)
+        if key not in previous:
+            continue
+        ratio = r['ops_per_sec'] / previous[key]['ops_per_sec']
+        if ratio < 1.0 - threshold:
+            regressions.append((key, ratio))
+    return regressions
+
+
+if __name__ == "__main__" :
+    parser = argparse.ArgumentParser(description='Associative Memory benchmarks.')
+    parser.add_argument('-o', dest='output',
+                        help='JSON file where results are written (in the runs directory by default).')
+    parser.add_argument('-c', dest='baseline',
+                        help='JSON file with results to compare against.')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='drop in throughput considered a regression (0.1 is 10%%).')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed for the synthetic features.')
+    parser.add_argument('--sparse', action='store_true',
+                        help='benchmark SparseAssociativeMemory instead.')
+    parser.add_argument('--domains', type=int, nargs='+', default=domains)
+    parser.add_argument('--msizes', type=int, nargs='+', default=memory_sizes)
+    parser.add_argument('--fills', type=float, nargs='+', default=fill_fractions)
+    args = parser.parse_args()
+
+    results = []
+    for domain in args.domains:
+        for msize in args.msizes:
+            for fill in args.fills:
+                case = bench_case(domain, msize, fill, args.seed,
+                    SparseAssociativeMemory if args.sparse else AssociativeMemory)
+                for r in case:
+                    print(f"{case_key(r)}: {r['ops_per_sec']:.1f} ops/s, " \
+                        + f"{r['ns_per_feature']:.1f} ns/feature, {r['peak_bytes']} bytes")
+                results += case
+
+    report = {
+        'seed': args.seed,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': results
+        }
+    output = args.output
+    if output is None:
+        output = constants.json_filename('benchmark_associative')
+    with open(output, 'w') as outfile:
+        json.dump(report, outfile, indent=1)
+
+    if args.baseline is not None:
+        with open(args.baseline) as infile:
+            baseline = json.load(infile)
+        regressions = compare(results, baseline, args.threshold)
+        for key, ratio in regressions:
+            print_error(f'{key} is at {ratio*100:.1f}% of the baseline throughput.')
+        if len(regressions) > 0:
+            exit(1)
+        print('No regressions against', args.baseline)
@@ -15,6 +15,8 @@
 
 import os
 
+import numpy as np
+
 # Directory where all results are stored.
 run_path = './runs'
 idx_digits = 3
@@ -32,15 +34,28 @@ def tolerance_suffix(tolerance):
     return '' if not tolerance else '-tol_' + str(tolerance).zfill(3)
 
 
+# Directories already created (or found) by this process.
+_directories = set()
+
+
+def make_directory(path):
+    """ Creates a directory and its parents, unless it was already done.
+
+    Returns the path of the directory.
+    """
+    if path not in _directories:
+        if not os.path.isdir(path):
+            os.makedirs(path, exist_ok=True)
+            print("Directory " , path ,  " created ")
+        _directories.add(path)
+    return path
+
+
 def filename(s, idx = None, occlusion = None, bars_type = None, tolerance = 0, extension = ''):
     """ Returns a file name in run_path directory with a given extension and an index
     """
     # Create target directory & all intermediate directories if don't exists
-    try:
-        os.makedirs(run_path)
-        print("Directory " , run_path ,  " created ")
-    except FileExistsError:
-        pass
+    make_directory(run_path)
 
     if idx is None:
         return run_path + '/' + s + extension
@@ -69,6 +84,10 @@ def data_filename(s, idx = None):
     return filename(s, idx, extension='.npy')
 
 
+# Descriptions of graphs, drawn by plotting.
+graph_extension = '.graph.json'
+
+
 def picture_filename(s, idx = None, occlusion = None, bars_type = None, tolerance = 0):
     """ Returns a file name for a graph.
     """
@@ -79,16 +98,32 @@ def model_filename(s, idx = None):
     return filename(s, idx)
 
 
+def images_directory(dir, stage, msize = None):
+    """ Returns the directory of the images of a stage (and memory size),
+    creating it if needed.
+    """
+    image_path = run_path + '/images/' + dir + '/' + 'stage_' + str(stage)
+    if msize is not None:
+        image_path += '/msize_' + str(msize)
+    return make_directory(image_path) + '/'
+
+
+def image_name(idx, label, suffix = ''):
+    return str(label) + '_' + str(idx).zfill(5) + suffix + '.png'
+
+
 def image_filename(dir, stage, idx, label, suffix = ''):
-    image_path = run_path + '/images/' + dir + '/' + 'stage_' + str(stage) + '/'
+    return images_directory(dir, stage) + image_name(idx, label, suffix)
+
 
-    try:
-        os.makedirs(image_path)
-    except FileExistsError:
-        pass
+def image_filenames(dir, stages, idxs, labels, suffix = '', msize = None):
+    """ Returns the file names of a batch of images, given by stage, id and label.
 
-    image_path += str(label) + '_' + str(idx).zfill(5)  + suffix + '.png'
-    return image_path
+    Stages, ids and labels are broadcast against each other, so a single
+    stage may be given for all.
+    """
+    return [images_directory(dir, int(stage), msize) + image_name(int(idx), int(label), suffix)
+        for stage, idx, label in np.broadcast(stages, idxs, labels)]
 
 
 testing_path = 'test'
@@ -106,19 +141,17 @@ def memories_directory(i, occlusion = None, bars_type = None, tolerance = 0):
         + bars_type_suffix(bars_type) + tolerance_suffix(tolerance)
 
 
-def memory_filename(dir, msize, stage, idx, label):
-    # Remove '-'
-    image_path = run_path + '/images/' + dir + '/' + 'stage_' + str(stage) + '/'
-    image_path += 'msize_' + str(msize) + '/'
+decoded_suffix = '-decoded'
+
+
+def decoded_name(dir):
+    """ Returns the name for the array of images decoded into a directory.
+    """
+    return dir + decoded_suffix
 
-    try:
-        os.makedirs(image_path)
-        print("Directory " , image_path ,  " created ")
-    except FileExistsError:
-        pass
 
-    image_path += str(label) + '_' + str(idx).zfill(5) + '.png'
-    return image_path
+def memory_filename(dir, msize, stage, idx, label):
+    return images_directory(dir, stage, msize) + image_name(idx, label)
 
 
 original_suffix = '-original'
@@ -136,6 +169,18 @@ def produced_memory_filename(dir, msize, stage, idx, label):
     return memory_filename(dir, msize, stage, idx, label)
 
 
+def original_image_filenames(dir, stages, idxs, labels):
+    return image_filenames(dir, stages, idxs, labels, original_suffix)
+
+
+def produced_image_filenames(dir, stages, idxs, labels):
+    return image_filenames(dir, stages, idxs, labels)
+
+
+def produced_memory_filenames(dir, msize, stages, idxs, labels):
+    return image_filenames(dir, stages, idxs, labels, msize=msize)
+
+
 features_prefix = 'features'
 experiment_defaul_suffix = ''
 experiment_suffix = ['', '', '', '', '',
@@ -160,6 +205,60 @@ def memories_name(i = -1, occlusion = None, bars_type = None, tolerance = 0):
             + bars_type_suffix(bars_type) + tolerance_suffix(tolerance)
     return mem_name
 
+recall_index_suffix = '-index'
+recall_index_extension = '.npz'
+
+
+def recall_index_filename(s, idx = None):
+    """ Returns a file name for the index of stored recalls in run_path directory
+    """
+    return filename(s + recall_index_suffix, idx, extension=recall_index_extension)
+
+relations_prefix = 'relations'
+relations_extension = '.amr'
+
+
+def fill_suffix(fill):
+    return '' if fill is None else '-fill_' + str(fill).zfill(3)
+
+
+def relations_name(i = -1, fill = None, occlusion = None, bars_type = None, tolerance = 0):
+    """ Returns the name for the relations of the memories of an experiment.
+
+    The fill is the index of the level in memory_fills used to fill them.
+    """
+    rel_name = relations_prefix
+    if i >= 0:
+        rel_name += experiment_suffix[i] + fill_suffix(fill) \
+            + occlusion_suffix(occlusion) + bars_type_suffix(bars_type) \
+            + tolerance_suffix(tolerance)
+    return rel_name
+
+
+def relations_filename(s, idx = None):
+    """ Returns a file name for saved memories in run_path directory
+    """
+    return filename(s, idx, extension=relations_extension)
+
+calibration_prefix = 'calibration'
+calibration_extension = '.npz'
+
+
+def calibration_name(i = -1, occlusion = None, bars_type = None):
+    """ Returns the name for the quantization calibration of an experiment.
+    """
+    cal_name = calibration_prefix
+    if i >= 0:
+        cal_name += experiment_suffix[i] + occlusion_suffix(occlusion) \
+            + bars_type_suffix(bars_type)
+    return cal_name
+
+
+def calibration_filename(s, idx = None):
+    """ Returns a file name for a saved quantizer in run_path directory
+    """
+    return filename(s, idx, extension=calibration_extension)
+
 # Categories prefixes.
 model_name = 'model'
 stats_model_name = 'model_stats'
@@ -182,10 +281,16 @@ domain = 512
 
 n_jobs = 4
 n_labels = 10
-labels_per_memory = [0, 1, 2]
+# Labels per memory in experiments 1 and 2 (see assignment.grouped); the
+# first entry, for getting features, only keeps the list indexed by experiment.
+labels_per_memory = [1, 1, 2]
 
 all_labels = list(range(n_labels))
 
+# Formats for plotting the features of every label.
+label_formats = ['r:o', 'g:*', 'b:s', 'y:x', 'm:d',
+    'c:^', 'k:p', 'r:h', 'g:v', 'b:<']
+
 precision_idx = 0
 recall_idx = 1
 n_measures = 2
@@ -14,6 +14,7 @@
 # limitations under the License.
 
 import sys
+import time
 import numpy as np
 import tensorflow as tf
 from tensorflow.keras import Model
@@ -26,6 +27,8 @@ from joblib import Parallel, delayed
 import png
 
 import constants
+import instrumentation
+from recall_store import RecallStore
 
 img_rows = 32
 img_columns = 32
@@ -66,13 +69,9 @@ def add_side_occlusion(data, side_hidden, occlusion):
         origin = (0, mid_col)
         end = (img_rows, img_columns)
 
-    for image in data:
-        n, m = origin
-        end_n, end_m = end
-
-        for i in range(n, end_n):
-            for j in range(m, end_m):
-                image[i,j] = noise_value
+    n, m = origin
+    end_n, end_m = end
+    data[:, n:end_n, m:end_m] = noise_value
 
     return data
 
@@ -93,7 +92,7 @@ def add_bars_occlusion(data, bars, n):
 
 
 def add_noise(data, experiment, occlusion = 0, bars_type = None):
-    # data is assumed to be a numpy array of shape (N, img_rows, img_columns)
+    # data is assumed to be a numpy array of shape (N, img_rows, img_columns, img_colors)
 
     if experiment < constants.EXP_5:
         return data
@@ -250,6 +249,20 @@ class EarlyStoppingAtLossCrossing(Callback):
             print("Epoch %05d: early stopping" % (self.stopped_epoch + 1))
 
 
+class EpochTimer(Callback):
+    """ Adds the seconds every epoch took to its logs, as epoch_time.
+
+        It must go before callbacks reading the logs, as the history does.
+    """
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch_start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        if logs is not None:
+            logs['epoch_time'] = time.perf_counter() - self.epoch_start
+
+
 def train_networks(training_percentage, filename, experiment):
 
     stages = constants.training_stages
@@ -306,7 +319,7 @@ def train_networks(training_percentage, filename, experiment):
                 epochs=epochs,
                 validation_data= (validation_data,
                     {'classification': validation_labels, 'autoencoder': validation_data}),
-                callbacks=[EarlyStoppingAtLossCrossing(patience)],
+                callbacks=[EpochTimer(), EarlyStoppingAtLossCrossing(patience)],
                 verbose=2)
 
         histories.append(history)
@@ -320,30 +333,54 @@ def train_networks(training_percentage, filename, experiment):
     return histories
 
 
-def store_images(original, produced, directory, stage, idx, label):
-    original_filename = constants.original_image_filename(directory, stage, idx, label)
-    produced_filename = constants.produced_image_filename(directory, stage, idx, label)
+def to_pixels(images):
+    """ Returns images with values in [0, 1] as arrays of bytes.
+    """
+    pixels = np.asarray(images).reshape((-1, img_rows, img_columns, img_colors)) * 255
+    return pixels.round().astype(np.uint8)
+
 
-    pixels = original.reshape(img_rows,img_columns*img_colors) * 255
-    pixels = pixels.round().astype(np.uint8)
+def store_images(original, produced, original_filename, produced_filename):
+    pixels = to_pixels(original).reshape(img_rows,img_columns*img_colors)
     png.from_array(pixels, 'RGB;8').save(original_filename)
-    pixels = produced.reshape(img_rows,img_columns*img_colors) * 255
-    pixels = pixels.round().astype(np.uint8)
+    pixels = to_pixels(produced).reshape(img_rows,img_columns*img_colors)
     png.from_array(pixels, 'RGB;8').save(produced_filename)
 
 
-def store_memories(labels, produced, features, directory, stage, msize):
-    (idx, label) = labels
-    produced_filename = constants.produced_memory_filename(directory, msize, stage, idx, label)
-
-    if np.isnan(np.sum(features)):
-        pixels = np.full((img_rows,img_columns*img_colors), 255)
-    else:
-        pixels = produced.reshape(img_rows,img_columns*img_colors) * 255
-    pixels = pixels.round().astype(np.uint8)
+def store_memories(pixels, produced_filename):
+    pixels = pixels.reshape(img_rows,img_columns*img_colors)
     png.from_array(pixels, 'RGB;8').save(produced_filename)
 
 
+def load_encoder(fold):
+    """ Returns the encoder part of the neural network of a fold.
+
+    It is the classifier without its last (fully connected) layers, which
+    produces the features used by the memories.
+    """
+    model = tf.keras.models.load_model(constants.model_filename(constants.model_name, fold))
+    classifier = Model(model.input, model.output[0])
+    return Model(classifier.input, classifier.layers[-4].output)
+
+
+def load_decoder(fold):
+    """ Returns the decoder part of the neural network of a fold.
+    """
+    model = tf.keras.models.load_model(constants.model_filename(constants.model_name, fold))
+
+    # Drop the classifier.
+    autoencoder = Model(model.input, model.output[1])
+
+    # Drop the encoder
+    input_mem = Input(shape=(constants.domain, ))
+    decoded = get_decoder(input_mem)
+    decoder = Model(inputs=input_mem, outputs=decoded)
+
+    for dlayer, alayer in zip(decoder.layers[1:], autoencoder.layers[17:]):
+        dlayer.set_weights(alayer.get_weights())
+    return decoder
+
+
 def obtain_features(model_prefix, features_prefix, labels_prefix, data_prefix,
             training_percentage, am_filling_percentage, experiment,
             occlusion = None, bars_type = None):
@@ -398,13 +435,14 @@ def obtain_features(model_prefix, features_prefix, labels_prefix, data_prefix,
         model = Model(classifier.input, classifier.layers[-4].output)
         model.summary()
 
-        training_features = model.predict(training_data)
-        if len(filling_data) > 0:
-            filling_features = model.predict(filling_data)
-        else:
-            r, c = training_features.shape
-            filling_features = np.zeros((0, c))
-        testing_features = model.predict(testing_data)
+        with instrumentation.stage('predict', items=len(training_data)+len(filling_data)+len(testing_data), fold=n):
+            training_features = model.predict(training_data)
+            if len(filling_data) > 0:
+                filling_features = model.predict(filling_data)
+            else:
+                r, c = training_features.shape
+                filling_features = np.zeros((0, c))
+            testing_features = model.predict(testing_data)
 
         dict = {
             constants.training_suffix: (training_data, training_features, training_labels),
@@ -454,52 +492,57 @@ def remember(experiment, occlusion = None, bars_type = None, tolerance = 0):
         testing_features_filename = constants.data_filename(testing_features_filename, i)
         testing_labels_filename = constants.labels_name + constants.testing_suffix
         testing_labels_filename = constants.data_filename(testing_labels_filename, i)
-        memories_filename = constants.memories_name(experiment, occlusion, bars_type, tolerance)
-        memories_filename = constants.data_filename(memories_filename, i)
-        labels_filename = constants.labels_name + constants.memory_suffix
-        labels_filename = constants.data_filename(labels_filename, i)
-        model_filename = constants.model_filename(constants.model_name, i)
+        memories_prefix = constants.memories_name(experiment, occlusion, bars_type, tolerance)
 
         testing_data = np.load(testing_data_filename)
         testing_features = np.load(testing_features_filename)
         testing_labels = np.load(testing_labels_filename)
-        memories = np.load(memories_filename)
-        labels = np.load(labels_filename)
-        model = tf.keras.models.load_model(model_filename)
-
-        # Drop the classifier.
-        autoencoder = Model(model.input, model.output[1])
-        autoencoder.summary()
-
-        # Drop the encoder
-        input_mem = Input(shape=(constants.domain, ))
-        decoded = get_decoder(input_mem)
-        decoder = Model(inputs=input_mem, outputs=decoded)
-        decoder.summary()
+        memories = RecallStore(memories_prefix, i)
 
-        for dlayer, alayer in zip(decoder.layers[1:], autoencoder.layers[17:]):
-            dlayer.set_weights(alayer.get_weights())
+        decoder = load_decoder(i)
+        decoder.summary()
 
-        produced_images = decoder.predict(testing_features)
         n = len(testing_labels)
+        with instrumentation.stage('decode', items=n, fold=i):
+            produced_images = decoder.predict(testing_features)
+
+        # Decoded images are also kept as arrays, for montages.
+        testing_directory = constants.testing_directory(experiment, occlusion, bars_type)
+        np.save(constants.data_filename(constants.decoded_name(testing_directory), i),
+            to_pixels(produced_images))
+        memories_directory = constants.memories_directory(experiment, occlusion, bars_type, tolerance)
+        decoded_memories = np.lib.format.open_memmap(
+            constants.data_filename(constants.decoded_name(memories_directory), i), mode='w+',
+            dtype=np.uint8, shape=(len(memories.recalls), img_rows, img_columns, img_colors))
+        decoded_memories[:] = 255
+
+        # Names (and directories) of images are made at once, per batch.
+        original_filenames = constants.original_image_filenames(testing_directory, i, np.arange(n), testing_labels)
+        produced_filenames = constants.produced_image_filenames(testing_directory, i, np.arange(n), testing_labels)
+        with instrumentation.stage('store_images', items=n, fold=i):
+            Parallel(n_jobs=constants.n_jobs, verbose=5)( \
+                delayed(store_images)(original, produced, original_filename, produced_filename) \
+                    for (original, produced, original_filename, produced_filename) in \
+                        zip(testing_data, produced_images, original_filenames, produced_filenames))
 
-        Parallel(n_jobs=constants.n_jobs, verbose=5)( \
-            delayed(store_images)(original, produced, constants.testing_directory(experiment, occlusion, bars_type), i, j, label) \
-                for (j, original, produced, label) in \
-                    zip(range(n), testing_data, produced_images, testing_labels))
-
-        total = len(memories)
-        steps = len(constants.memory_fills)
-        step_size = int(total/steps)
-
-        for j in range(steps):
+        for j in range(memories.n_fills):
             print('Decoding memory size ' + str(j) + ' and stage ' + str(i))
-            start = j*step_size
-            end = start + step_size
-            mem_data = memories[start:end]
-            mem_labels = labels[start:end]
-            produced_images = decoder.predict(mem_data)
-
-            Parallel(n_jobs=constants.n_jobs, verbose=5)( \
-                delayed(store_memories)(label, produced, features, constants.memories_directory(experiment, occlusion, bars_type, tolerance), i, j) \
-                    for (produced, features, label) in zip(produced_images, mem_data, mem_labels))
+            # Only recalls of accepted cues are read and decoded.
+            rows = memories.select(fills=j, accepted=True)
+            mem_data = memories.read(rows)
+            with instrumentation.stage('decode', items=len(mem_data), fold=i, fill=j):
+                produced_images = decoder.predict(mem_data) if len(rows) else []
+            # Cues rejected, or recalled with undefined values, stay blank.
+            defined = ~np.isnan(mem_data.sum(axis=1))
+            if defined.any():
+                decoded_memories[rows[defined]] = to_pixels(np.asarray(produced_images)[defined])
+
+            rows = memories.select(fills=j)
+            _, cues, mem_labels = memories.tags(rows)
+            produced_filenames = constants.produced_memory_filenames(memories_directory, j, i, cues, mem_labels)
+            with instrumentation.stage('store_memories', items=len(rows), fold=i, fill=j):
+                Parallel(n_jobs=constants.n_jobs, verbose=5)( \
+                    delayed(store_memories)(decoded_memories[row], produced_filename) \
+                        for (row, produced_filename) in zip(rows, produced_filenames))
+        decoded_memories.flush()
+        del decoded_memories
@@ -0,0 +1,186 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Statistics of the images of the dataset, per class.
+
+Computes the sums of pixel values of every row and column of images, per
+channel, and their means and standard deviations, as well as the mean and
+standard deviation of every channel and the average image, for all images
+and per class label. Images may be occluded as in experiments 5 to 8.
+Statistics are accumulated a chunk of images at a time.
+"""
+
+import sys
+import argparse
+import numpy as np
+import png
+import tensorflow as tf
+
+import constants
+import convnet
+from running_stats import RunningStats
+
+img_rows = convnet.img_rows
+img_columns = convnet.img_columns
+img_colors = convnet.img_colors
+
+# Images processed at once.
+chunk_size = 1000
+
+
+def print_error(*s):
+    print('Error:', *s, file = sys.stderr)
+
+
+def stats_name(s, experiment = None, occlusion = None, bars_type = None):
+    if experiment is None:
+        return s
+    return s + constants.experiment_suffix[experiment] \
+        + constants.occlusion_suffix(occlusion) + constants.bars_type_suffix(bars_type)
+
+
+def load_images():
+    """ Returns all the images of CIFAR, with their labels.
+    """
+    cifar = tf.keras.datasets.cifar10
+    (train_images, train_labels), (test_images, test_labels) = cifar.load_data()
+    data = np.concatenate((train_images, test_images), axis=0)
+    labels = np.concatenate((train_labels, test_labels), axis=0).ravel()
+    return data, labels
+
+
+def dataset_stats(data, labels, experiment = None, occlusion = None, bars_type = None):
+    """ Returns the sums of every row and column of the images (per channel),
+    and the statistics of those and of pixels, per label and for all images.
+
+    Statistics are in a pair of RunningStats, per label and for all.
+    """
+    n = len(labels)
+    counts_rows = np.zeros((n, img_rows*img_colors))
+    counts_cols = np.zeros((n, img_columns*img_colors))
+    stats = {}
+    for k, domain in (('rows', counts_rows.shape[1]), ('columns', counts_cols.shape[1]),
+            ('pixels', img_rows*img_columns*img_colors)):
+        stats[k] = (RunningStats(constants.n_labels, domain), RunningStats(1, domain))
+
+    for start in range(0, n, chunk_size):
+        end = min(start + chunk_size, n)
+        images = np.array(data[start:end])
+        if experiment is not None:
+            images = convnet.add_noise(images, experiment, occlusion, bars_type)
+        images = images.astype(np.float64) / 255
+        counts_rows[start:end] = images.sum(axis=2).reshape((end - start, -1))
+        counts_cols[start:end] = images.sum(axis=1).reshape((end - start, -1))
+        for k, vectors in (('rows', counts_rows[start:end]), ('columns', counts_cols[start:end]),
+                ('pixels', images.reshape((end - start, -1)))):
+            per_label, overall = stats[k]
+            per_label.add(vectors, labels[start:end])
+            overall.add(vectors, np.zeros(end - start, dtype=int))
+    return counts_rows, counts_cols, stats
+
+
+def channel_stats(pixels):
+    """ Returns means and standard deviations per channel, from those per pixel.
+
+    All pixels have the same count, so the variance of a channel is the
+    average variance of its pixels plus the variance of their means.
+    """
+    means = pixels.mean.reshape((-1, img_rows*img_columns, img_colors))
+    variances = pixels.variance().reshape(means.shape)
+    channel_means = means.mean(axis=1)
+    channel_variances = (variances + np.square(means - channel_means[:, np.newaxis, :])).mean(axis=1)
+    return channel_means, np.sqrt(channel_variances)
+
+
+def save_image(image, filename):
+    pixels = (image.reshape((img_rows, img_columns*img_colors)) * 255).round().astype(np.uint8)
+    png.from_array(pixels, 'RGB;8').save(filename)
+
+
+def save_stats(counts_rows, counts_cols, stats, labels, name):
+    """ Saves the sums per image, their statistics and the average images.
+
+    Statistics have a row per label, and a last one for all images.
+    """
+    column = labels.reshape((-1, 1))
+    np.savetxt(constants.csv_filename(name('counts_rows')),
+        np.concatenate((column, counts_rows), axis=1), delimiter=',')
+    np.savetxt(constants.csv_filename(name('counts_cols')),
+        np.concatenate((column, counts_cols), axis=1), delimiter=',')
+
+    every_label = np.append(np.arange(constants.n_labels), -1).reshape((-1, 1))
+    for k in ('rows', 'columns'):
+        per_label, overall = stats[k]
+        means = np.concatenate((per_label.mean, overall.mean))
+        stdevs = np.concatenate((per_label.std(), overall.std()))
+        np.savetxt(constants.csv_filename(name(k + '_mean')),
+            np.concatenate((every_label, means), axis=1), delimiter=',')
+        np.savetxt(constants.csv_filename(name(k + '_stdev')),
+            np.concatenate((every_label, stdevs), axis=1), delimiter=',')
+
+    per_label, overall = stats['pixels']
+    label_means, label_stdevs = channel_stats(per_label)
+    means, stdevs = channel_stats(overall)
+    means = np.concatenate((label_means, means))
+    stdevs = np.concatenate((label_stdevs, stdevs))
+    np.savetxt(constants.csv_filename(name('channels')),
+        np.concatenate((every_label, means, stdevs), axis=1), delimiter=',')
+
+    save_image(overall.mean[0], constants.filename(name('average_image'), extension='.png'))
+    for label in range(constants.n_labels):
+        if per_label.count[label] > 0:
+            save_image(per_label.mean[label],
+                constants.filename(name('average_image'), label, extension='.png'))
+    return means, stdevs, np.append(per_label.count, overall.count)
+
+
+def report(means, stdevs, counts):
+    print('label, images, ' + ', '.join('mean_' + str(c) for c in range(img_colors))
+        + ', ' + ', '.join('stdev_' + str(c) for c in range(img_colors)))
+    for i in range(len(counts)):
+        label = 'all' if i == constants.n_labels else str(i)
+        print(label + ', ' + str(counts[i]) + ', '
+            + ', '.join('{:.4f}'.format(v) for v in np.concatenate((means[i], stdevs[i]))))
+
+
+if __name__ == "__main__" :
+    parser = argparse.ArgumentParser(description='Statistics of the images of the dataset.')
+    parser.add_argument('-e', dest='experiment', type=int,
+                        help='occlude images as in the experiment given (5 to 8).')
+    parser.add_argument('-o', dest='occlusion', type=float,
+                        help='proportion of occlusion.')
+    args = parser.parse_args()
+    experiment = args.experiment
+    occlusion = args.occlusion
+    # Bar patterns are as long as the side of MNIST images, not of these.
+    bars_type = None
+
+    if experiment is not None:
+        if (experiment < constants.EXP_5) or (constants.EXP_8 < experiment):
+            print_error("Occlusion is only applied as in experiments 5 to 8 "
+                + "(bars are sized for 28 pixels, not {0})".format(img_rows))
+            exit(1)
+        elif (occlusion is None) or (occlusion < 0) or (1 < occlusion):
+            print_error("Occlusion needs to be a value between 0 and 1")
+            exit(2)
+    elif occlusion is not None:
+        print_error("Occlusion needs an experiment (-e)")
+        exit(1)
+
+    data, labels = load_images()
+    counts_rows, counts_cols, stats = dataset_stats(data, labels, experiment, occlusion, bars_type)
+    means, stdevs, counts = save_stats(counts_rows, counts_cols, stats, labels,
+        lambda s: stats_name(s, experiment, occlusion, bars_type))
+    report(means, stdevs, counts)
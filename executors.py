@@ -0,0 +1,87 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Execution of the tasks of the experiments, in threads, processes or serially.
+
+Tasks of the experiments spend most of their time in NumPy, which releases
+the GIL, so threads run them in parallel sharing their arrays, with no cost
+for starting workers (which re-import the modules, TensorFlow included) or
+for pickling data. Processes are still better for large workloads, where
+the Python parts of the tasks would wait for the GIL. The automatic choice
+runs a single task (or a single job) serially, workloads up to thread_work
+in threads, and larger ones in processes.
+
+Processes are always chosen automatically while counters are recorded,
+because counters are kept per process and threads would count each
+other's calls.
+"""
+
+from joblib import Parallel, delayed
+
+import constants
+import instrumentation
+
+AUTO = 'auto'
+SERIAL = 'serial'
+THREADS = 'threads'
+PROCESSES = 'processes'
+kinds = [AUTO, SERIAL, THREADS, PROCESSES]
+
+# Work (values of features handled by all tasks) up to which threads are used.
+thread_work = 2**28
+
+_backends = {THREADS: 'threading', PROCESSES: 'loky'}
+
+
+class Executor(object):
+    """ Runs tasks, given as tuples of arguments of a function, in a kind of workers.
+    """
+
+    def __init__(self, kind = AUTO, n_jobs = constants.n_jobs, verbose = 0):
+        if kind not in kinds:
+            raise ValueError('Unknown kind of executor: ' + str(kind))
+        self.kind = kind
+        self.n_jobs = n_jobs
+        self.verbose = verbose
+
+    def choose(self, n_tasks, work = None):
+        """ Returns the kind of workers for a number of tasks and their work.
+
+        Work unknown (None) is taken as large.
+        """
+        if self.kind != AUTO:
+            return self.kind
+        if (n_tasks <= 1) or (self.n_jobs == 1):
+            return SERIAL
+        if instrumentation.counting() or (work is None) or (work > thread_work):
+            return PROCESSES
+        return THREADS
+
+    def map(self, function, tasks, work = None):
+        """ Returns the results of the function for every tuple of arguments, in order.
+        """
+        tasks = list(tasks)
+        kind = self.choose(len(tasks), work)
+        if kind == SERIAL:
+            return [function(*arguments) for arguments in tasks]
+        return Parallel(n_jobs=self.n_jobs, backend=_backends[kind], verbose=self.verbose)(
+            delayed(function)(*arguments) for arguments in tasks)
+
+
+def nested(n_jobs = constants.n_jobs) -> Executor:
+    """ Returns the executor for work split within a task: threads, so that
+    workers do not start processes of their own.
+    """
+    return Executor(THREADS if n_jobs > 1 else SERIAL, n_jobs)
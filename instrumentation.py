@@ -0,0 +1,241 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Timing and resource instrumentation for the experiments.
+
+Stages of work are delimited with the stage context manager,
+
+    with instrumentation.stage('recalling', items=len(cues)) as record:
+        ...
+
+which records their wall time, CPU time, peak resident memory of the process
+(up to the end of the stage) and number of items processed. Tasks run by
+joblib in other processes are wrapped with traced, so their records travel
+back with their results and are added to the trace by collect.
+
+Recording is off until enable is called, and stages cost next to nothing
+while it is off. Modules may also register counters (see add_counters),
+which are enabled on request and added up across tasks in the trace.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.
+    resource = None
+
+
+def peak_rss():
+    """ Returns the peak resident memory of the process so far, in bytes.
+    """
+    if resource is None:
+        return 0
+    # Linux reports kilobytes, while macOS reports bytes.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if os.uname().sysname == 'Darwin' else rss*1024
+
+
+class Tracer(object):
+    def __init__(self, enabled = False, counting = False):
+        self.enabled = enabled
+        self.counting = counting
+        self.records = []
+
+    @contextlib.contextmanager
+    def stage(self, name, category = 'stage', items = None, **args):
+        """ Records the resources used by the block it delimits.
+
+        The record is given to the block, so it may update its items.
+        """
+        if not self.enabled:
+            yield {}
+            return
+
+        record = {'name': name, 'category': category, 'items': items,
+            'pid': os.getpid(), 'tid': threading.get_ident(), 'args': args}
+        record['start'] = time.time()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall'] = time.perf_counter() - wall
+            record['cpu'] = time.process_time() - cpu
+            record['peak_rss'] = peak_rss()
+            self.records.append(record)
+
+    def add(self, records):
+        self.records += records
+
+    def counters(self):
+        """ Adds up the counters of this process and those of traced tasks.
+        """
+        total = {}
+        for name in counter_sources:
+            _, snapshot = counter_sources[name]
+            total[name] = snapshot()
+        for r in self.records:
+            if r['pid'] == os.getpid():
+                # Already in the counters of this process.
+                continue
+            for name, counts in r.get('counters', {}).items():
+                total[name] = merge_counts(total.get(name, {}), counts)
+        return total
+
+    def save(self, filename, chrome = False):
+        """ Saves the trace as JSON, or in the Chrome trace event format.
+        """
+        if chrome:
+            origin = min([r['start'] for r in self.records], default=0.0)
+            events = []
+            for r in self.records:
+                args = dict(r['args'])
+                args.update({'cpu': r['cpu'], 'items': r['items'], 'peak_rss': r['peak_rss']})
+                events.append({'name': r['name'], 'cat': r['category'], 'ph': 'X',
+                    'ts': (r['start'] - origin)*1e6, 'dur': r['wall']*1e6,
+                    'pid': r['pid'], 'tid': r['tid'], 'args': args})
+            trace = {'traceEvents': events, 'displayTimeUnit': 'ms'}
+        else:
+            trace = {'records': self.records}
+        if self.counting:
+            trace['counters'] = self.counters()
+
+        with open(filename, 'w') as outfile:
+            json.dump(trace, outfile, default=str)
+
+
+def merge_counts(a, b):
+    """ Adds up two nested dictionaries of counts.
+    """
+    merged = dict(a)
+    for key in b:
+        if isinstance(b[key], dict):
+            merged[key] = merge_counts(a.get(key, {}), b[key])
+        else:
+            merged[key] = a.get(key, 0) + b[key]
+    return merged
+
+
+def subtract_counts(a, b):
+    """ Subtracts counts in b from those in a (nested dictionaries).
+    """
+    difference = dict(a)
+    for key in b:
+        if isinstance(b[key], dict):
+            difference[key] = subtract_counts(a.get(key, {}), b[key])
+        else:
+            difference[key] = a.get(key, 0) - b[key]
+    return difference
+
+
+# Modules with counters, each with functions to enable them and to get them.
+counter_sources = {}
+
+
+def add_counters(name, enable, snapshot):
+    counter_sources[name] = (enable, snapshot)
+
+
+# The tracer of the process, and those of traced tasks running in its threads.
+tracer = Tracer()
+_local = threading.local()
+
+
+def current():
+    return getattr(_local, 'tracer', None) or tracer
+
+
+def enable(counting = False):
+    """ Starts recording, and counting in modules with counters if asked.
+    """
+    tracer.enabled = True
+    tracer.counting = counting
+    if counting:
+        for name in counter_sources:
+            enable_counters, _ = counter_sources[name]
+            enable_counters()
+
+
+def counting():
+    return current().counting
+
+
+def enabled():
+    return current().enabled
+
+
+def stage(name, category = 'stage', items = None, **args):
+    return current().stage(name, category, items, **args)
+
+
+class _Traced(object):
+    """ Runs a function with a tracer of its own and returns its records too.
+    """
+
+    def __init__(self, function, name, enabled, counting):
+        self.function = function
+        self.name = name
+        self.enabled = enabled
+        self.counting = counting
+
+    def __call__(self, *args, **kwargs):
+        outer = getattr(_local, 'tracer', None)
+        _local.tracer = Tracer(self.enabled, self.counting)
+        try:
+            counters = {}
+            if self.counting:
+                # Counters count since they are enabled, so only what the task adds is kept.
+                for name in counter_sources:
+                    enable_counters, snapshot = counter_sources[name]
+                    enable_counters()
+                    counters[name] = snapshot()
+            with _local.tracer.stage(self.name, 'task') as record:
+                result = self.function(*args, **kwargs)
+            for name in counters:
+                _, snapshot = counter_sources[name]
+                record['counters'] = record.get('counters', {})
+                record['counters'][name] = subtract_counts(snapshot(), counters[name])
+            return result, _local.tracer.records
+        finally:
+            _local.tracer = outer
+
+
+def traced(function, name = None):
+    """ Wraps a function to be run by joblib, so it is traced where it runs.
+
+    Results of the wrapped function must be passed through collect.
+    """
+    name = function.__name__ if name is None else name
+    return _Traced(function, name, enabled(), counting())
+
+
+def collect(results):
+    """ Adds to the trace the records of traced tasks and returns their results.
+    """
+    values = []
+    for result, records in results:
+        current().add(records)
+        values.append(result)
+    return values
+
+
+def save(filename, chrome = False):
+    tracer.save(filename, chrome)
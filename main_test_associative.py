@@ -14,330 +14,102 @@
 # limitations under the License.
 
 import sys
+import os
 import gc
 import argparse
 import gettext
 
 import numpy as np
-from joblib import Parallel, delayed
-import matplotlib as mpl
-import matplotlib.pyplot as plt
-import random
 import json
 
 import constants
 import convnet
-from associative import AssociativeMemory
+import executors
+import instrumentation
+import metrics
+import plotting
+import running_stats
+import results_store
+from recall_store import RecallWriter
+from assignment import Clustering, experiment_assignment, grouped, read_groups
+from associative import SparseAssociativeMemory, save_memories, sharded_fill
+from quantizer import Quantizer, GLOBAL_CALIBRATION, calibrations
 
 # Translation
-gettext.install('ame', localedir=None, codeset=None, names=None)
+gettext.install('ame', localedir=None, names=None)
 
 def print_error(*s):
     print('Error:', *s, file = sys.stderr)
 
 
-def plot_pre_graph (pre_mean, rec_mean, ent_mean, pre_std, rec_std, ent_std, \
-    tag = '', xlabels = constants.memory_sizes, xtitle = None, \
-        ytitle = None, action=None, occlusion = None, bars_type = None, tolerance = 0):
+def get_ams_results(midx, msize, domain, assignment, trf, tef, trl, tel, quantizer, tolerances=(0,),
+        executor = None):
 
-    plt.clf()
-    plt.figure(figsize=(6.4,4.8))
+    # Round the values, with the calibration of the fold.
+    quantizer = quantizer.resized(msize)
+    trf_rounded = quantizer.quantize(trf)
+    tef_rounded = quantizer.quantize(tef)
 
-    full_length = 100.0
-    step = 0.1
-    main_step = full_length/len(xlabels)
-    x = np.arange(0, full_length, main_step)
+    nmems = assignment.n_memories
 
-    # One main step less because levels go on sticks, not
-    # on intervals.
-    xmax = full_length - main_step + step
-
-    # Gives space to fully show markers in the top.
-    ymax = full_length + 2
-
-    plt.errorbar(x, pre_mean, fmt='r-o', yerr=pre_std, label=_('Precision'))
-    plt.errorbar(x, rec_mean, fmt='b--s', yerr=rec_std, label=_('Recall'))
-
-    plt.xlim(0, xmax)
-    plt.ylim(0, ymax)
-    plt.xticks(x, xlabels)
-
-    if xtitle is None:
-        xtitle = _('Range Quantization Levels')
-    if ytitle is None: 
-        ytitle = _('Percentage')
-
-    plt.xlabel(xtitle)
-    plt.ylabel(ytitle)
-    plt.legend(loc=4)
-    plt.grid(True)
-
-    entropy_labels = [str(e) for e in np.around(ent_mean, decimals=1)]
-
-    cmap = mpl.colors.LinearSegmentedColormap.from_list('mycolors',['cyan','purple'])
-    Z = [[0,0],[0,0]]
-    levels = np.arange(0.0, xmax, step)
-    CS3 = plt.contourf(Z, levels, cmap=cmap)
-
-    cbar = plt.colorbar(CS3, orientation='horizontal')
-    cbar.set_ticks(x)
-    cbar.ax.set_xticklabels(entropy_labels)
-    cbar.set_label(_('Entropy'))
-
-    s = tag + 'graph_prse_MEAN' + _('-english')
-    graph_filename = constants.picture_filename(s, action, occlusion, bars_type, tolerance)
-    plt.savefig(graph_filename, dpi=600)
-
-
-def plot_size_graph (response_size, size_stdev, action=None, tolerance=0):
-    plt.clf()
-
-    full_length = 100.0
-    step = 0.1
-    main_step = full_length/len(response_size)
-    x = np.arange(0, full_length, main_step)
-
-    # One main step less because levels go on sticks, not
-    # on intervals.
-    xmax = full_length - main_step + step
-    ymax = constants.n_labels
-
-    plt.errorbar(x, response_size, fmt='g-D', yerr=size_stdev, label=_('Average number of responses'))
-    plt.xlim(0, xmax)
-    plt.ylim(0, ymax)
-    plt.xticks(x, constants.memory_sizes)
-    plt.yticks(np.arange(0,ymax+1, 1), range(constants.n_labels+1))
-
-    plt.xlabel(_('Range Quantization Levels'))
-    plt.ylabel(_('Size'))
-    plt.legend(loc=1)
-    plt.grid(True)
-
-    graph_filename = constants.picture_filename('graph_size_MEAN' + _('-english'), action, tolerance=tolerance)
-    plt.savefig(graph_filename, dpi=600)
-
-
-def plot_behs_graph(no_response, no_correct, no_chosen, correct, action=None, tolerance=0):
-
-    for i in range(len(no_response)):
-        total = (no_response[i] + no_correct[i] + no_chosen[i] + correct[i])/100.0
-        no_response[i] /= total
-        no_correct[i] /= total
-        no_chosen[i] /= total
-        correct[i] /= total
-
-    plt.clf()
-
-    full_length = 100.0
-    step = 0.1
-    main_step = full_length/len(constants.memory_sizes)
-    x = np.arange(0.0, full_length, main_step)
-
-    # One main step less because levels go on sticks, not
-    # on intervals.
-    xmax = full_length - main_step + step
-    ymax = full_length
-    width = 5       # the width of the bars: can also be len(x) sequence
-
-    plt.bar(x, correct, width, label=_('Correct response chosen'))
-    cumm = np.array(correct)
-    plt.bar(x, no_chosen,  width, bottom=cumm, label=_('Correct response not chosen'))
-    cumm += np.array(no_chosen)
-    plt.bar(x, no_correct, width, bottom=cumm, label=_('No correct response'))
-    cumm += np.array(no_correct)
-    plt.bar(x, no_response, width, bottom=cumm, label=_('No responses'))
-
-    plt.xlim(-width, full_length + width)
-    plt.ylim(0.0, full_length)
-    plt.xticks(x, constants.memory_sizes)
-
-    plt.xlabel(_('Range Quantization Levels'))
-    plt.ylabel(_('Labels'))
-
-    plt.legend(loc=0)
-    plt.grid(axis='y')
-
-    graph_filename = constants.picture_filename('graph_behaviours_MEAN' + _('-english'), action, tolerance=tolerance)
-    plt.savefig(graph_filename, dpi=600)
-
-
-def plot_features_graph(domain, means, stdevs, experiment, occlusion = None, bars_type = None):
-    """ Draws the characterist shape of features per label.
-
-    The graph is a dots and lines graph with error bars denoting standard deviations.
-    """
-    ymin = np.PINF
-    ymax = np.NINF
-    for i in constants.all_labels:
-        yn = (means[i] - stdevs[i]).min()
-        yx = (means[i] + stdevs[i]).max()
-        ymin = ymin if ymin < yn else yn
-        ymax = ymax if ymax > yx else yx
-
-    main_step = 100.0 / domain
-    xrange = np.arange(0, 100, main_step)
-    fmts = constants.label_formats
-
-    for i in constants.all_labels:
-        plt.clf()
-        plt.figure(figsize=(12,5))
-
-        plt.errorbar(xrange, means[i], fmt=fmts[i], yerr=stdevs[i], label=str(i))
-        plt.xlim(0, 100)
-        plt.ylim(ymin, ymax)
-        plt.xticks(xrange, labels='')
-
-        plt.xlabel(_('Features'))
-        plt.ylabel(_('Values'))
-        plt.legend(loc='right')
-        plt.grid(True)
-
-        filename = constants.features_name(experiment, occlusion, bars_type) + '-' + str(i) + _('-english')
-        plt.savefig(constants.picture_filename(filename), dpi=500)
-
-
-def get_label(memories, entropies = None):
-
-    # Random selection
-    if entropies is None:
-        i = random.atddrange(len(memories))
-        return memories[i]
-    else:
-        i = memories[0] 
-        entropy = entropies[i]
-
-        for j in memories[1:]:
-            if entropy > entropies[j]:
-                i = j
-                entropy = entropies[i]
-    
-    return i
-
-
-def msize_features(features, msize, min_value, max_value):
-    return np.round((msize-1)*(features-min_value) / (max_value-min_value)).astype(np.int16)
-    
-
-def get_ams_results(midx, msize, domain, lpm, trf, tef, trl, tel, tolerance=0):
-
-    # Round the values
-    max_value = trf.max()
-    other_value = tef.max()
-    max_value = max_value if max_value > other_value else other_value
-
-    min_value = trf.min()
-    other_value = tef.min()
-    min_value = min_value if min_value < other_value else other_value
-
-    trf_rounded = msize_features(trf, msize, min_value, max_value)
-    tef_rounded = msize_features(tef, msize, min_value, max_value)
-
-    n_labels = constants.n_labels
-    nmems = int(n_labels/lpm)
-
-    measures = np.zeros((constants.n_measures, nmems), dtype=np.float64)
     entropy = np.zeros(nmems, dtype=np.float64)
-    behaviour = np.zeros(constants.n_behaviours, dtype=np.float64)
 
-    # Confusion matrix for calculating precision and recall per memory.
-    cms = np.zeros((nmems, 2, 2))
-    TP = (0,0)
-    FP = (0,1)
-    FN = (1,0)
-    TN = (1,1)
-
-    # Create the required associative memories.
-    ams = dict.fromkeys(range(nmems))
-    for m in ams:
-        ams[m] = AssociativeMemory(domain, msize, tolerance)
-
-    # Registration
-    for features, label in zip(trf_rounded, trl):
-        m = int(label/lpm)
-        ams[m].register(features)
+    # Registration, with the corpus split among the workers of the executor.
+    executor = executors.nested() if executor is None else executor
+    filled = sharded_fill(domain, msize, trf_rounded, assignment.memories(trl),
+        executor=executor, memory_class=SparseAssociativeMemory)
+    ams = {m: filled.get(m, SparseAssociativeMemory(domain, msize)) for m in range(nmems)}
 
     # Calculate entropies
     for m in ams:
         entropy[m] = ams[m].entropy
 
-    # Recognition
-    response_size = 0
-
-    for features, label in zip(tef_rounded, tel):
-        correct = int(label/lpm)
-
-        memories = []
-        for k in ams:
-            recognized = ams[k].recognize(features)
-            if recognized:
-                memories.append(k)
-
-            # For calculation of per memory precision and recall
-            if (k == correct) and recognized:
-                cms[k][TP] += 1
-            elif k == correct:
-                cms[k][FN] += 1
-            elif recognized:
-                cms[k][FP] += 1
-            else:
-                cms[k][TN] += 1
- 
-        response_size += len(memories)
-        if len(memories) == 0:
-            # Register empty case
-            behaviour[constants.no_response_idx] += 1
-        elif not (correct in memories):
-            behaviour[constants.no_correct_response_idx] += 1
-        else:
-            l = get_label(memories, entropy)
-            if l != correct:
-                behaviour[constants.no_correct_chosen_idx] += 1
-            else:
-                behaviour[constants.correct_response_idx] += 1
-
-    behaviour[constants.mean_responses_idx] = response_size /float(len(tef_rounded))
-    all_responses = len(tef_rounded) - behaviour[constants.no_response_idx]
-    all_precision = (behaviour[constants.correct_response_idx])/float(all_responses)
-    all_recall = (behaviour[constants.correct_response_idx])/float(len(tef_rounded))
-
-    behaviour[constants.precision_idx] = all_precision
-    behaviour[constants.recall_idx] = all_recall
-
-    for m in range(nmems):
-        total_positives = cms[m][TP] + cms[m][FP]
-        if total_positives == 0:
-            print(f'Memory {m} in run {midx}, memory size {msize}, did not respond.')
-            measures[constants.precision_idx,m] = 1
-        else:
-            measures[constants.precision_idx,m] = cms[m][TP] / total_positives
-        measures[constants.recall_idx,m] = cms[m][TP] /(cms[m][TP] + cms[m][FN])
-   
-    return (midx, measures, entropy, behaviour)
-    
+    # Mismatches, as a matrix of cues x memories, from which recognition
+    # is derived for every tolerance.
+    mismatches = np.stack([ams[m].mismatches_many(tef_rounded) for m in ams], axis=1)
+    correct = assignment.memories(tel)
+
+    precision, recall, behaviour = \
+        metrics.tolerance_curves(mismatches, entropy, correct, tolerances)
 
-def test_memories(domain, experiment, tolerance=0):
+    measures = np.zeros((len(tolerances), constants.n_measures, nmems), dtype=np.float64)
+    measures[:, constants.precision_idx, :] = precision
+    measures[:, constants.recall_idx, :] = recall
 
-    average_entropy = []
-    stdev_entropy = []
+    for k, tolerance in enumerate(tolerances):
+        for m in np.nonzero(~(mismatches <= tolerance).any(axis=0))[0]:
+            print(f'Memory {m} in run {midx}, memory size {msize}, tolerance {tolerance}, did not respond.')
 
-    average_precision = []
-    stdev_precision = [] 
-    average_recall = []
-    stdev_recall = []
+    return (midx, measures, entropy, behaviour)
+    
 
-    all_precision = []
-    all_recall = []
+def test_memories(domain, experiment, tolerances=(0,), calibration = GLOBAL_CALIBRATION, store = None,
+        executor = None, assignment = None):
+    """ Measures memories of all sizes, for every tolerance given.
 
-    no_response = []
-    no_correct_response = []
-    no_correct_chosen = []
-    correct_chosen = []
-    total_responses = []
+    Memory sizes are measured by the executor given (chosen by workload if
+    None). Measures of every fold are appended to the results store, if given.
+    Labels are kept by the memories of the assignment (that of the experiment
+    if None), fit to the training features of every fold.
+    """
+    executor = executors.Executor(verbose=50) if executor is None else executor
+    n_sizes = len(constants.memory_sizes)
+    n_tolerances = len(tolerances)
+    training_stages = constants.training_stages
 
-    labels_x_memory = constants.labels_per_memory[experiment]
-    n_memories = int(constants.n_labels/labels_x_memory)
+    assignment = experiment_assignment(experiment) if assignment is None else assignment
+    n_memories = assignment.n_memories
 
-    for i in range(constants.training_stages):
+    # Measures per fold, (tolerance,) and memory size.
+    average_entropy = np.zeros((training_stages, n_sizes))
+    stdev_entropy = np.zeros((training_stages, n_sizes))
+    average_precision = np.zeros((training_stages, n_tolerances, n_sizes))
+    stdev_precision = np.zeros((training_stages, n_tolerances, n_sizes))
+    average_recall = np.zeros((training_stages, n_tolerances, n_sizes))
+    stdev_recall = np.zeros((training_stages, n_tolerances, n_sizes))
+    all_behaviours = np.zeros((training_stages, n_tolerances, n_sizes, constants.n_behaviours))
+
+    for i in range(training_stages):
         gc.collect()
 
         suffix = constants.filling_suffix
@@ -356,269 +128,213 @@ def test_memories(domain, experiment, tolerance=0):
         training_labels = np.load(training_labels_filename)
         testing_features = np.load(testing_features_filename)
         testing_labels = np.load(testing_labels_filename)
+        quantizer = Quantizer(constants.ideal_memory_size, calibration) \
+            .fit(training_features, testing_features)
+        fold_assignment = assignment.fit(training_features, training_labels)
 
-        measures_per_size = np.zeros((len(constants.memory_sizes), \
+        measures_per_size = np.zeros((n_tolerances, n_sizes, \
             n_memories, constants.n_measures), dtype=np.float64)
 
         # An entropy value per memory size and memory.
-        entropies = np.zeros((len(constants.memory_sizes), n_memories), dtype=np.float64)
-        behaviours = np.zeros((len(constants.memory_sizes), constants.n_behaviours))
+        entropies = np.zeros((n_sizes, n_memories), dtype=np.float64)
+        behaviours = np.zeros((n_tolerances, n_sizes, constants.n_behaviours))
 
         print('Train the different co-domain memories -- NxM: ',experiment,' run: ',i)
-        # Processes running in parallel.
-        list_measures_entropies = Parallel(n_jobs=constants.n_jobs, verbose=50)(
-            delayed(get_ams_results)(midx, msize, domain, labels_x_memory, \
-                training_features, testing_features, training_labels, testing_labels, tolerance) \
-                    for midx, msize in enumerate(constants.memory_sizes))
+        # Memory sizes measured in parallel.
+        work = n_sizes*(training_features.size + testing_features.size)
+        with instrumentation.stage('fold', 'fold', items=len(testing_labels), fold=i):
+            list_measures_entropies = instrumentation.collect(executor.map(
+                instrumentation.traced(get_ams_results),
+                [(midx, msize, domain, fold_assignment, training_features, testing_features,
+                    training_labels, testing_labels, quantizer, tolerances)
+                        for midx, msize in enumerate(constants.memory_sizes)], work))
 
         for j, measures, entropy, behaviour in list_measures_entropies:
-            measures_per_size[j, :, :] = measures.T
+            measures_per_size[:, j, :, :] = np.transpose(measures, (0, 2, 1))
             entropies[j, :] = entropy
-            behaviours[j, :] = behaviour
-
-
-        ##########################################################################################
-
-        # Calculate precision and recall
-
-        precision = np.zeros((len(constants.memory_sizes), n_memories+2), dtype=np.float64)
-        recall = np.zeros((len(constants.memory_sizes), n_memories+2), dtype=np.float64)
-
-        for j, s in enumerate(constants.memory_sizes):
-            precision[j, 0:n_memories] = measures_per_size[j, : , constants.precision_idx]
-            precision[j, constants.mean_idx(n_memories)] = measures_per_size[j, : , constants.precision_idx].mean()
-            precision[j, constants.std_idx(n_memories)] = measures_per_size[j, : , constants.precision_idx].std()
-            recall[j, 0:n_memories] = measures_per_size[j, : , constants.recall_idx]
-            recall[j, constants.mean_idx(n_memories)] = measures_per_size[j, : , constants.recall_idx].mean()
-            recall[j, constants.std_idx(n_memories)] = measures_per_size[j, : , constants.recall_idx].std()
-        
+            behaviours[:, j, :] = behaviour
 
         ###################################################################3##
         # Measures by memory size
 
+        precision = measures_per_size[:, :, :, constants.precision_idx]
+        recall = measures_per_size[:, :, :, constants.recall_idx]
+
         # Average entropy among al digits.
-        average_entropy.append( entropies.mean(axis=1) )
-        stdev_entropy.append( entropies.std(axis=1) )
+        average_entropy[i] = entropies.mean(axis=1)
+        stdev_entropy[i] = entropies.std(axis=1)
 
         # Average precision as percentage
-        average_precision.append( precision[:, constants.mean_idx(n_memories)] * 100 )
-        stdev_precision.append( precision[:, constants.std_idx(n_memories)] * 100 )
+        average_precision[i] = precision.mean(axis=2) * 100
+        stdev_precision[i] = precision.std(axis=2) * 100
 
         # Average recall as percentage
-        average_recall.append( recall[:, constants.mean_idx(n_memories)] * 100 )
-        stdev_recall.append( recall[:, constants.std_idx(n_memories)] * 100 )
-
-        all_precision.append(behaviours[:, constants.precision_idx] * 100)
-        all_recall.append(behaviours[:, constants.recall_idx] * 100)
-
-        no_response.append(behaviours[:, constants.no_response_idx])
-        no_correct_response.append(behaviours[:, constants.no_correct_response_idx])
-        no_correct_chosen.append(behaviours[:, constants.no_correct_chosen_idx])
-        correct_chosen.append(behaviours[:, constants.correct_response_idx])
-        total_responses.append(behaviours[:, constants.mean_responses_idx])
-
- 
-    average_precision = np.array(average_precision)
-    stdev_precision = np.array(stdev_precision)
-    main_average_precision =[]
-    main_stdev_precision = []
-
-    average_recall=np.array(average_recall)
-    stdev_recall = np.array(stdev_recall)
-    main_average_recall = []
-    main_stdev_recall = []
-
-    all_precision = np.array(all_precision)
-    main_all_average_precision = []
-    main_all_stdev_precision = []
-
-    all_recall = np.array(all_recall)
-    main_all_average_recall = []
-    main_all_stdev_recall = []
-
-    average_entropy=np.array(average_entropy)
-    stdev_entropy=np.array(stdev_entropy)
-    main_average_entropy=[]
-    main_stdev_entropy=[]
-
-    no_response = np.array(no_response)
-    no_correct_response = np.array(no_correct_response)
-    no_correct_chosen = np.array(no_correct_chosen)
-    correct_chosen = np.array(correct_chosen)
-    total_responses = np.array(total_responses)
-
-    main_no_response = []
-    main_no_correct_response = []
-    main_no_correct_chosen = []
-    main_correct_chosen = []
-    main_total_responses = []
-    main_total_responses_stdev = []
-
-
-    for i in range(len(constants.memory_sizes)):
-        main_average_precision.append( average_precision[:,i].mean() )
-        main_average_recall.append( average_recall[:,i].mean() )
-        main_average_entropy.append( average_entropy[:,i].mean() )
-
-        main_stdev_precision.append( stdev_precision[:,i].mean() )
-        main_stdev_recall.append( stdev_recall[:,i].mean() )
-        main_stdev_entropy.append( stdev_entropy[:,i].mean() )
-
-        main_all_average_precision.append(all_precision[:, i].mean())
-        main_all_stdev_precision.append(all_precision[:, i].std())
-        main_all_average_recall.append(all_recall[:, i].mean())
-        main_all_stdev_recall.append(all_recall[:, i].std())
-
-        main_no_response.append(no_response[:, i].mean())
-        main_no_correct_response.append(no_correct_response[:, i].mean())
-        main_no_correct_chosen.append(no_correct_chosen[:, i].mean())
-        main_correct_chosen.append(correct_chosen[:, i].mean())
-        main_total_responses.append(total_responses[:, i].mean())
-        main_total_responses_stdev.append(total_responses[:, i].std())
-
-    main_behaviours = [main_no_response, main_no_correct_response, \
-        main_no_correct_chosen, main_correct_chosen, main_total_responses]
+        average_recall[i] = recall.mean(axis=2) * 100
+        stdev_recall[i] = recall.std(axis=2) * 100
 
-    np.savetxt(constants.csv_filename('memory_average_precision-{0}'.format(experiment),
-        tolerance=tolerance), average_precision, delimiter=',')
-    np.savetxt(constants.csv_filename('memory_average_recall-{0}'.format(experiment),
-        tolerance=tolerance), average_recall, delimiter=',')
-    np.savetxt(constants.csv_filename('memory_average_entropy-{0}'.format(experiment),
-        tolerance=tolerance), average_entropy, delimiter=',')
+        all_behaviours[i] = behaviours
 
-    np.savetxt(constants.csv_filename('memory_stdev_precision-{0}'.format(experiment),
-        tolerance=tolerance), stdev_precision, delimiter=',')
-    np.savetxt(constants.csv_filename('memory_stdev_recall-{0}'.format(experiment),
-        tolerance=tolerance), stdev_recall, delimiter=',')
-    np.savetxt(constants.csv_filename('memory_stdev_entropy-{0}'.format(experiment),
-        tolerance=tolerance), stdev_entropy, delimiter=',')
+        if store is not None:
+            store.append_sizes(experiment, i, tolerances, constants.memory_sizes,
+                precision, recall, entropies, behaviours)
 
-    np.savetxt(constants.csv_filename('all_precision-{0}'.format(experiment),
-        tolerance=tolerance), all_precision, delimiter=',')
-    np.savetxt(constants.csv_filename('all_recall-{0}'.format(experiment),
-        tolerance=tolerance), all_recall, delimiter=',')
-    np.savetxt(constants.csv_filename('main_behaviours-{0}'.format(experiment),
-        tolerance=tolerance), main_behaviours, delimiter=',')
-
-    plot_pre_graph(main_average_precision, main_average_recall, main_average_entropy,\
-        main_stdev_precision, main_stdev_recall, main_stdev_entropy, action=experiment, \
-        tolerance=tolerance)
-
-    plot_pre_graph(main_all_average_precision, main_all_average_recall, \
-        main_average_entropy, main_all_stdev_precision, main_all_stdev_recall,\
-            main_stdev_entropy, 'overall', action=experiment, tolerance=tolerance)
-
-    plot_size_graph(main_total_responses, main_total_responses_stdev, action=experiment, tolerance=tolerance)
-
-    plot_behs_graph(main_no_response, main_no_correct_response, main_no_correct_chosen,\
-        main_correct_chosen, action=experiment, tolerance=tolerance)
+    for k, tolerance in enumerate(tolerances):
+        save_memories_tests(experiment, tolerance, average_entropy, stdev_entropy,
+            average_precision[:, k], stdev_precision[:, k],
+            average_recall[:, k], stdev_recall[:, k], all_behaviours[:, k])
 
     print('Test complete')
 
 
-def get_recalls(ams, msize, domain, min_value, max_value, trf, trl, tef, tel, idx, fill):
+def save_memories_tests(experiment, tolerance, average_entropy, stdev_entropy,
+        average_precision, stdev_precision, average_recall, stdev_recall, behaviours):
+    """ Saves the results of test_memories for one tolerance, and graphs them.
 
-    n_mems = constants.n_labels
-
-    # To store precisión and recall per memory
-    measures = np.zeros((constants.n_measures, n_mems), dtype=np.float64)
+    Arguments are arrays of folds x memory sizes, except behaviours, which
+    has the behaviours per fold and memory size.
+    """
+    all_precision = behaviours[:, :, constants.precision_idx] * 100
+    all_recall = behaviours[:, :, constants.recall_idx] * 100
+
+    no_response = behaviours[:, :, constants.no_response_idx]
+    no_correct_response = behaviours[:, :, constants.no_correct_response_idx]
+    no_correct_chosen = behaviours[:, :, constants.no_correct_chosen_idx]
+    correct_chosen = behaviours[:, :, constants.correct_response_idx]
+    total_responses = behaviours[:, :, constants.mean_responses_idx]
+
+    main_average_precision = average_precision.mean(axis=0)
+    main_average_recall = average_recall.mean(axis=0)
+    main_average_entropy = average_entropy.mean(axis=0)
+
+    main_stdev_precision = stdev_precision.mean(axis=0)
+    main_stdev_recall = stdev_recall.mean(axis=0)
+    main_stdev_entropy = stdev_entropy.mean(axis=0)
+
+    main_all_average_precision = all_precision.mean(axis=0)
+    main_all_stdev_precision = all_precision.std(axis=0)
+    main_all_average_recall = all_recall.mean(axis=0)
+    main_all_stdev_recall = all_recall.std(axis=0)
+
+    main_no_response = no_response.mean(axis=0)
+    main_no_correct_response = no_correct_response.mean(axis=0)
+    main_no_correct_chosen = no_correct_chosen.mean(axis=0)
+    main_correct_chosen = correct_chosen.mean(axis=0)
+    main_total_responses = total_responses.mean(axis=0)
+    main_total_responses_stdev = total_responses.std(axis=0)
 
-    entropy = np.zeros(n_mems, dtype=np.float64)
+    main_behaviours = [main_no_response, main_no_correct_response, \
+        main_no_correct_chosen, main_correct_chosen, main_total_responses]
 
-    # Confusion matrix for calculating precision and recall per memory.
-    mem_cmatrix = np.zeros((n_mems, 2, 2))
-    TP = (0,0)
-    FP = (0,1)
-    FN = (1,0)
-    TN = (1,1)
+    np.savetxt(constants.csv_filename('memory_average_precision-{0}'.format(experiment)
+        + constants.tolerance_suffix(tolerance)), average_precision, delimiter=',')
+    np.savetxt(constants.csv_filename('memory_average_recall-{0}'.format(experiment)
+        + constants.tolerance_suffix(tolerance)), average_recall, delimiter=',')
+    np.savetxt(constants.csv_filename('memory_average_entropy-{0}'.format(experiment)
+        + constants.tolerance_suffix(tolerance)), average_entropy, delimiter=',')
+
+    np.savetxt(constants.csv_filename('memory_stdev_precision-{0}'.format(experiment)
+        + constants.tolerance_suffix(tolerance)), stdev_precision, delimiter=',')
+    np.savetxt(constants.csv_filename('memory_stdev_recall-{0}'.format(experiment)
+        + constants.tolerance_suffix(tolerance)), stdev_recall, delimiter=',')
+    np.savetxt(constants.csv_filename('memory_stdev_entropy-{0}'.format(experiment)
+        + constants.tolerance_suffix(tolerance)), stdev_entropy, delimiter=',')
+
+    np.savetxt(constants.csv_filename('all_precision-{0}'.format(experiment)
+        + constants.tolerance_suffix(tolerance)), all_precision, delimiter=',')
+    np.savetxt(constants.csv_filename('all_recall-{0}'.format(experiment)
+        + constants.tolerance_suffix(tolerance)), all_recall, delimiter=',')
+    np.savetxt(constants.csv_filename('main_behaviours-{0}'.format(experiment)
+        + constants.tolerance_suffix(tolerance)), main_behaviours, delimiter=',')
+
+    plotting.plot(
+        plotting.pre_graph(main_average_precision, main_average_recall, main_average_entropy,\
+            main_stdev_precision, main_stdev_recall, main_stdev_entropy, action=experiment, \
+            tolerance=tolerance),
+        plotting.pre_graph(main_all_average_precision, main_all_average_recall, \
+            main_average_entropy, main_all_stdev_precision, main_all_stdev_recall,\
+                main_stdev_entropy, 'overall', action=experiment, tolerance=tolerance),
+        plotting.size_graph(main_total_responses, main_total_responses_stdev, action=experiment, tolerance=tolerance),
+        plotting.behs_graph(main_no_response, main_no_correct_response, main_no_correct_chosen,\
+            main_correct_chosen, action=experiment, tolerance=tolerance))
+
+
+def get_recalls(ams, assignment, quantizer, domain, trf, trl, tef, tel, idx, fill,
+        tolerances = None, seed = None, executor = None):
+    """ Fills the memories and measures them against the testing cues.
+
+    Labels are kept by the memories of the assignment. Memories are
+    measured for every tolerance given (by default, their own one), but
+    features are recalled only when there is a single tolerance, and
+    returned with the cues accepted (None otherwise). Every memory recalls
+    with its own random stream, spawned from seed (a numpy SeedSequence).
+    Filling features are split among the workers of the executor.
+    """
+    n_mems = assignment.n_memories
 
-    # Confusion matrix for calculating overall precision and recall.
-    cmatrix = np.zeros((2,2))
+    entropy = np.zeros(n_mems, dtype=np.float64)
 
-    # Registration
-    for features, label in zip(trf, trl):
-        ams[label].register(features)
+    # Registration, merging the memories filled by every worker.
+    executor = executors.nested() if executor is None else executor
+    filled = sharded_fill(domain, ams[0].m, trf, assignment.memories(trl),
+        executor=executor, memory_class=SparseAssociativeMemory)
+    for j in filled:
+        ams[j].merge(filled[j])
 
     # Calculate entropies
     for j in ams:
         entropy[j] = ams[j].entropy
 
-    # The list of recalls recovered from memory.
-    all_recalls = []
-
-    # Total number of differences between features and memories.
-    mismatches = 0
-
-    # Recover memories
-    for n, features, label in zip(range(len(tef)), tef, tel):
-        memories = []
-        recalls ={}
-
-        # How much it was needed for the right memory to recognize
-        # the features.
-        mismatches += ams[label].mismatches(features)
-
-        for k in ams:
-            recall, recognized = ams[k].recall(features)
-
-            # For calculation of per memory precision and recall
-            if (k == label) and recognized:
-                mem_cmatrix[k][TP] += 1
-            elif k == label:
-                mem_cmatrix[k][FN] += 1
-            elif recognized:
-                mem_cmatrix[k][FP] += 1
-            else:
-                mem_cmatrix[k][TN] += 1
-
-            if recognized:
-                memories.append(k)
-                recalls[k] = recall
-
-        if (len(memories) == 0):
-            # Register empty case
-            undefined = np.full(domain, ams[0].undefined)
-            all_recalls.append((n, label, undefined))
-            cmatrix[FN] += 1
-        else:
-            l = get_label(memories, entropy)
-            features = recalls[l]*(max_value-min_value)*1.0/(msize-1) + min_value
-            all_recalls.append((n, label, features))
-
-            if l == label:
-                cmatrix[TP] += 1
-            else:
-                cmatrix[FP] += 1
-
-    for i in range(n_mems):
-        positives = mem_cmatrix[i][TP] + mem_cmatrix[i][FP]
-        if positives == 0:
+    # Mismatches, as a matrix of cues x memories, from which recognition
+    # is derived for every tolerance.
+    all_mismatches = np.stack([ams[k].mismatches_many(tef) for k in ams], axis=1)
+    if tolerances is None:
+        tolerances = [ams[0].t]
+
+    # How much it was needed for the right memory to recognize
+    # the features.
+    correct = assignment.memories(tel)
+    mismatches = all_mismatches[np.arange(len(tel)), correct].sum()
+
+    # Precision and recall per tolerance and memory, and overall.
+    precision, recall, behaviour = \
+        metrics.tolerance_curves(all_mismatches, entropy, correct, tolerances)
+    measures = np.zeros((len(tolerances), constants.n_measures, n_mems), dtype=np.float64)
+    measures[:, constants.precision_idx, :] = precision
+    measures[:, constants.recall_idx, :] = recall
+    total_precision = behaviour[:, constants.precision_idx]
+    total_recall = behaviour[:, constants.recall_idx]
+
+    for k, tolerance in enumerate(tolerances):
+        for i in np.nonzero(~(all_mismatches <= tolerance).any(axis=0))[0]:
             print(f'Memory {i} filled with {fill} in run {idx} did not respond.')
-            measures[constants.precision_idx,i] = 1.0
-        else:
-            measures[constants.precision_idx,i] = mem_cmatrix[i][TP] / positives
-        measures[constants.recall_idx,i] = \
-            mem_cmatrix[i][TP] /(mem_cmatrix[i][TP] + mem_cmatrix[i][FN])    
-
-    positives = cmatrix[TP] + cmatrix[FP]
-    if positives == 0:
-        print(f'System filled with {fill} in run {idx} did not respond.')
-        total_precision = 1.0
-    else: 
-        total_precision = cmatrix[TP] / positives
-    total_recall = cmatrix[TP] / len(tef)
+        if behaviour[k, constants.no_response_idx] == len(tef):
+            print(f'System filled with {fill} in run {idx} did not respond.')
+            # As memories that did not respond, it made no wrong responses.
+            total_precision[k] = 1.0
+
+    # The features recovered from memory, and the cues accepted.
+    all_recalls = None
+    if len(tolerances) == 1:
+        # Recover memories, from the memory chosen for every cue.
+        recognition = all_mismatches <= tolerances[0]
+        chosen = metrics.select_memories(recognition, entropy)
+        recalls = np.full(tef.shape, ams[0].undefined)
+        seed = np.random.SeedSequence() if seed is None else seed
+        order, bounds = assignment.partition(chosen)
+        for k, stream in zip(ams, seed.spawn(len(ams))):
+            rows = order[bounds[k]:bounds[k+1]]
+            if len(rows):
+                recalls[rows] = ams[k].lreduce_many(tef[rows], np.random.default_rng(stream))
+        features = quantizer.dequantize(recalls)
+        all_recalls = (features, chosen >= 0)
 
     mismatches /= len(tel)
 
     return all_recalls, measures, entropy, total_precision, total_recall, mismatches
     
 
-def test_recalling_fold(n_memories, mem_size, domain, fold, experiment, occlusion = None, bars_type = None, tolerance = 0):
-    # Create the required associative memories.
-    ams = dict.fromkeys(range(n_memories))
-    for j in ams:
-        ams[j] = AssociativeMemory(domain, mem_size, tolerance)
-
+def test_recalling_fold(assignment, mem_size, domain, fold, experiment, occlusion = None, bars_type = None, tolerances = (0,),
+        seed = None, calibration = GLOBAL_CALIBRATION):
     suffix = constants.filling_suffix
     filling_features_filename = constants.features_name(experiment) + suffix        
     filling_features_filename = constants.data_filename(filling_features_filename, fold)
@@ -635,23 +351,36 @@ def test_recalling_fold(n_memories, mem_size, domain, fold, experiment, occlusio
     filling_labels = np.load(filling_labels_filename)
     testing_features = np.load(testing_features_filename)
     testing_labels = np.load(testing_labels_filename)
+    assignment = assignment.fit(filling_features, filling_labels)
 
-    filling_max = filling_features.max()
-    testing_max = testing_features.max()
-    fillin_min = filling_features.min()
-    testing_min = testing_features.min()
+    # Create the required associative memories.
+    ams = dict.fromkeys(range(assignment.n_memories))
+    for j in ams:
+        ams[j] = SparseAssociativeMemory(domain, mem_size, tolerances[0])
 
-    maximum = filling_max if filling_max > testing_max else testing_max
-    minimum = fillin_min if fillin_min < testing_min else testing_min
+    quantizer = Quantizer(mem_size, calibration).fit(filling_features, testing_features)
 
-    filling_features = msize_features(filling_features, mem_size, minimum, maximum)
-    testing_features = msize_features(testing_features, mem_size, minimum, maximum)
+    # Keeps the calibration, so queries are quantized as the memories were.
+    calibration_filename = constants.calibration_name(experiment, occlusion, bars_type)
+    calibration_filename = constants.calibration_filename(calibration_filename, fold)
+    quantizer.save(calibration_filename)
+
+    # Recalls are kept with the type of the features the decoder takes.
+    writer = None
+    if len(tolerances) == 1:
+        memories_prefix = constants.memories_name(experiment, occlusion, bars_type, tolerances[0])
+        writer = RecallWriter(memories_prefix, fold, len(constants.memory_fills),
+            testing_labels, domain, testing_features.dtype)
+
+    filling_features = quantizer.quantize(filling_features)
+    testing_features = quantizer.quantize(testing_features)
 
     total = len(filling_labels)
     percents = np.array(constants.memory_fills)
     steps = np.round(total*percents/100.0).astype(int)
+    seed = np.random.SeedSequence() if seed is None else seed
+    step_seeds = seed.spawn(len(steps))
 
-    stage_recalls = []
     stage_entropies = []
     stage_mprecision = []
     stage_mrecall = []
@@ -660,33 +389,45 @@ def test_recalling_fold(n_memories, mem_size, domain, fold, experiment, occlusio
     mismatches = []
 
     start = 0
-    for end in steps:
+    for n, end in enumerate(steps):
         features = filling_features[start:end]
         labels = filling_labels[start:end]
 
-        recalls, measures, entropies, step_precision, step_recall, mis_count = get_recalls(ams, mem_size, domain, \
-            minimum, maximum, features, labels, testing_features, testing_labels, fold, end)
+        with instrumentation.stage('get_recalls', items=len(testing_labels), fold=fold, fill=n):
+            recalls, measures, entropies, step_precision, step_recall, mis_count = get_recalls(ams, assignment, quantizer, domain, \
+                features, labels, testing_features, testing_labels, fold, end, tolerances,
+                step_seeds[n])
+
+        # Keeps the memories as filled up to this step (with the first tolerance).
+        relations_filename = constants.relations_name(experiment, n, occlusion, bars_type,
+            tolerances[0])
+        relations_filename = constants.relations_filename(relations_filename, fold)
+        save_memories(ams, relations_filename)
 
-        # A list of tuples (position, label, features)
-        stage_recalls += recalls
+        # Features recalled per cue, and whether it was accepted.
+        if writer is not None:
+            writer.write(n, *recalls)
 
         # An array with entropies per memory, per step.
         stage_entropies.append(entropies)
 
-        # An array with precision per memory, per step
-        stage_mprecision.append(measures[constants.precision_idx,:])
+        # An array with precision per tolerance and memory, per step
+        stage_mprecision.append(measures[:, constants.precision_idx, :])
 
-        # An array with recall per memory, per step
-        stage_mrecall.append(measures[constants.recall_idx,:])
+        # An array with recall per tolerance and memory, per step
+        stage_mrecall.append(measures[:, constants.recall_idx, :])
 
         # 
-        # Overall recalls and precisions per step
+        # Overall recalls and precisions per tolerance, per step
         total_recalls.append(step_recall)
         total_precisions.append(step_precision)
         mismatches.append(mis_count)
 
         start = end
 
+    if writer is not None:
+        writer.close()
+
     stage_entropies = np.array(stage_entropies)
     stage_mprecision = np.array(stage_mprecision)
     stage_mrecall = np.array(stage_mrecall)
@@ -694,39 +435,65 @@ def test_recalling_fold(n_memories, mem_size, domain, fold, experiment, occlusio
     total_recalls = np.array(total_recalls)
     mismatches = np.array(mismatches)
 
-    return fold, stage_recalls, stage_entropies, stage_mprecision, \
+    return fold, stage_entropies, stage_mprecision, \
         stage_mrecall, total_precisions, total_recalls, mismatches
 
 
-def test_recalling(domain, mem_size, experiment, occlusion = None, bars_type = None, tolerance = 0):
-    n_memories = constants.n_labels
+def recalling_work(experiment, occlusion = None, bars_type = None):
+    """ Returns the values of features test_recalling handles, from the sizes of a fold.
+    """
+    filling = constants.features_name(experiment) + constants.filling_suffix
+    testing = constants.features_name(experiment, occlusion, bars_type) + constants.testing_suffix
+    filling = np.load(constants.data_filename(filling, 0), mmap_mode='r')
+    testing = np.load(constants.data_filename(testing, 0), mmap_mode='r')
+    return constants.training_stages \
+        * (filling.size + testing.size*len(constants.memory_fills))
+
+
+def test_recalling(domain, mem_size, experiment, occlusion = None, bars_type = None, tolerances = (0,),
+        seed = None, calibration = GLOBAL_CALIBRATION, store = None, executor = None,
+        assignment = None):
+    """ Measures and recalls memories filled at different levels, per tolerance.
+
+    Recalled features are only stored when there is a single tolerance. Every
+    fold recalls with random streams of its own, spawned from the master seed,
+    so results are the same whatever the worker each fold runs in, and folds
+    are run by the executor given (chosen by workload if None). Measures
+    of every fold are appended to the results store, if given. Labels are kept
+    by the memories of the assignment (a memory per label if None), fit to
+    the filling features of every fold.
+    """
+    executor = executors.Executor(verbose=50) if executor is None else executor
+    assignment = grouped(1) if assignment is None else assignment
+    n_memories = assignment.n_memories
     memory_fills = constants.memory_fills
     training_stages = constants.training_stages
+    n_tolerances = len(tolerances)
 
-    # All recalls, per memory fill and fold.
-    all_recalls = {}
-
-    # All entropies, precision, and recall, per fold, fill, and memory.
+    # All entropies, per fold, fill, and memory.
     all_mfill_entropies = \
         np.zeros((training_stages, len(memory_fills), n_memories))
+    # All precision, and recall, per fold, fill, tolerance and memory.
     all_mfill_precision = \
-        np.zeros((training_stages, len(memory_fills), n_memories))
+        np.zeros((training_stages, len(memory_fills), n_tolerances, n_memories))
     all_mfill_recall = \
-        np.zeros((training_stages, len(memory_fills), n_memories))
+        np.zeros((training_stages, len(memory_fills), n_tolerances, n_memories))
 
-    # Store the matrix of stages x memory fills.
-    total_precisions = np.zeros((training_stages, len(memory_fills)))
-    total_recalls = np.zeros((training_stages, len(memory_fills)))
+    # Store the matrix of stages x memory fills (x tolerances).
+    total_precisions = np.zeros((training_stages, len(memory_fills), n_tolerances))
+    total_recalls = np.zeros((training_stages, len(memory_fills), n_tolerances))
     total_mismatches = np.zeros((training_stages, len(memory_fills)))
 
-    list_results = Parallel(n_jobs=constants.n_jobs, verbose=50)(
-        delayed(test_recalling_fold)(n_memories, mem_size, domain, fold, experiment, occlusion, bars_type, tolerance) \
-            for fold in range(constants.training_stages))
+    fold_seeds = np.random.SeedSequence(seed).spawn(training_stages)
+    list_results = instrumentation.collect(executor.map(
+        instrumentation.traced(test_recalling_fold),
+        [(assignment, mem_size, domain, fold, experiment, occlusion, bars_type, tolerances,
+            fold_seeds[fold], calibration) for fold in range(constants.training_stages)],
+        recalling_work(experiment, occlusion, bars_type)))
 
-    for fold, recalls, fill_mem_entropies, fill_mem_precision, fill_mem_recall,\
+    for fold, fill_mem_entropies, fill_mem_precision, fill_mem_recall,\
         fold_precision, fold_recall, fold_mismatches in list_results:
 
-        all_recalls[fold] = recalls
         total_precisions[fold] = fold_precision
         total_recalls[fold] = fold_recall
         total_mismatches[fold] = fold_mismatches
@@ -735,77 +502,57 @@ def test_recalling(domain, mem_size, experiment, occlusion = None, bars_type = N
         all_mfill_precision[fold] = fill_mem_precision
         all_mfill_recall[fold] = fill_mem_recall
 
-    for fold in all_recalls:
-        list_tups = all_recalls[fold]
-        tags = []
-        memories = []
-        for (idx, label, features) in list_tups:
-            tags.append((idx, label))
-            memories.append(np.array(features))
-        
-        tags = np.array(tags)
-        memories = np.array(memories)
-        memories_filename = constants.memories_name(experiment, occlusion, bars_type, tolerance)
-        memories_filename = constants.data_filename(memories_filename, fold)
-        np.save(memories_filename, memories)
-        tags_filename = constants.labels_name + constants.memory_suffix
-        tags_filename = constants.data_filename(tags_filename, fold)
-        np.save(tags_filename, tags)
-    
-    main_avrge_entropies = np.mean(all_mfill_entropies,axis=(0,2))
-    main_stdev_entropies = np.std(all_mfill_entropies,axis=(0,2))
-    main_avrge_mprecision = np.mean(all_mfill_precision,axis=(0,2))
-    main_stdev_mprecision = np.std(all_mfill_precision,axis=(0,2))
-    main_avrge_mrecall = np.mean(all_mfill_recall,axis=(0,2))
-    main_stdev_mrecall = np.std(all_mfill_recall,axis=(0,2))
-    
-    np.savetxt(constants.csv_filename('main_average_precision',experiment, occlusion, bars_type, tolerance), \
-        main_avrge_mprecision, delimiter=',')
-    np.savetxt(constants.csv_filename('main_average_recall',experiment, occlusion, bars_type, tolerance), \
-        main_avrge_mrecall, delimiter=',')
-    np.savetxt(constants.csv_filename('main_average_entropy',experiment, occlusion, bars_type, tolerance), \
-        main_avrge_entropies, delimiter=',')
-
-    np.savetxt(constants.csv_filename('main_stdev_precision',experiment, occlusion, bars_type, tolerance), \
-        main_stdev_mprecision, delimiter=',')
-    np.savetxt(constants.csv_filename('main_stdev_recall',experiment, occlusion, bars_type, tolerance), \
-        main_stdev_mrecall, delimiter=',')
-    np.savetxt(constants.csv_filename('main_stdev_entropy',experiment, occlusion, bars_type, tolerance), \
-        main_stdev_entropies, delimiter=',')
-    np.savetxt(constants.csv_filename('main_total_recalls',experiment, occlusion, bars_type, tolerance), \
-        total_recalls, delimiter=',')
-    np.savetxt(constants.csv_filename('main_total_mismatches',experiment, occlusion, bars_type, tolerance), \
-        total_mismatches, delimiter=',')
-
-    plot_pre_graph(main_avrge_mprecision*100, main_avrge_mrecall*100, main_avrge_entropies,\
-        main_stdev_mprecision*100, main_stdev_mrecall*100, main_stdev_entropies, 'recall-', \
-            xlabels = constants.memory_fills, xtitle = _('Percentage of memory corpus'), action = experiment,
-            occlusion = occlusion, bars_type = bars_type, tolerance = tolerance)
-
-    plot_pre_graph(np.average(total_precisions, axis=0)*100, np.average(total_recalls, axis=0)*100, \
-        main_avrge_entropies, np.std(total_precisions, axis=0)*100, np.std(total_recalls, axis=0)*100, \
-            main_stdev_entropies, 'total_recall-', \
-            xlabels = constants.memory_fills, xtitle = _('Percentage of memory corpus'), action=experiment,
-            occlusion = occlusion, bars_type = bars_type, tolerance = tolerance)
+        if store is not None:
+            store.append_fills(experiment, fold, mem_size, occlusion, bars_type, tolerances,
+                memory_fills, fill_mem_precision, fill_mem_recall, fill_mem_entropies,
+                fold_precision, fold_recall, fold_mismatches)
 
-    print('Test completed')
 
+    main_avrge_entropies = np.mean(all_mfill_entropies,axis=(0,2))
+    main_stdev_entropies = np.std(all_mfill_entropies,axis=(0,2))
 
-def get_all_data(prefix):
-    data = None
+    for k, tolerance in enumerate(tolerances):
+        main_avrge_mprecision = np.mean(all_mfill_precision[:, :, k],axis=(0,2))
+        main_stdev_mprecision = np.std(all_mfill_precision[:, :, k],axis=(0,2))
+        main_avrge_mrecall = np.mean(all_mfill_recall[:, :, k],axis=(0,2))
+        main_stdev_mrecall = np.std(all_mfill_recall[:, :, k],axis=(0,2))
+        
+        np.savetxt(constants.csv_filename('main_average_precision',experiment, occlusion, bars_type, tolerance), \
+            main_avrge_mprecision, delimiter=',')
+        np.savetxt(constants.csv_filename('main_average_recall',experiment, occlusion, bars_type, tolerance), \
+            main_avrge_mrecall, delimiter=',')
+        np.savetxt(constants.csv_filename('main_average_entropy',experiment, occlusion, bars_type, tolerance), \
+            main_avrge_entropies, delimiter=',')
+
+        np.savetxt(constants.csv_filename('main_stdev_precision',experiment, occlusion, bars_type, tolerance), \
+            main_stdev_mprecision, delimiter=',')
+        np.savetxt(constants.csv_filename('main_stdev_recall',experiment, occlusion, bars_type, tolerance), \
+            main_stdev_mrecall, delimiter=',')
+        np.savetxt(constants.csv_filename('main_stdev_entropy',experiment, occlusion, bars_type, tolerance), \
+            main_stdev_entropies, delimiter=',')
+        np.savetxt(constants.csv_filename('main_total_recalls',experiment, occlusion, bars_type, tolerance), \
+            total_recalls[:, :, k], delimiter=',')
+        np.savetxt(constants.csv_filename('main_total_mismatches',experiment, occlusion, bars_type, tolerance), \
+            total_mismatches, delimiter=',')
+
+        plotting.plot(
+            plotting.pre_graph(main_avrge_mprecision*100, main_avrge_mrecall*100, main_avrge_entropies,\
+                main_stdev_mprecision*100, main_stdev_mrecall*100, main_stdev_entropies, 'recall-', \
+                    xlabels = constants.memory_fills, xtitle = _('Percentage of memory corpus'), action = experiment,
+                    occlusion = occlusion, bars_type = bars_type, tolerance = tolerance),
+            plotting.pre_graph(np.average(total_precisions[:, :, k], axis=0)*100, np.average(total_recalls[:, :, k], axis=0)*100, \
+                main_avrge_entropies, np.std(total_precisions[:, :, k], axis=0)*100, np.std(total_recalls[:, :, k], axis=0)*100, \
+                    main_stdev_entropies, 'total_recall-', \
+                    xlabels = constants.memory_fills, xtitle = _('Percentage of memory corpus'), action=experiment,
+                    occlusion = occlusion, bars_type = bars_type, tolerance = tolerance))
 
-    for stage in range(constants.training_stages):
-        filename = constants.data_filename(prefix, stage)
-        if data is None:
-            data = np.load(filename)
-        else:
-            newdata = np.load(filename)
-            data = np.concatenate((data, newdata), axis=0)
+    print('Test completed')
 
-    return data
 
 def characterize_features(domain, experiment, occlusion = None, bars_type = None):
     """ Produces a graph of features averages and standard deviations.
+
+    Statistics per label are accumulated fold by fold, in chunks.
     """
     features_prefix = constants.features_name(experiment, occlusion, bars_type)
     tf_filename = features_prefix + constants.testing_suffix
@@ -813,26 +560,11 @@ def characterize_features(domain, experiment, occlusion = None, bars_type = None
     labels_prefix = constants.labels_name
     tl_filename = labels_prefix + constants.testing_suffix
 
-    features = get_all_data(tf_filename)
-    labels = get_all_data(tl_filename)
-
-    d = {}
-    for i in constants.all_labels:
-        d[i] = []
+    stats = running_stats.stats_from_files(tf_filename, tl_filename)
+    means = stats.mean
+    stdevs = stats.std()
 
-    for (i, feats) in zip(labels, features):
-        # Separates features per label.
-        d[i].append(feats)
-
-    means = {}
-    stdevs = {}
-    for i in constants.all_labels:
-        # The list of features becomes a matrix
-        d[i] = np.array(d[i])
-        means[i] = np.mean(d[i], axis=0)
-        stdevs[i] = np.std(d[i], axis=0)
-
-    plot_features_graph(domain, means, stdevs, experiment, occlusion, bars_type)
+    plotting.plot(*plotting.features_graphs(domain, means, stdevs, experiment, occlusion, bars_type))
     
 
 def save_history(history, prefix):
@@ -857,11 +589,17 @@ def save_history(history, prefix):
 ##############################################################################
 # Main section
 
-def main(action, occlusion = None, bar_type= None, tolerance = 0):
+def main(action, occlusion = None, bar_type= None, tolerances = (0,), seed = None,
+        calibration = GLOBAL_CALIBRATION, store = None, executor = None, assignment = None):
     """ Distributes work.
 
     The main function distributes work according to the options chosen in the
-    command line.
+    command line. Experiments are measured for every tolerance given, but
+    memories are only recalled and remembered when there is one. Recalls are
+    reproducible when a seed is given. Measures are also kept in the results
+    store given. Tasks of experiments are run by the executor given, and
+    labels are kept by the memories of the assignment given (the default
+    one of every experiment if None).
     """
 
     if (action == constants.TRAIN_NN):
@@ -870,7 +608,8 @@ def main(action, occlusion = None, bar_type= None, tolerance = 0):
         model_prefix = constants.model_name
         stats_prefix = constants.stats_model_name
 
-        history = convnet.train_networks(training_percentage, model_prefix, action)
+        with instrumentation.stage('train_networks'):
+            history = convnet.train_networks(training_percentage, model_prefix, action)
         save_history(history, stats_prefix)
     elif (action == constants.GET_FEATURES):
         # Generates features for the memories using the previously generated
@@ -882,20 +621,28 @@ def main(action, occlusion = None, bar_type= None, tolerance = 0):
         labels_prefix = constants.labels_name
         data_prefix = constants.data_name
 
-        history = convnet.obtain_features(model_prefix, features_prefix, labels_prefix, data_prefix,
-            training_percentage, am_filling_percentage, action)
+        with instrumentation.stage('obtain_features'):
+            history = convnet.obtain_features(model_prefix, features_prefix, labels_prefix, data_prefix,
+                training_percentage, am_filling_percentage, action)
         save_history(history, features_prefix)
     elif action == constants.CHARACTERIZE:
         # Generates graphs of mean and standard distributions of feature values,
         # per digit class.
-        characterize_features(constants.domain, action)
+        with instrumentation.stage('characterize_features'):
+            characterize_features(constants.domain, action)
     elif (action == constants.EXP_1) or (action == constants.EXP_2):
         # The domain size, equal to the size of the output layer of the network.
-        test_memories(constants.domain, action, tolerance)
+        with instrumentation.stage('test_memories'):
+            test_memories(constants.domain, action, tolerances, calibration, store, executor,
+                assignment)
     elif (action == constants.EXP_3):
-        test_recalling(constants.domain, constants.ideal_memory_size, action, tolerance=tolerance)
+        with instrumentation.stage('test_recalling'):
+            test_recalling(constants.domain, constants.ideal_memory_size, action, tolerances=tolerances,
+                seed=seed, calibration=calibration, store=store, executor=executor,
+                assignment=assignment)
     elif (action == constants.EXP_4):
-        convnet.remember(action, tolerance=tolerance)
+        with instrumentation.stage('remember'):
+            convnet.remember(action, tolerance=tolerances[0])
     elif (constants.EXP_5 <= action) and (action <= constants.EXP_10):
         # Generates features for the data sections using the previously generate
         # neural network, introducing (background color) occlusion.
@@ -906,13 +653,19 @@ def main(action, occlusion = None, bar_type= None, tolerance = 0):
         labels_prefix = constants.labels_name
         data_prefix = constants.data_name
 
-        history = convnet.obtain_features(model_prefix, features_prefix, labels_prefix, data_prefix,
-            training_percentage, am_filling_percentage, action, occlusion, bar_type)
+        with instrumentation.stage('obtain_features'):
+            history = convnet.obtain_features(model_prefix, features_prefix, labels_prefix, data_prefix,
+                training_percentage, am_filling_percentage, action, occlusion, bar_type)
         save_history(history, features_prefix)
-        characterize_features(constants.domain, action, occlusion, bar_type)
-        test_recalling(constants.domain, constants.ideal_memory_size,
-            action, occlusion, bar_type, tolerance)
-        convnet.remember(action, occlusion, bar_type, tolerance)
+        with instrumentation.stage('characterize_features'):
+            characterize_features(constants.domain, action, occlusion, bar_type)
+        with instrumentation.stage('test_recalling'):
+            test_recalling(constants.domain, constants.ideal_memory_size,
+                action, occlusion, bar_type, tolerances, seed, calibration, store, executor,
+                assignment)
+        if len(tolerances) == 1:
+            with instrumentation.stage('remember'):
+                convnet.remember(action, occlusion, bar_type, tolerances[0])
 
 
 
@@ -927,9 +680,49 @@ if __name__== "__main__" :
     parser = argparse.ArgumentParser(description='Associative Memory Experimenter.')
     parser.add_argument('-l', nargs='?', dest='lang', choices=['en', 'es'], default='en',
                         help='choose between English (en) or Spanish (es) labels for graphs.')
-    parser.add_argument('-t', nargs='?', dest='tolerance', type=int,
+    group = parser.add_mutually_exclusive_group(required=False)
+    group.add_argument('-t', nargs='?', dest='tolerance', type=int,
                         help='run the experiment with the tolerance given (only experiments 5 to 12).')
-    
+    group.add_argument('-T', nargs='+', dest='tolerances', type=int,
+                        help='measure the experiment for all the tolerances given in one pass '
+                            + '(memories are not recalled nor remembered for more than one).')
+
+    parser.add_argument('-s', dest='seed', type=int,
+                        help='seed for the random streams of recalling, to make it reproducible.')
+    parser.add_argument('-q', dest='calibration', choices=calibrations, default=GLOBAL_CALIBRATION,
+                        help='how features are calibrated for quantization: with global bounds, '
+                            + 'bounds per feature, or per feature quantiles.')
+
+    group = parser.add_mutually_exclusive_group(required=False)
+    group.add_argument('-g', dest='groups',
+                        help='JSON file with the groups of labels kept by every memory, or a hierarchy '
+                            + 'of labels ({"tree": ..., "level": ...}) whose subtrees are kept by them.')
+    group.add_argument('--clusters', dest='clusters', type=int,
+                        help='number of memories the labels are assigned to, by clustering their '
+                            + 'features in every fold (with the seed given by -s).')
+
+    parser.add_argument('-x', dest='executor', choices=executors.kinds, default=executors.AUTO,
+                        help='how tasks of experiments run: in threads, processes, serially, or by workload (auto).')
+    parser.add_argument('--run', dest='run',
+                        help='name of the run the measures are kept under in the results store '
+                            + '(the time it started by default).')
+    parser.add_argument('--results', dest='results',
+                        help='results store to use instead of the one in the runs directory.')
+
+    parser.add_argument('--defer-plots', dest='defer_plots', action='store_true',
+                        help='only describe the graphs, leaving their drawing to plotting.py.')
+    parser.add_argument('--graph-format', dest='graph_format', choices=plotting.formats, default='svg',
+                        help='format of the pictures of graphs.')
+    parser.add_argument('--dpi', type=int,
+                        help='resolution of the pictures of graphs.')
+
+    parser.add_argument('--trace', dest='trace',
+                        help='record time and resources used per stage, fold and task in the JSON file given.')
+    parser.add_argument('--chrome', action='store_true',
+                        help='write the trace in the Chrome trace event format (with --trace).')
+    parser.add_argument('--counters', action='store_true',
+                        help='add counters of the associative memories hot paths to the trace (with --trace).')
+
     group = parser.add_mutually_exclusive_group(required=False)
     group.add_argument('-o', nargs='?', dest='occlusion', type=float, 
                         help='run the experiment with a given proportion of occlusion (only experiments 5 to 12).')
@@ -951,8 +744,13 @@ if __name__== "__main__" :
     occlusion = args.occlusion
     bars_type = args.bars_type
     tolerance = args.tolerance
+    tolerances = args.tolerances
     action = args.action
     nexp = args.nexp
+    trace = args.trace
+    seed = args.seed
+    calibration = args.calibration
+    plotting.configure(args.defer_plots, args.graph_format, args.dpi)
 
     
     if lang == 'es':
@@ -977,23 +775,59 @@ if __name__== "__main__" :
             exit(2)
 
 
-    if tolerance is None:
-        tolerance = 0
-    elif (tolerance < 0) or (constants.domain < tolerance):
+    if tolerances is None:
+        tolerances = [0 if tolerance is None else tolerance]
+    for tolerance in tolerances:
+        if (tolerance < 0) or (constants.domain < tolerance):
             print_error("tolerance needs to be a value between 0 and {0}."
                 .format(constants.domain))
             exit(3)
 
+    if trace is not None:
+        instrumentation.enable(args.counters)
+    elif args.counters:
+        print_error("Counters are only recorded in a trace (--trace)")
+        exit(4)
+    if args.counters and (args.executor == executors.THREADS):
+        print_error("Counters are kept per process, so they cannot be recorded in threads")
+        exit(4)
+    executor = executors.Executor(args.executor, verbose=50)
+
+    assignment = None
+    if ((args.groups is not None) or (args.clusters is not None)) and (nexp is None):
+        print_error("Assignments of labels are only valid for experiments")
+        exit(5)
+    if args.groups is not None:
+        if not os.path.isfile(args.groups):
+            print_error("There is no file of groups of labels named", args.groups)
+            exit(5)
+        try:
+            assignment = read_groups(args.groups)
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            print_error("Groups of labels in", args.groups, "are not valid:", e)
+            exit(5)
+    elif args.clusters is not None:
+        try:
+            assignment = Clustering(args.clusters, seed)
+        except ValueError as e:
+            print_error(e)
+            exit(5)
+
     if action is None:
         # An experiment was chosen
         if (nexp < constants.MIN_EXPERIMENT) or (constants.MAX_EXPERIMENT < nexp):
             print_error("There are only {1} experiments available, numbered consecutively from {0}."
                 .format(constants.MIN_EXPERIMENT, constants.MAX_EXPERIMENT))
             exit(1)
-        main(nexp, occlusion, bars_type, tolerance)
+        with results_store.ResultsStore(args.results, args.run) as store:
+            main(nexp, occlusion, bars_type, tolerances, seed, calibration, store, executor,
+                assignment)
     else:
         # Other action was chosen
         main(action)
 
+    if trace is not None:
+        instrumentation.save(trace, args.chrome)
+
     
     
@@ -0,0 +1,154 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Queries the memories of a fold directly with images.
+
+Images go through the encoder of the fold, are quantized with the calibration
+saved when the memories were filled, and are recognized and recalled by the
+memories saved for the fold. Recalled features can be decoded back to images.
+"""
+
+import sys
+import argparse
+import functools
+import time
+
+import numpy as np
+
+import constants
+import convnet
+from associative import load_memories
+from quantizer import Quantizer
+from recognition_server import MemoryService
+
+
+def print_error(*s):
+    print('Error:', *s, file = sys.stderr)
+
+
+@functools.lru_cache(maxsize=None)
+def encoder(fold):
+    return convnet.load_encoder(fold)
+
+
+@functools.lru_cache(maxsize=None)
+def decoder(fold):
+    return convnet.load_decoder(fold)
+
+
+class MemoryQuery(object):
+    """ Image to memory query path for one fold of an experiment.
+
+    The memories are those saved by test_recalling for the fold, filled up to
+    the level of constants.memory_fills with index fill.
+    """
+
+    def __init__(self, fold, experiment, fill = len(constants.memory_fills) - 1,
+            occlusion = None, bars_type = None, tolerance = 0):
+        self.fold = fold
+
+        calibration_filename = constants.calibration_name(experiment, occlusion, bars_type)
+        calibration_filename = constants.calibration_filename(calibration_filename, fold)
+        self.quantizer = Quantizer.load(calibration_filename)
+
+        relations_filename = constants.relations_name(experiment, fill, occlusion, bars_type,
+            tolerance)
+        relations_filename = constants.relations_filename(relations_filename, fold)
+        self.service = MemoryService(load_memories(relations_filename))
+
+        # Loads the encoder once, so the first query does not pay for it.
+        encoder(fold)
+
+    def query(self, images, recall = True, decode = False):
+        """ Recognizes (and recalls) a batch of CIFAR shaped images.
+
+        Images may be bytes, as in the dataset, or floats between 0 and 1.
+        Returns a dictionary with the results, including the seconds taken by
+        every stage under 'timing'.
+        """
+        timing = {}
+        images = np.asarray(images)
+        if images.ndim == 3:
+            images = images[np.newaxis]
+        if images.dtype == np.uint8:
+            images = images.astype('float32') / 255
+
+        start = time.perf_counter()
+        features = encoder(self.fold).predict(images)
+        timing['encode'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        cues = self.quantizer.quantize(features)
+        timing['quantize'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        labels, recognized, mismatches = self.service.recognize(cues)
+        timing['recognize'] = time.perf_counter() - start
+
+        results = {'features': features, 'labels': labels,
+            'recognized': recognized, 'mismatches': mismatches}
+
+        if recall or decode:
+            start = time.perf_counter()
+            recalls = self.service.recall(cues, labels)
+            results['recalls'] = self.quantizer.dequantize(recalls)
+            timing['recall'] = time.perf_counter() - start
+
+        if decode:
+            start = time.perf_counter()
+            accepted = labels >= 0
+            produced = np.full(images.shape, np.nan, dtype=np.float32)
+            if accepted.any():
+                produced[accepted] = decoder(self.fold).predict(results['recalls'][accepted])
+            results['images'] = produced
+            timing['decode'] = time.perf_counter() - start
+
+        results['timing'] = timing
+        return results
+
+
+if __name__ == "__main__" :
+    parser = argparse.ArgumentParser(description='Query the memories of a fold with images.')
+    parser.add_argument('images',
+                        help='.npy file with images of shape (N, 32, 32, 3).')
+    parser.add_argument('-e', dest='nexp', type=int, default=constants.EXP_3,
+                        help='experiment whose memories are queried.')
+    parser.add_argument('-k', dest='fold', type=int, default=0,
+                        help='fold whose encoder and memories are used.')
+    parser.add_argument('-t', dest='tolerance', type=int, default=0,
+                        help='tolerance the memories were saved with.')
+    group = parser.add_mutually_exclusive_group(required=False)
+    group.add_argument('-o', dest='occlusion', type=float,
+                        help='proportion of occlusion of the experiment.')
+    group.add_argument('-b', dest='bars_type', type=int,
+                        help='bars type of the experiment.')
+    parser.add_argument('-d', dest='decode', action='store_true',
+                        help='decode recalled features into images.')
+    args = parser.parse_args()
+
+    if (args.fold < 0) or (constants.training_stages <= args.fold):
+        print_error('Fold must be a number between 0 and {0}.'\
+            .format(constants.training_stages-1))
+        exit(1)
+
+    images = np.load(args.images)
+    mq = MemoryQuery(args.fold, args.nexp, occlusion=args.occlusion, bars_type=args.bars_type,
+        tolerance=args.tolerance)
+    results = mq.query(images, decode=args.decode)
+
+    print('Labels:', results['labels'])
+    for stage in results['timing']:
+        seconds = results['timing'][stage]
+        print(f'{stage}: {seconds*1000.0:.3f} ms ({seconds*1e6/len(images):.1f} us per image)')
@@ -0,0 +1,164 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Precision, recall and behaviour of a set of memories.
+
+All functions work on a recognition matrix, a boolean array with a row per
+cue and a column per memory, telling which memories recognized which cues,
+and on the array with the correct memory for every cue.
+"""
+
+import numpy as np
+
+import constants
+
+# Cells of the confusion matrices.
+TP = (0,0)
+FP = (0,1)
+FN = (1,0)
+TN = (1,1)
+
+
+# Policies for choosing a memory among those that recognized a cue.
+ENTROPY_POLICY = 'entropy'
+MISMATCHES_POLICY = 'mismatches'
+WEIGHTED_POLICY = 'weighted'
+RANDOM_POLICY = 'random'
+
+policies = [ENTROPY_POLICY, MISMATCHES_POLICY, WEIGHTED_POLICY, RANDOM_POLICY]
+
+
+def select_memories(recognition, entropies = None, policy = ENTROPY_POLICY,
+        mismatches = None, weights = (1.0, 1.0), rng = None):
+    """ Returns, per cue, the memory chosen among those that recognized it,
+    or -1 if none did.
+
+    Policies choose the memory with the lowest entropy (entropy), the lowest
+    number of mismatches with the cue (mismatches), the lowest weighted sum of
+    both (weighted), or any of them at random (random). Ties are broken at
+    random if a random generator is given, and in favour of the first memory
+    otherwise.
+    """
+    recognition = np.asarray(recognition, dtype=bool)
+    if policy == ENTROPY_POLICY:
+        scores = np.broadcast_to(np.asarray(entropies, dtype=float), recognition.shape)
+    elif policy == MISMATCHES_POLICY:
+        scores = np.asarray(mismatches, dtype=float)
+    elif policy == WEIGHTED_POLICY:
+        scores = weights[0]*np.asarray(entropies, dtype=float)[np.newaxis, :] \
+            + weights[1]*np.asarray(mismatches, dtype=float)
+    elif policy == RANDOM_POLICY:
+        scores = np.zeros(recognition.shape)
+        if rng is None:
+            rng = np.random.default_rng()
+    else:
+        raise ValueError('Unknown policy ' + str(policy))
+
+    masked = np.where(recognition, scores, np.inf)
+    if rng is None:
+        chosen = np.argmin(masked, axis=1)
+    else:
+        lowest = masked == masked.min(axis=1, keepdims=True)
+        chosen = np.argmax(np.where(lowest, rng.random(masked.shape), -1.0), axis=1)
+    return np.where(recognition.any(axis=1), chosen, -1)
+
+
+def confusion_matrices(recognition, correct):
+    """ Returns a 2x2 confusion matrix per memory.
+    """
+    recognition = np.asarray(recognition, dtype=bool)
+    n_mems = recognition.shape[1]
+    positive = np.asarray(correct)[:, np.newaxis] == np.arange(n_mems)
+
+    cms = np.zeros((n_mems, 2, 2))
+    cms[(slice(None),) + TP] = np.count_nonzero(recognition & positive, axis=0)
+    cms[(slice(None),) + FP] = np.count_nonzero(recognition & ~positive, axis=0)
+    cms[(slice(None),) + FN] = np.count_nonzero(~recognition & positive, axis=0)
+    cms[(slice(None),) + TN] = np.count_nonzero(~recognition & ~positive, axis=0)
+    return cms
+
+
+def memory_measures(cms):
+    """ Returns precision and recall per memory, from their confusion matrices.
+
+    Precision of memories that did not respond is taken as 1, as the
+    experiments always did: a memory that accepts no cue accepts no wrong
+    one. The array of those memories is returned too.
+    """
+    tp = cms[(slice(None),) + TP]
+    positives = tp + cms[(slice(None),) + FP]
+    silent = positives == 0
+
+    measures = np.zeros((constants.n_measures, len(cms)), dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        measures[constants.precision_idx] = np.where(silent, 1.0, tp / positives)
+        measures[constants.recall_idx] = tp / (tp + cms[(slice(None),) + FN])
+    return measures, silent
+
+
+def behaviours(recognition, entropies, correct, chosen = None):
+    """ Returns the counts of behaviours of the memories as a whole.
+
+    The array is indexed by constants.*_idx, and also holds the overall
+    precision and recall. The memory chosen per cue is computed from the
+    entropies if not given. Overall precision is undefined (NaN) when no
+    memory responded to any cue, instead of failing or being taken as a
+    perfect one.
+    """
+    recognition = np.asarray(recognition, dtype=bool)
+    correct = np.asarray(correct)
+    if chosen is None:
+        chosen = select_memories(recognition, entropies)
+    n_cues = len(recognition)
+
+    responses = np.count_nonzero(recognition, axis=1)
+    responded = responses > 0
+    has_correct = recognition[np.arange(n_cues), correct]
+
+    behaviour = np.zeros(constants.n_behaviours, dtype=np.float64)
+    behaviour[constants.no_response_idx] = np.count_nonzero(~responded)
+    behaviour[constants.no_correct_response_idx] = np.count_nonzero(responded & ~has_correct)
+    behaviour[constants.no_correct_chosen_idx] = np.count_nonzero(has_correct & (chosen != correct))
+    behaviour[constants.correct_response_idx] = np.count_nonzero(has_correct & (chosen == correct))
+    behaviour[constants.mean_responses_idx] = responses.sum() / float(n_cues)
+
+    all_responses = n_cues - behaviour[constants.no_response_idx]
+    correct_responses = behaviour[constants.correct_response_idx]
+    behaviour[constants.precision_idx] = \
+        np.nan if all_responses == 0 else correct_responses / all_responses
+    behaviour[constants.recall_idx] = correct_responses / float(n_cues)
+    return behaviour
+
+
+def tolerance_curves(mismatches, entropies, correct, tolerances):
+    """ Measures the memories for every tolerance, from their mismatches.
+
+    As a memory recognizes a cue when their mismatches are at most its
+    tolerance, one matrix of mismatches (cues x memories) is enough to get
+    the recognition matrix of any tolerance. Returns the arrays of precision
+    and recall per memory (tolerances x memories) and behaviours (tolerances
+    x constants.n_behaviours).
+    """
+    mismatches = np.asarray(mismatches)
+    precision = np.zeros((len(tolerances), mismatches.shape[1]))
+    recall = np.zeros((len(tolerances), mismatches.shape[1]))
+    behaviour = np.zeros((len(tolerances), constants.n_behaviours))
+    for i, t in enumerate(tolerances):
+        recognition = mismatches <= t
+        measures, _ = memory_measures(confusion_matrices(recognition, correct))
+        precision[i] = measures[constants.precision_idx]
+        recall[i] = measures[constants.recall_idx]
+        behaviour[i] = behaviours(recognition, entropies, correct)
+    return precision, recall, behaviour
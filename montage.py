@@ -0,0 +1,201 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Montages of testing images with their decodings and memories.
+
+Every testing image chosen, given by its stage (fold) and id, makes a
+column of the montage: the original image, the image decoded from its
+features, and the images decoded from what the memories recalled from
+it, one per fill. Images are taken from the arrays of decoded images
+saved by remember, or from their PNG files when there are no arrays.
+
+    python montage.py -e 5 -o 0.3 pairs.txt
+    python montage.py -e 3 -r -s 7
+
+where pairs.txt has a line "stage,id" per image, and -r chooses an image
+per label, each one from a different stage, at random.
+"""
+
+import sys
+import os
+import argparse
+import numpy as np
+import png
+
+import constants
+from recall_store import RecallStore
+
+white = 255
+
+
+def print_error(*s):
+    print('Error:', *s, file = sys.stderr)
+
+
+def read_png(filename):
+    """ Returns the pixels of a PNG image, as an array of rows x columns x colors.
+    """
+    width, height, rows, info = png.Reader(filename=filename).asRGB8()
+    return np.vstack([np.frombuffer(bytes(row), dtype=np.uint8) for row in rows]) \
+        .reshape((height, width, 3))
+
+
+class StageImages(object):
+    """ Images of a stage, from arrays of decoded images or from PNG files.
+    """
+
+    def __init__(self, stage, experiment, occlusion = None, bars_type = None, tolerance = 0):
+        self.stage = stage
+        self.testing_directory = constants.testing_directory(experiment, occlusion, bars_type)
+        self.memories_directory = constants.memories_directory(experiment, occlusion, bars_type, tolerance)
+        self.data = np.load(constants.data_filename(constants.data_name + constants.testing_suffix, stage),
+            mmap_mode='r')
+        self.labels = np.load(constants.data_filename(constants.labels_name + constants.testing_suffix, stage))
+        self.n_fills = len(constants.memory_fills)
+
+        decoded = constants.data_filename(constants.decoded_name(self.testing_directory), stage)
+        memories = constants.data_filename(constants.decoded_name(self.memories_directory), stage)
+        self.decoded = None
+        self.memories = None
+        if os.path.exists(decoded) and os.path.exists(memories):
+            self.decoded = np.load(decoded, mmap_mode='r')
+            self.memories = np.load(memories, mmap_mode='r')
+            prefix = constants.memories_name(experiment, occlusion, bars_type, tolerance)
+            self.index = RecallStore(prefix, stage)
+            self.n_fills = self.index.n_fills
+
+    def column(self, idx):
+        """ Returns the images of a testing image, from the top of its column down.
+        """
+        original = np.asarray(self.data[idx]) * 255
+        images = [original.round().astype(np.uint8)]
+        if self.decoded is not None:
+            images.append(self.decoded[idx])
+            rows = self.index.row(np.arange(self.n_fills), idx)
+            images += list(self.memories[rows])
+        else:
+            label = self.labels[idx]
+            images.append(read_png(constants.produced_image_filename(self.testing_directory,
+                self.stage, idx, label)))
+            images += [read_png(constants.produced_memory_filename(self.memories_directory,
+                fill, self.stage, idx, label)) for fill in range(self.n_fills)]
+        return np.array(images).reshape((len(images),) + images[0].shape)
+
+
+def compose(columns, border = 2, scale = 1):
+    """ Returns the montage of columns of images (columns x images x rows x columns x colors).
+
+    Images are surrounded by a white border, and scaled up by the factor given.
+    """
+    columns = np.asarray(columns)
+    if scale > 1:
+        columns = columns.repeat(scale, axis=2).repeat(scale, axis=3)
+    padded = np.pad(columns, ((0, 0), (0, 0), (border, border), (border, border), (0, 0)),
+        constant_values=white)
+    n_columns, n_images, height, width, colors = padded.shape
+    return padded.transpose((1, 2, 0, 3, 4)).reshape((n_images*height, n_columns*width, colors))
+
+
+def montage(pairs, experiment, occlusion = None, bars_type = None, tolerance = 0,
+        border = 2, scale = 1):
+    """ Returns the montage of the testing images given as pairs (stage, id).
+
+    The images of every stage are opened once.
+    """
+    stages = {}
+    columns = []
+    for stage, idx in pairs:
+        if stage not in stages:
+            stages[stage] = StageImages(stage, experiment, occlusion, bars_type, tolerance)
+        columns.append(stages[stage].column(idx))
+    return compose(columns, border, scale)
+
+
+def random_pairs(rng):
+    """ Returns a pair (stage, id) per label, with stages and ids at random.
+    """
+    stages = rng.permutation(constants.training_stages)
+    pairs = []
+    for label in range(constants.n_labels):
+        stage = int(stages[label % len(stages)])
+        labels = np.load(constants.data_filename(constants.labels_name + constants.testing_suffix, stage))
+        pairs.append((stage, int(rng.choice(np.nonzero(labels == label)[0]))))
+    return pairs
+
+
+def read_pairs(filename):
+    pairs = []
+    with open(filename) as infile:
+        for line in infile:
+            line = line.strip()
+            if line:
+                stage, idx = line.split(',')
+                pairs.append((int(stage), int(idx)))
+    return pairs
+
+
+def save_png(pixels, filename):
+    height, width, colors = pixels.shape
+    png.from_array(pixels.reshape((height, width*colors)), 'RGB;8').save(filename)
+
+
+if __name__ == "__main__" :
+    parser = argparse.ArgumentParser(description='Montage of testing images, with their decodings and memories.')
+    parser.add_argument('-e', dest='experiment', type=int, required=True,
+                        help='experiment the images come from.')
+    group = parser.add_mutually_exclusive_group(required=False)
+    group.add_argument('-o', dest='occlusion', type=float,
+                        help='proportion of occlusion of the experiment.')
+    group.add_argument('-b', dest='bars_type', type=int,
+                        help='bars type of the experiment.')
+    parser.add_argument('-t', dest='tolerance', type=int, default=0,
+                        help='tolerance of the memories.')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('pairs', nargs='?',
+                        help='text file with a line "stage,id" per image.')
+    group.add_argument('-r', dest='random', action='store_true',
+                        help='choose an image per label at random.')
+    parser.add_argument('-s', dest='seed', type=int,
+                        help='seed for choosing images at random.')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='factor by which images are scaled up.')
+    parser.add_argument('--border', type=int, default=2,
+                        help='width of the white border around images.')
+    parser.add_argument('--out', dest='out',
+                        help='file for the montage (in the runs directory by default).')
+    args = parser.parse_args()
+
+    if args.random:
+        pairs = random_pairs(np.random.default_rng(args.seed))
+        name = 'random'
+    else:
+        if not os.path.exists(args.pairs):
+            print_error('There is no file', args.pairs)
+            exit(1)
+        pairs = read_pairs(args.pairs)
+        name = os.path.splitext(os.path.basename(args.pairs))[0]
+    if len(pairs) == 0:
+        print_error('There are no images to put together.')
+        exit(2)
+
+    pixels = montage(pairs, args.experiment, args.occlusion, args.bars_type, args.tolerance,
+        args.border, args.scale)
+    out = args.out
+    if out is None:
+        s = 'montage-' + constants.memories_directory(args.experiment, args.occlusion,
+            args.bars_type, args.tolerance) + '-' + name
+        out = constants.filename(s, extension='.png')
+    save_png(pixels, out)
+    print('Montage of', len(pairs), 'images saved in', out)
@@ -13,10 +13,28 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+""" Statistics of the training of neural networks, over many runs.
+
+Reads the histories saved by the experiments (model_stats.json, or the
+JSON of features), from any number of runs, and writes in the runs
+directory a table per fold, a table per run, and graphs of the learning
+curves of every metric, averaged among folds, with a curve per run.
+Tables include the epochs every network trained for before stopping, and
+the time epochs took, when the history has it.
+
+    python nnets_stats.py runs-a/model_stats.json runs-b/model_stats.json
+"""
+
 import sys
+import os
+import argparse
+import csv
+import gettext
 import json
 import numpy as np
-from matplotlib import pyplot as plt
+
+import constants
+import plotting
 
 # Keys for data
 LOSS = 'loss'
@@ -25,98 +43,164 @@ A_LOSS = 'autoencoder_loss'
 C_ACCURACY = 'classification_accuracy'
 A_ACCURACY = 'autoencoder_accuracy'
 VAL = 'val_'
+EPOCH_TIME = 'epoch_time'
+
+stats_prefix = 'nnets_stats'
 
 
-def trplot(a_measure, b_measure, a_label, b_label, max_epoch, nn):
-    epoch = len(a_measure)
-    epoch = max_epoch if epoch > max_epoch else epoch
+def print_error(*s):
+    print('Error:', *s, file = sys.stderr)
 
-    fig = plt.figure()
-    x = np.arange(0,epoch)
-    plt.errorbar(x, a_measure[:epoch], fmt='b-.', label=a_label)
-    plt.errorbar(x, b_measure[:epoch], fmt='r--,', label=b_label)
-    plt.legend(loc=0)
 
-    plt.suptitle(f'Neural net No. {nn}')
-    plt.show()
-    
+def load_history(filename):
+    """ Returns the training and testing statistics of a history file.
 
-def teplot(a_measure, b_measure, a_label, b_label):
-    fig = plt.figure()
-    x = np.arange(0,len(a_measure))
-    plt.errorbar(x, a_measure, fmt='b-.', label=a_label)
-    plt.errorbar(x, b_measure, fmt='r--,', label=b_label)
-    plt.legend(loc=0)
+    Training statistics have a list of values per metric (one per epoch),
+    while testing ones have a single value, so files with testing
+    statistics only (those of features) are read as well.
+    """
+    with open(filename) as json_file:
+        history = json.load(json_file)['history']
+    training = [h for h in history if any(isinstance(v, list) for v in h.values())]
+    testing = [h for h in history if not any(isinstance(v, list) for v in h.values())]
+    return training, testing
 
-    plt.suptitle(f'Average results')
-    plt.show()
 
+def curves(training, metric, max_epoch = None):
+    """ Returns the values of a metric as a matrix of folds x epochs.
 
-def training_stats(data, max_epoch):
-    """ Analyse neural nets training data. 
-        
-        Training stats data is a list of dictionaries with the full
-        set of keys declared above.
+    Folds that stopped earlier are padded with undefined values.
     """
-    n = 0
-    for d in data:
-        trplot(d[LOSS], d[VAL+LOSS], LOSS, VAL+LOSS,max_epoch,n)
-        trplot(d[C_LOSS], d[VAL+C_LOSS], C_LOSS, VAL+C_LOSS,max_epoch,n)
-        trplot(d[A_LOSS], d[VAL+A_LOSS], A_LOSS, VAL+A_LOSS,max_epoch,n)
-        trplot(d[C_ACCURACY], d[VAL+C_ACCURACY], C_ACCURACY, VAL+C_ACCURACY,max_epoch,n)
-        trplot(d[A_ACCURACY], d[VAL+A_ACCURACY], A_ACCURACY, VAL+A_ACCURACY,max_epoch,n)
-        n += 1
-
-
-def testing_stats(data):
-    """ Analyse neural nets testing data. 
+    lengths = [len(h.get(metric, [])) for h in training]
+    epochs = max(lengths, default=0)
+    if max_epoch is not None:
+        epochs = min(epochs, max_epoch)
+    values = np.full((len(training), epochs), np.nan)
+    for i, h in enumerate(training):
+        n = min(lengths[i], epochs)
+        values[i, :n] = h.get(metric, [])[:n]
+    return values
+
+
+def metrics_of(histories):
+    """ Returns the metrics in the histories, in order of appearance.
     """
+    keys = []
+    for h in histories:
+        keys += [k for k in h if k not in keys]
+    return keys
 
-    n = len(data)
-    m = {LOSS: [],
-         C_LOSS: [],
-         A_LOSS: [],
-         C_ACCURACY: [],
-         A_ACCURACY: []}
-    
-    for d in data:
-        m[LOSS].append(d[LOSS])
-        m[C_LOSS].append(d[C_LOSS])
-        m[A_LOSS].append(d[A_LOSS])
-        m[C_ACCURACY].append(d[C_ACCURACY])
-        m[A_ACCURACY].append(d[A_ACCURACY])
 
-    teplot(m[C_LOSS],m[A_LOSS],C_LOSS,A_LOSS)
-    teplot(m[C_ACCURACY],m[A_ACCURACY],C_ACCURACY,A_ACCURACY)
+def _mean_std(values, axis = 0):
+    # Columns with no value at all are undefined, without warnings.
+    defined = np.sum(~np.isnan(values), axis=axis)
+    total = np.nansum(values, axis=axis)
+    mean = np.divide(total, defined, out=np.full(total.shape, np.nan), where=defined > 0)
+    deviation = np.nansum(np.square(values - np.expand_dims(mean, axis)), axis=axis)
+    std = np.sqrt(np.divide(deviation, defined, out=np.full(total.shape, np.nan), where=defined > 0))
+    return mean, std
+
+
+def fold_table(training, testing, test_metrics):
+    """ Returns a row per fold: epochs, mean and total epoch time, and test metrics.
+    """
+    n_folds = max(len(training), len(testing))
+    epochs = np.full(n_folds, np.nan)
+    epochs[:len(training)] = [len(h[LOSS]) if LOSS in h else len(next(iter(h.values())))
+        for h in training]
+    times = curves(training, EPOCH_TIME)
+    epoch_time = np.full(n_folds, np.nan)
+    training_time = np.full(n_folds, np.nan)
+    if times.size:
+        epoch_time[:len(training)] = _mean_std(times, axis=1)[0]
+        training_time[:len(training)] = np.where(np.isnan(times).all(axis=1), np.nan,
+            np.nansum(times, axis=1))
+    tests = np.full((n_folds, len(test_metrics)), np.nan)
+    for i, h in enumerate(testing):
+        tests[i] = [h.get(k, np.nan) for k in test_metrics]
+    return np.column_stack((epochs, epoch_time, training_time, tests))
+
+
+def write_csv(filename, header, rows):
+    with open(filename, 'w', newline='') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def _value(v):
+    return '' if np.isnan(v) else '{:.6g}'.format(v)
+
+
+def history_stats(filenames, names, max_epoch = None):
+    """ Writes the tables and graphs of all the runs, returning the table of runs.
+    """
+    runs = [load_history(f) for f in filenames]
+    test_metrics = metrics_of([h for training, testing in runs for h in testing])
+    train_metrics = [m for m in metrics_of([h for training, testing in runs for h in training])
+        if not m.startswith(VAL) and (m != EPOCH_TIME)]
+
+    fold_columns = ['epochs', EPOCH_TIME, 'training_time'] + test_metrics
+    fold_rows = []
+    run_rows = []
+    for name, (training, testing) in zip(names, runs):
+        table = fold_table(training, testing, test_metrics)
+        fold_rows += [[name, i] + [_value(v) for v in row] for i, row in enumerate(table)]
+        mean, std = _mean_std(table) if len(table) else \
+            (np.full(len(fold_columns), np.nan), np.full(len(fold_columns), np.nan))
+        # Training time of a run is the sum over its folds.
+        total = np.nansum(table[:, 2]) if np.any(~np.isnan(table[:, 2])) else np.nan
+        run_rows.append([name, len(table), _value(total)]
+            + [_value(v) for pair in zip(mean, std) for v in pair])
+
+    write_csv(constants.csv_filename(stats_prefix + '-folds'), ['run', 'fold'] + fold_columns, fold_rows)
+    run_columns = ['run', 'folds', 'total_training_time'] \
+        + [c + suffix for c in fold_columns for suffix in ('_mean', '_stdev')]
+    write_csv(constants.csv_filename(stats_prefix + '-runs'), run_columns, run_rows)
+
+    graphs = []
+    for metric in train_metrics:
+        means = {'train': [], 'val': []}
+        stdevs = {'train': [], 'val': []}
+        for training, testing in runs:
+            for kind, key in (('train', metric), ('val', VAL + metric)):
+                mean, std = _mean_std(curves(training, key, max_epoch))
+                means[kind].append(mean)
+                stdevs[kind].append(std)
+        graphs.append(plotting.history_graph(stats_prefix + '-' + metric, metric, names,
+            means['train'], stdevs['train'], means['val'], stdevs['val']))
+    plotting.plot(*graphs)
+
+    return run_columns, run_rows
 
 
 if __name__== "__main__" :
-    if len(sys.argv) != 3:
-        print(f'Usage: {sys.argv[0]} file.json epochs.')
+    gettext.install('ame', localedir=None, names=None)
+    parser = argparse.ArgumentParser(description='Statistics of the training of neural networks.')
+    parser.add_argument('histories', nargs='+',
+                        help='JSON files with the histories of runs.')
+    parser.add_argument('-n', dest='names', nargs='+',
+                        help='names of the runs (their files by default).')
+    parser.add_argument('-e', dest='max_epoch', type=int,
+                        help='last epoch shown in graphs.')
+    parser.add_argument('--graph-format', dest='graph_format', choices=plotting.formats, default='svg',
+                        help='format of the pictures of graphs.')
+    args = parser.parse_args()
+
+    names = args.names if args.names else [os.path.splitext(f)[0] for f in args.histories]
+    if len(names) != len(args.histories):
+        print_error('There must be a name per history.')
         sys.exit(1)
-
-    fname = sys.argv[1]
-    max_epoch = int(sys.argv[2])
-    
-    history = {}
-    with open(fname) as json_file:
-        history = json.load(json_file)
-    history = history['history']
-
-    # Now, history contains a list with the statistics from the neural nets.
-    # Odd elements have statistics from training and validation, while
-    # even elements have statistics from testing.
-
-    training = []
-    testing = []
-
-    odd = True
-    for s in history:
-        if odd:
-            training.append(s)
-        else:
-            testing.append(s)
-        odd = not odd
-
-    testing_stats(testing)
-    training_stats(training, max_epoch)
+    for f in args.histories:
+        if not os.path.exists(f):
+            print_error('There is no file', f)
+            sys.exit(1)
+
+    plotting.configure(graph_format=args.graph_format)
+    columns, rows = history_stats(args.histories, names, args.max_epoch)
+    shown = ['run', 'folds', 'total_training_time', 'epochs_mean', 'epochs_stdev',
+        EPOCH_TIME + '_mean', EPOCH_TIME + '_stdev']
+    shown += [c for c in columns if c.startswith(C_ACCURACY) or c.startswith('accuracy')]
+    print(', '.join(shown))
+    for row in rows:
+        print(', '.join(str(row[columns.index(c)]) for c in shown))
@@ -0,0 +1,374 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Graphs of the experiments.
+
+Making a graph has two parts. The experiments describe the graph, with the
+data it shows and its (already translated) texts, and the description is
+saved as JSON next to where the picture goes. Then the description is drawn.
+Drawing happens right away, unless it has been deferred (see configure), in
+which case it is left to the renderer,
+
+    python plotting.py [-j jobs] [--format png] [--dpi 150]
+
+which draws in parallel the graphs whose pictures are missing or older than
+their descriptions. Graphs are drawn with the Agg backend, one figure at a
+time, and figures are closed once saved.
+
+Graphs are only made by the main process of the experiments, so the drawing
+settings are kept in this module.
+"""
+
+import sys
+import argparse
+import glob
+import json
+import os
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib as mpl
+import matplotlib.pyplot as plt
+from joblib import Parallel, delayed
+
+import constants
+
+formats = ['svg', 'png', 'pdf']
+
+# Drawing settings: whether to leave drawing to the renderer, the format of
+# pictures, and their resolution (None for the one of every kind of graph).
+settings = {'defer': False, 'format': 'svg', 'dpi': None}
+
+
+def print_error(*s):
+    print('Error:', *s, file = sys.stderr)
+
+
+def configure(defer = False, graph_format = 'svg', dpi = None):
+    settings['defer'] = defer
+    settings['format'] = graph_format
+    settings['dpi'] = dpi
+
+
+def pre_graph(pre_mean, rec_mean, ent_mean, pre_std, rec_std, ent_std, \
+    tag = '', xlabels = constants.memory_sizes, xtitle = None, \
+        ytitle = None, action=None, occlusion = None, bars_type = None, tolerance = 0):
+    """ Describes a graph of precision and recall, with entropies as a colour bar.
+    """
+    if xtitle is None:
+        xtitle = _('Range Quantization Levels')
+    if ytitle is None:
+        ytitle = _('Percentage')
+
+    s = tag + 'graph_prse_MEAN' + _('-english')
+    return {'kind': 'pre',
+        'name': constants.filename(s, action, occlusion, bars_type, tolerance),
+        'dpi': 600,
+        'pre_mean': pre_mean, 'rec_mean': rec_mean, 'ent_mean': ent_mean,
+        'pre_std': pre_std, 'rec_std': rec_std, 'ent_std': ent_std,
+        'xlabels': xlabels, 'xtitle': xtitle, 'ytitle': ytitle,
+        'texts': {'precision': _('Precision'), 'recall': _('Recall'), 'entropy': _('Entropy')}}
+
+
+def size_graph(response_size, size_stdev, action=None, tolerance=0):
+    """ Describes a graph of the average number of responses per memory size.
+    """
+    s = 'graph_size_MEAN' + _('-english')
+    return {'kind': 'size',
+        'name': constants.filename(s, action, tolerance=tolerance),
+        'dpi': 600,
+        'response_size': response_size, 'size_stdev': size_stdev,
+        'texts': {'responses': _('Average number of responses'),
+            'xtitle': _('Range Quantization Levels'), 'ytitle': _('Size')}}
+
+
+def behs_graph(no_response, no_correct, no_chosen, correct, action=None, tolerance=0):
+    """ Describes a stacked bars graph of behaviours per memory size.
+    """
+    s = 'graph_behaviours_MEAN' + _('-english')
+    return {'kind': 'behs',
+        'name': constants.filename(s, action, tolerance=tolerance),
+        'dpi': 600,
+        'no_response': no_response, 'no_correct': no_correct,
+        'no_chosen': no_chosen, 'correct': correct,
+        'texts': {'correct': _('Correct response chosen'),
+            'no_chosen': _('Correct response not chosen'),
+            'no_correct': _('No correct response'), 'no_response': _('No responses'),
+            'xtitle': _('Range Quantization Levels'), 'ytitle': _('Labels')}}
+
+
+def features_graphs(domain, means, stdevs, experiment, occlusion = None, bars_type = None):
+    """ Describes the graphs of the characteristic shape of features, one per label.
+
+    The graphs are dots and lines graphs with error bars denoting standard deviations.
+    """
+    means = np.asarray(means)
+    stdevs = np.asarray(stdevs)
+    ymin = np.nanmin(means - stdevs)
+    ymax = np.nanmax(means + stdevs)
+
+    graphs = []
+    for i in constants.all_labels:
+        s = constants.features_name(experiment, occlusion, bars_type) + '-' + str(i) + _('-english')
+        graphs.append({'kind': 'features',
+            'name': constants.filename(s),
+            'dpi': 500,
+            'domain': domain, 'label': i, 'means': means[i], 'stdevs': stdevs[i],
+            'ymin': ymin, 'ymax': ymax,
+            'texts': {'xtitle': _('Features'), 'ytitle': _('Values')}})
+    return graphs
+
+
+def history_graph(name, metric, runs, train_mean, train_std, val_mean, val_std):
+    """ Describes a graph of the learning curves of a metric, one per run.
+
+    Curves are averages among folds, per epoch, shaded with their standard
+    deviations; validation curves are dashed. Undefined values (epochs no
+    fold reached) are left out.
+    """
+    return {'kind': 'history',
+        'name': constants.filename(name),
+        'dpi': 300,
+        'metric': metric, 'runs': runs,
+        'train_mean': train_mean, 'train_std': train_std,
+        'val_mean': val_mean, 'val_std': val_std,
+        'texts': {'xtitle': _('Epochs'), 'ytitle': metric,
+            'training': _('training'), 'validation': _('validation')}}
+
+
+def draw_pre(graph):
+    full_length = 100.0
+    step = 0.1
+    main_step = full_length/len(graph['xlabels'])
+    x = np.arange(0, full_length, main_step)
+
+    # One main step less because levels go on sticks, not
+    # on intervals.
+    xmax = full_length - main_step + step
+
+    # Gives space to fully show markers in the top.
+    ymax = full_length + 2
+
+    texts = graph['texts']
+    plt.errorbar(x, graph['pre_mean'], fmt='r-o', yerr=graph['pre_std'], label=texts['precision'])
+    plt.errorbar(x, graph['rec_mean'], fmt='b--s', yerr=graph['rec_std'], label=texts['recall'])
+
+    plt.xlim(0, xmax)
+    plt.ylim(0, ymax)
+    plt.xticks(x, graph['xlabels'])
+
+    plt.xlabel(graph['xtitle'])
+    plt.ylabel(graph['ytitle'])
+    plt.legend(loc=4)
+    plt.grid(True)
+
+    entropy_labels = [str(e) for e in np.around(graph['ent_mean'], decimals=1)]
+
+    cmap = mpl.colors.LinearSegmentedColormap.from_list('mycolors',['cyan','purple'])
+    Z = [[0,0],[0,0]]
+    levels = np.arange(0.0, xmax, step)
+    CS3 = plt.contourf(Z, levels, cmap=cmap)
+
+    cbar = plt.colorbar(CS3, orientation='horizontal')
+    cbar.set_ticks(x)
+    cbar.ax.set_xticklabels(entropy_labels)
+    cbar.set_label(texts['entropy'])
+
+
+def draw_size(graph):
+    response_size = graph['response_size']
+    full_length = 100.0
+    step = 0.1
+    main_step = full_length/len(response_size)
+    x = np.arange(0, full_length, main_step)
+
+    # One main step less because levels go on sticks, not
+    # on intervals.
+    xmax = full_length - main_step + step
+    ymax = constants.n_labels
+
+    texts = graph['texts']
+    plt.errorbar(x, response_size, fmt='g-D', yerr=graph['size_stdev'], label=texts['responses'])
+    plt.xlim(0, xmax)
+    plt.ylim(0, ymax)
+    plt.xticks(x, constants.memory_sizes)
+    plt.yticks(np.arange(0,ymax+1, 1), range(constants.n_labels+1))
+
+    plt.xlabel(texts['xtitle'])
+    plt.ylabel(texts['ytitle'])
+    plt.legend(loc=1)
+    plt.grid(True)
+
+
+def draw_behs(graph):
+    behaviours = np.array([graph['no_response'], graph['no_correct'],
+        graph['no_chosen'], graph['correct']], dtype=float)
+    no_response, no_correct, no_chosen, correct = \
+        behaviours / (behaviours.sum(axis=0) / 100.0)
+
+    full_length = 100.0
+    step = 0.1
+    main_step = full_length/len(constants.memory_sizes)
+    x = np.arange(0.0, full_length, main_step)
+
+    width = 5       # the width of the bars: can also be len(x) sequence
+
+    texts = graph['texts']
+    plt.bar(x, correct, width, label=texts['correct'])
+    cumm = np.array(correct)
+    plt.bar(x, no_chosen,  width, bottom=cumm, label=texts['no_chosen'])
+    cumm += np.array(no_chosen)
+    plt.bar(x, no_correct, width, bottom=cumm, label=texts['no_correct'])
+    cumm += np.array(no_correct)
+    plt.bar(x, no_response, width, bottom=cumm, label=texts['no_response'])
+
+    plt.xlim(-width, full_length + width)
+    plt.ylim(0.0, full_length)
+    plt.xticks(x, constants.memory_sizes)
+
+    plt.xlabel(texts['xtitle'])
+    plt.ylabel(texts['ytitle'])
+
+    plt.legend(loc=0)
+    plt.grid(axis='y')
+
+
+def draw_features(graph):
+    main_step = 100.0 / graph['domain']
+    xrange = np.arange(0, 100, main_step)
+    i = graph['label']
+
+    texts = graph['texts']
+    plt.errorbar(xrange, graph['means'], fmt=constants.label_formats[i],
+        yerr=graph['stdevs'], label=str(i))
+    plt.xlim(0, 100)
+    plt.ylim(graph['ymin'], graph['ymax'])
+    plt.xticks(xrange, labels='')
+
+    plt.xlabel(texts['xtitle'])
+    plt.ylabel(texts['ytitle'])
+    plt.legend(loc='right')
+    plt.grid(True)
+
+
+def draw_history(graph):
+    texts = graph['texts']
+    for i, run in enumerate(graph['runs']):
+        color = 'C' + str(i % 10)
+        for kind, style in (('train', '-'), ('val', '--')):
+            mean = np.array(graph[kind + '_mean'][i], dtype=float)
+            if np.all(np.isnan(mean)):
+                continue
+            std = np.array(graph[kind + '_std'][i], dtype=float)
+            x = np.arange(1, len(mean) + 1)
+            label = run + ' (' + texts['training' if kind == 'train' else 'validation'] + ')'
+            plt.plot(x, mean, style, color=color, label=label)
+            plt.fill_between(x, mean - std, mean + std, color=color, alpha=0.2)
+
+    plt.xlabel(texts['xtitle'])
+    plt.ylabel(texts['ytitle'])
+    plt.legend(loc=0, fontsize='small')
+    plt.grid(True)
+
+
+drawers = {'pre': (draw_pre, (6.4, 4.8)), 'size': (draw_size, (6.4, 4.8)),
+    'behs': (draw_behs, (6.4, 4.8)), 'features': (draw_features, (12, 5)),
+    'history': (draw_history, (6.4, 4.8))}
+
+
+def graph_filename(graph):
+    return graph['name'] + constants.graph_extension
+
+
+def picture_filename(graph, graph_format):
+    return graph['name'] + '.' + graph_format
+
+
+def draw(graph, graph_format = 'svg', dpi = None):
+    """ Draws a graph in a figure of its own, and saves it.
+    """
+    drawer, size = drawers[graph['kind']]
+    fig = plt.figure(figsize=size)
+    try:
+        drawer(graph)
+        fig.savefig(picture_filename(graph, graph_format),
+            dpi=graph['dpi'] if dpi is None else dpi)
+    finally:
+        plt.close(fig)
+
+
+def _jsonable(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(str(type(value)) + ' is not serializable')
+
+
+def plot(*graphs):
+    """ Saves the descriptions of the graphs, and draws them unless deferred.
+    """
+    for graph in graphs:
+        with open(graph_filename(graph), 'w') as outfile:
+            json.dump(graph, outfile, default=_jsonable)
+        if not settings['defer']:
+            draw(graph, settings['format'], settings['dpi'])
+
+
+def render_file(filename, graph_format = 'svg', dpi = None):
+    with open(filename) as infile:
+        graph = json.load(infile)
+    draw(graph, graph_format, dpi)
+    return picture_filename(graph, graph_format)
+
+
+def pending(graph_format, everything = False):
+    """ Returns the descriptions of graphs whose pictures are missing or old.
+    """
+    files = []
+    for filename in sorted(glob.glob(constants.run_path + '/*' + constants.graph_extension)):
+        picture = filename[:-len(constants.graph_extension)] + '.' + graph_format
+        if everything or not os.path.exists(picture) \
+                or (os.path.getmtime(picture) < os.path.getmtime(filename)):
+            files.append(filename)
+    return files
+
+
+if __name__ == "__main__" :
+    parser = argparse.ArgumentParser(description='Draws the graphs described by the experiments.')
+    parser.add_argument('graphs', nargs='*',
+                        help='descriptions of graphs to draw (those pending in the runs directory by default).')
+    parser.add_argument('-j', dest='n_jobs', type=int, default=constants.n_jobs,
+                        help='number of processes drawing.')
+    parser.add_argument('--format', dest='graph_format', choices=formats, default='svg',
+                        help='format of the pictures.')
+    parser.add_argument('--dpi', type=int,
+                        help='resolution of the pictures (that of every kind of graph by default).')
+    parser.add_argument('--all', dest='everything', action='store_true',
+                        help='draw again all the graphs, even those up to date.')
+    args = parser.parse_args()
+
+    files = args.graphs if args.graphs else pending(args.graph_format, args.everything)
+    if len(files) == 0:
+        print('No graphs to draw.')
+        exit(0)
+    for f in files:
+        if not os.path.exists(f):
+            print_error('There is no file', f)
+            exit(1)
+    pictures = Parallel(n_jobs=args.n_jobs, verbose=5)(
+        delayed(render_file)(f, args.graph_format, args.dpi) for f in files)
+    print('Drew', len(pictures), 'graphs.')
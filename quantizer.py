@@ -0,0 +1,141 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Quantization of features to the range of the associative memories.
+
+A quantizer is fitted once per fold with the features the memories will see,
+and maps features linearly from their calibrated bounds to the values 0 to
+msize-1 of the memories, and back. Bounds are either the same for all
+features (global), per feature (feature), or per feature leaving out the
+tails of their distributions (quantile). Quantizers are saved with the
+memories, so querying and decoding use the calibration the memories were
+filled with.
+"""
+
+import numpy as np
+
+GLOBAL_CALIBRATION = 'global'
+FEATURE_CALIBRATION = 'feature'
+QUANTILE_CALIBRATION = 'quantile'
+
+calibrations = [GLOBAL_CALIBRATION, FEATURE_CALIBRATION, QUANTILE_CALIBRATION]
+
+# Fraction of values left out at each tail by quantile calibration.
+default_tail = 0.005
+
+# Rows processed at once, so intermediates stay small.
+chunk_size = 4096
+
+
+class Quantizer(object):
+    """ Linear quantization of features into the values of memories of size msize.
+    """
+
+    def __init__(self, msize, calibration = GLOBAL_CALIBRATION, tail = default_tail):
+        if calibration not in calibrations:
+            raise ValueError('Unknown calibration ' + str(calibration))
+        self.msize = msize
+        self.calibration = calibration
+        self.tail = tail
+        self.min_value = None
+        self.max_value = None
+
+    def fit(self, *features) -> 'Quantizer':
+        """ Calibrates the bounds with all the arrays of features given.
+
+        Bounds keep the type of the features, so quantizing them computes
+        with that type too.
+        """
+        if self.calibration == QUANTILE_CALIBRATION:
+            every = np.concatenate([f.reshape((len(f), -1)) for f in features])
+            bounds = np.quantile(every, [self.tail, 1.0 - self.tail], axis=0)
+            self.min_value = bounds[0].astype(every.dtype)
+            self.max_value = bounds[1].astype(every.dtype)
+            return self
+
+        axis = None if self.calibration == GLOBAL_CALIBRATION else 0
+        minimum, maximum = None, None
+        for f in features:
+            f = f.reshape((len(f), -1))
+            for start in range(0, len(f), chunk_size):
+                chunk = f[start:start + chunk_size]
+                lowest, highest = chunk.min(axis=axis), chunk.max(axis=axis)
+                minimum = lowest if minimum is None else np.minimum(minimum, lowest)
+                maximum = highest if maximum is None else np.maximum(maximum, highest)
+        self.min_value = np.asarray(minimum)
+        self.max_value = np.asarray(maximum)
+        return self
+
+    def resized(self, msize) -> 'Quantizer':
+        """ Returns a quantizer with the same calibration for another memory size.
+        """
+        quantizer = Quantizer(msize, self.calibration, self.tail)
+        quantizer.min_value = self.min_value
+        quantizer.max_value = self.max_value
+        return quantizer
+
+    def span(self):
+        # Constant features are all mapped to zero.
+        span = self.max_value - self.min_value
+        return np.where(span == 0, np.ones_like(span), span)
+
+    def quantize(self, features, out = None):
+        """ Returns the features as values of the memories (np.int16).
+
+        Features outside the bounds are clipped to them. Works in chunks of
+        rows, writing into out if given.
+        """
+        if out is None:
+            out = np.empty(features.shape, dtype=np.int16)
+        span = self.span()
+        top = self.msize - 1
+        for start in range(0, len(features), chunk_size):
+            end = start + chunk_size
+            chunk = features[start:end] - self.min_value
+            chunk *= top
+            chunk /= span
+            np.clip(chunk, 0, top, out=chunk)
+            np.rint(chunk, out=chunk)
+            out[start:end] = chunk
+        return out
+
+    def dequantize(self, values, out = None):
+        """ Returns the features corresponding to values of the memories.
+
+        Undefined values stay undefined. Works in chunks of rows, writing
+        into out if given.
+        """
+        if out is None:
+            out = np.empty(values.shape, dtype=np.result_type(values, self.min_value, np.float32))
+        span = self.span()
+        for start in range(0, len(values), chunk_size):
+            end = start + chunk_size
+            chunk = out[start:end]
+            np.multiply(values[start:end], span, out=chunk)
+            chunk /= self.msize - 1
+            chunk += self.min_value
+        return out
+
+    def save(self, filename) -> None:
+        np.savez(filename, msize=self.msize, calibration=self.calibration,
+            tail=self.tail, min_value=self.min_value, max_value=self.max_value)
+
+    @classmethod
+    def load(cls, filename) -> 'Quantizer':
+        with np.load(filename) as data:
+            quantizer = cls(int(data['msize']), str(data['calibration']), float(data['tail']))
+            quantizer.min_value = data['min_value']
+            quantizer.max_value = data['max_value']
+        return quantizer
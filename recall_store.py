@@ -0,0 +1,103 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Storage of the features recalled from memories, per fold.
+
+Recalls of a fold are written, fill level by fill level, into a memory
+mapped array with a row per fill and testing cue (rows of a fill are
+consecutive, in the order of the cues). Which cues were accepted is kept as
+a bitmask in an index, with the labels of the cues, so rows can be selected
+by fill, cue and label, and only those read.
+"""
+
+import numpy as np
+
+import constants
+
+
+class RecallWriter(object):
+    """ Writes the recalls of a fold as they are produced.
+    """
+
+    def __init__(self, prefix, fold, n_fills, labels, domain, dtype = np.float32):
+        self.prefix = prefix
+        self.fold = fold
+        self.labels = np.asarray(labels)
+        self.n_cues = len(self.labels)
+        self.recalls = np.lib.format.open_memmap(constants.data_filename(prefix, fold),
+            mode='w+', dtype=dtype, shape=(n_fills*self.n_cues, domain))
+        self.accepted = np.zeros((n_fills, self.n_cues), dtype=bool)
+
+    def write(self, fill, features, accepted) -> None:
+        """ Writes the features recalled for every cue at a fill level.
+
+        Only rows of accepted cues are written; the rest are left untouched.
+        """
+        start = fill*self.n_cues
+        rows = np.nonzero(accepted)[0]
+        self.recalls[start + rows] = features[rows]
+        self.accepted[fill] = accepted
+
+    def close(self) -> None:
+        self.recalls.flush()
+        del self.recalls
+        np.savez(constants.recall_index_filename(self.prefix, self.fold),
+            labels=self.labels, accepted=np.packbits(self.accepted, axis=1))
+
+
+class RecallStore(object):
+    """ Reads the recalls of a fold, selecting them through the index.
+    """
+
+    def __init__(self, prefix, fold):
+        self.recalls = np.load(constants.data_filename(prefix, fold), mmap_mode='r')
+        with np.load(constants.recall_index_filename(prefix, fold)) as index:
+            self.labels = index['labels']
+            self.n_cues = len(self.labels)
+            self.accepted = np.unpackbits(index['accepted'], axis=1,
+                count=self.n_cues).astype(bool)
+        self.n_fills = len(self.accepted)
+
+    def row(self, fill, cue):
+        return fill*self.n_cues + cue
+
+    def select(self, fills = None, labels = None, accepted = None):
+        """ Returns the rows of the fills and labels given (all by default).
+
+        If accepted is given, only rows of cues accepted (or rejected, when
+        False) are returned.
+        """
+        fills = np.arange(self.n_fills) if fills is None else np.atleast_1d(fills)
+        cues = np.arange(self.n_cues) if labels is None \
+            else np.nonzero(np.isin(self.labels, labels))[0]
+        chosen = np.ones((len(fills), len(cues)), dtype=bool) if accepted is None \
+            else self.accepted[fills][:, cues] == accepted
+        rows = self.row(fills[:, np.newaxis], cues[np.newaxis, :])
+        return rows[chosen]
+
+    def tags(self, rows):
+        """ Returns the fill, cue and label of every row.
+        """
+        fills, cues = np.divmod(rows, self.n_cues)
+        return fills, cues, self.labels[cues]
+
+    def is_accepted(self, rows):
+        fills, cues = np.divmod(rows, self.n_cues)
+        return self.accepted[fills, cues]
+
+    def read(self, rows):
+        """ Returns the features recalled for the rows, reading only those.
+        """
+        return np.asarray(self.recalls[np.asarray(rows, dtype=np.int64)])
@@ -0,0 +1,344 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Recognition and recall service over saved associative memories.
+
+The server loads memories saved with associative.save_memories and answers
+requests over a Unix socket or a local TCP port. Requests and responses are
+JSON objects, one per line. A request has either a single cue,
+
+    {"cue": [3, 0, 127, ...]}
+
+or a batch of them,
+
+    {"cues": [[3, 0, 127, ...], ...], "recall": true}
+
+where cues are feature vectors already quantized to the range of the
+memories. The response has, per cue, the label chosen (-1 if no memory
+recognized it) according to one of the policies in metrics, the labels of the memories that recognized it, the number
+of mismatches against every memory and, if asked for, the recalled vector
+(null if no memory recognized the cue, and with null for undefined features).
+Servers started with --top k also answer the labels of the k memories with
+less mismatches per cue ("top"), and their mismatches ("top_mismatches"),
+ties in the order of labels.
+
+Requests arriving at the same time are coalesced into micro-batches, which
+are evaluated with the vectorized methods of the memories.
+"""
+
+import sys
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+import metrics
+from associative import load_memories, rank_memories
+
+
+def print_error(*s):
+    print('Error:', *s, file = sys.stderr)
+
+
+class MemoryService(object):
+    """ Evaluates batches of cues against a set of memories.
+    """
+
+    def __init__(self, ams, policy = metrics.ENTROPY_POLICY, seed = None, entropies = None,
+            top = None):
+        self.ams = ams
+        self.labels = np.array(sorted(ams))
+        # Sizes of the domain and range, the same for all memories.
+        self.n = ams[self.labels[0]].n
+        self.m = ams[self.labels[0]].m
+        if entropies is None:
+            entropies = [ams[k].entropy for k in self.labels]
+        self.entropies = np.asarray(entropies)
+        self.policy = policy
+        self.rng = None if seed is None else np.random.default_rng(seed)
+        # Number of memories ranked per cue in answers (None for none).
+        self.top = top
+
+    def rank(self, cues):
+        """ Returns the mismatches of every cue with every memory, and the labels
+        and mismatches of the top memories of every cue (None if not asked for).
+        """
+        _, mismatches, top, top_mismatches = rank_memories(self.ams,
+            np.asarray(cues, dtype=int), 1 if self.top is None else self.top)
+        return mismatches, None if self.top is None else (top, top_mismatches)
+
+    def choose(self, mismatches):
+        """ Returns the labels chosen and the recognition matrix.
+        """
+        tolerances = np.array([self.ams[k].t for k in self.labels])
+        recognized = mismatches <= tolerances
+
+        chosen = metrics.select_memories(recognized, self.entropies, self.policy,
+            mismatches, rng=self.rng)
+        labels = np.where(chosen >= 0, self.labels[chosen], -1)
+        return labels, recognized
+
+    def recognize(self, cues):
+        """ Returns the labels chosen, the recognition matrix and mismatches.
+        """
+        mismatches, _ = self.rank(cues)
+        labels, recognized = self.choose(mismatches)
+        return labels, recognized, mismatches
+
+    def recall(self, cues, labels):
+        """ Recalls every cue from the memory of the label chosen for it.
+
+        Values are drawn from the generator of the service, so recalls are
+        reproducible when it was given a seed.
+        """
+        cues = np.asarray(cues, dtype=int)
+        recalls = np.full(cues.shape, np.nan)
+        for k in self.labels:
+            rows = np.nonzero(labels == k)[0]
+            if len(rows) > 0:
+                recalls[rows], _ = self.ams[k].recall_many(cues[rows], self.rng)
+        return recalls
+
+    def evaluate(self, cues, recall = False):
+        """ Returns the labels chosen, the recognition matrix, mismatches, the
+        recalls (None if not asked for) and the top memories (as rank does).
+        """
+        mismatches, top = self.rank(cues)
+        labels, recognized = self.choose(mismatches)
+        recalls = self.recall(cues, labels) if recall else None
+        return labels, recognized, mismatches, recalls, top
+
+
+class MicroBatcher(object):
+    """ Coalesces concurrent requests into batches for the service.
+
+    A batch is evaluated when it reaches max_batch cues or max_delay seconds
+    after its first request arrived, whatever happens first.
+    """
+
+    def __init__(self, service, max_batch = 256, max_delay = 0.002):
+        self.service = service
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = asyncio.Queue()
+
+    async def submit(self, cues, recall):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((cues, recall, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            size = len(pending[0][0])
+            deadline = loop.time() + self.max_delay
+            while size < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            cues = np.concatenate([p[0] for p in pending], axis=0)
+            recall = any(p[1] for p in pending)
+            try:
+                # Evaluation is done out of the loop, so it keeps accepting requests.
+                result = await loop.run_in_executor(None,
+                    self.service.evaluate, cues, recall)
+            except Exception as e:
+                for _, _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            start = 0
+            for p_cues, p_recall, future in pending:
+                end = start + len(p_cues)
+                labels, recognized, mismatches, recalls, top = result
+                part = (labels[start:end], recognized[start:end], mismatches[start:end],
+                    recalls[start:end] if p_recall else None,
+                    None if top is None else tuple(t[start:end] for t in top))
+                if not future.done():
+                    future.set_result(part)
+                start = end
+
+
+def features_list(vector):
+    """ Returns a vector as a list of integers, with None for undefined values.
+    """
+    return [None if np.isnan(v) else int(v) for v in vector]
+
+
+def response(service, labels, recognized, mismatches, recalls, top):
+    answer = {
+        'labels': labels.tolist(),
+        'recognized': [service.labels[r].tolist() for r in recognized],
+        'mismatches': mismatches.tolist()
+        }
+    if recalls is not None:
+        answer['recalls'] = [None if np.isnan(r).all() else features_list(r)
+            for r in recalls]
+    if top is not None:
+        answer['top'] = top[0].tolist()
+        answer['top_mismatches'] = top[1].tolist()
+    return answer
+
+
+async def handle_client(batcher, reader, writer):
+    service = batcher.service
+    n = service.n
+    m = service.m
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        try:
+            request = json.loads(line)
+            if 'cue' in request:
+                cues = np.array([request['cue']], dtype=int)
+            else:
+                cues = np.array(request['cues'], dtype=int)
+            if (cues.ndim != 2) or (cues.shape[1] != n):
+                raise ValueError('Cues must be vectors of size ' + str(n))
+            # Checked here, so a wrong request does not fail the batch it would join.
+            if (cues.size > 0) and ((cues.min() < 0) or (cues.max() > m)):
+                raise ValueError('Values of cues must be between 0 and ' + str(m))
+            result = await batcher.submit(cues, bool(request.get('recall', False)))
+            answer = response(service, *result)
+        except Exception as e:
+            answer = {'error': str(e)}
+        writer.write((json.dumps(answer) + '\n').encode())
+        await writer.drain()
+    writer.close()
+
+
+async def serve(service, socket_path = None, port = None, max_batch = 256, max_delay = 0.002):
+    batcher = MicroBatcher(service, max_batch, max_delay)
+    handler = lambda r, w: handle_client(batcher, r, w)
+    if socket_path is None:
+        server = await asyncio.start_server(handler, '127.0.0.1', port)
+    else:
+        server = await asyncio.start_unix_server(handler, socket_path)
+    print('Serving', len(service.labels), 'memories at', socket_path or ('127.0.0.1:' + str(port)))
+
+    batching = asyncio.ensure_future(batcher.run())
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batching.cancel()
+
+
+async def open_connection(socket_path = None, port = None):
+    if socket_path is None:
+        return await asyncio.open_connection('127.0.0.1', port)
+    else:
+        return await asyncio.open_unix_connection(socket_path)
+
+
+async def load_test(cues, socket_path = None, port = None, clients = 8,
+        requests = 100, batch = 1, recall = False):
+    """ Sends requests from concurrent clients and returns their latencies.
+    """
+    latencies = []
+
+    async def client(c):
+        reader, writer = await open_connection(socket_path, port)
+        rng = np.random.default_rng(c)
+        for _ in range(requests):
+            rows = rng.integers(0, len(cues), batch)
+            request = {'cues': cues[rows].tolist(), 'recall': recall}
+            start = time.perf_counter()
+            writer.write((json.dumps(request) + '\n').encode())
+            await writer.drain()
+            answer = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - start)
+            if 'error' in answer:
+                raise RuntimeError(answer['error'])
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client(c) for c in range(clients)])
+    elapsed = time.perf_counter() - start
+    return np.array(latencies), elapsed
+
+
+if __name__ == "__main__" :
+    parser = argparse.ArgumentParser(description='Associative Memory recognition server.')
+    parser.add_argument('command', choices=['serve', 'bench'],
+                        help='run the server, or the load test against a running server.')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--socket', dest='socket_path',
+                        help='Unix socket where the server listens.')
+    group.add_argument('--port', type=int,
+                        help='local TCP port where the server listens.')
+    parser.add_argument('--memories',
+                        help='file with the memories to serve (serve only).')
+    parser.add_argument('--max-batch', type=int, default=256,
+                        help='maximum number of cues evaluated together (serve only).')
+    parser.add_argument('--max-delay', type=float, default=2.0,
+                        help='milliseconds to wait for a batch to fill up (serve only).')
+    parser.add_argument('--policy', choices=metrics.policies, default=metrics.ENTROPY_POLICY,
+                        help='how the label is chosen among memories recognizing a cue (serve only).')
+    parser.add_argument('--seed', type=int,
+                        help='seed for breaking ties at random and recalling (serve only).')
+    parser.add_argument('--top', type=int,
+                        help='number of memories with less mismatches to answer per cue (serve only).')
+    parser.add_argument('--cues',
+                        help='.npy file with quantized cues to send (bench only).')
+    parser.add_argument('--clients', type=int, default=8,
+                        help='number of concurrent clients (bench only).')
+    parser.add_argument('--requests', type=int, default=100,
+                        help='number of requests per client (bench only).')
+    parser.add_argument('--batch', type=int, default=1,
+                        help='number of cues per request (bench only).')
+    parser.add_argument('--recall', action='store_true',
+                        help='ask for recalled vectors too (bench only).')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        if args.memories is None:
+            print_error('The file of memories to serve is required.')
+            exit(1)
+        if (args.top is not None) and (args.top < 1):
+            print_error('At least a memory must be answered per cue.')
+            exit(2)
+        service = MemoryService(load_memories(args.memories), args.policy, args.seed,
+            top=args.top)
+        try:
+            asyncio.run(serve(service, args.socket_path, args.port,
+                args.max_batch, args.max_delay/1000.0))
+        except KeyboardInterrupt:
+            pass
+    else:
+        if args.cues is None:
+            print_error('The file of cues to send is required.')
+            exit(1)
+        cues = np.load(args.cues).astype(int)
+        latencies, elapsed = asyncio.run(load_test(cues, args.socket_path, args.port,
+            args.clients, args.requests, args.batch, args.recall))
+        latencies *= 1000.0
+        print(f'Requests: {len(latencies)}, cues per request: {args.batch}, ' \
+            + f'clients: {args.clients}')
+        print(f'Throughput: {len(latencies)*args.batch/elapsed:.1f} cues/s')
+        print(f'Latency (ms): p50 {np.percentile(latencies, 50):.3f}, ' \
+            + f'p99 {np.percentile(latencies, 99):.3f}, max {latencies.max():.3f}')
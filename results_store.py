@@ -0,0 +1,327 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Store of the measures of all the experiments, in a SQLite table.
+
+The table has a row per run, experiment, fold, memory size, fill, tolerance,
+occlusion, bars type and memory. Memory -1 stands for the memories as a
+whole, whose rows hold the behaviours and overall precision and recall.
+Fill is the percentage of the filling corpus registered, and is undefined
+(NULL) when all of it was, as are occlusion and bars type when not used.
+Rows are appended as folds are finished, and are read back selecting only
+the columns and rows needed, as in
+
+    store.select(['msize', 'precision'], experiment=1, tolerance=0, memory=-1)
+
+which returns a dictionary of numpy arrays, one per column. Measures are
+also summarized over folds per group of rows, in tables across runs and in
+graphs of precision, recall and entropy, as in
+
+    python results_store.py run msize --table precision -w experiment=1 memory=-1
+    python results_store.py --graph -w experiment=3 tolerance=0
+"""
+
+import sys
+import argparse
+import gettext
+import sqlite3
+import time
+
+import numpy as np
+
+import constants
+import plotting
+
+key_columns = ['run', 'experiment', 'fold', 'msize', 'fill', 'tolerance',
+    'occlusion', 'bars_type', 'memory']
+value_columns = ['precision', 'recall', 'entropy', 'mismatches', 'no_response',
+    'no_correct_response', 'no_correct_chosen', 'correct_response', 'mean_responses']
+columns = key_columns + value_columns
+
+# Columns of behaviours, and their index in arrays of behaviours.
+behaviour_columns = {'no_response': constants.no_response_idx,
+    'no_correct_response': constants.no_correct_response_idx,
+    'no_correct_chosen': constants.no_correct_chosen_idx,
+    'correct_response': constants.correct_response_idx,
+    'mean_responses': constants.mean_responses_idx,
+    'precision': constants.precision_idx,
+    'recall': constants.recall_idx}
+
+_types = {'run': 'TEXT', 'occlusion': 'REAL'}
+
+SYSTEM = -1
+
+
+def print_error(*s):
+    print('Error:', *s, file = sys.stderr)
+
+
+def results_filename():
+    return constants.filename('results', extension='.sqlite')
+
+
+class ResultsStore(object):
+    """ Appends and selects rows of measures.
+
+    Rows appended are tagged with the run given, or with the time the store
+    was opened.
+    """
+
+    def __init__(self, filename = None, run = None):
+        self.filename = results_filename() if filename is None else filename
+        self.run = time.strftime('%Y%m%d-%H%M%S') if run is None else run
+        self.connection = sqlite3.connect(self.filename)
+        definitions = [c + ' ' + _types.get(c, 'INTEGER') for c in key_columns] \
+            + [c + ' REAL' for c in value_columns]
+        self.connection.execute('CREATE TABLE IF NOT EXISTS measures ('
+            + ', '.join(definitions) + ')')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS measures_keys ON measures '
+            + '(experiment, tolerance, msize, fill, run)')
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def append(self, **values) -> int:
+        """ Appends the rows given as columns, and returns how many there were.
+
+        Values may be arrays or scalars, and are broadcast against each other,
+        so a matrix of measures can be appended with vectors of its keys.
+        """
+        unknown = set(values) - set(columns)
+        if unknown:
+            raise ValueError('Unknown columns ' + str(sorted(unknown)))
+        values.setdefault('run', self.run)
+        names = list(values)
+        arrays = np.broadcast_arrays(*[np.asarray(values[c], dtype=object) for c in names])
+        rows = list(zip(*[a.ravel().tolist() for a in arrays]))
+        rows = [tuple(_plain(v) for v in row) for row in rows]
+        self.connection.executemany('INSERT INTO measures (' + ', '.join(names) + ') VALUES ('
+            + ', '.join('?'*len(names)) + ')', rows)
+        self.connection.commit()
+        return len(rows)
+
+    def append_sizes(self, experiment, fold, tolerances, msizes, precision, recall,
+            entropies, behaviours) -> int:
+        """ Appends the measures of memories of every size, for every tolerance.
+
+        Precision and recall are tolerances x sizes x memories, entropies are
+        sizes x memories, and behaviours tolerances x sizes x behaviours.
+        """
+        tolerances = np.asarray(tolerances)
+        msizes = np.asarray(msizes)
+        keys = dict(experiment=experiment, fold=fold)
+        n = self.append(**keys, tolerance=tolerances[:, np.newaxis, np.newaxis],
+            msize=msizes[:, np.newaxis], memory=np.arange(np.shape(precision)[-1]),
+            precision=precision, recall=recall, entropy=entropies)
+        return n + self.append(**keys, tolerance=tolerances[:, np.newaxis], msize=msizes,
+            memory=SYSTEM, **{c: behaviours[:, :, idx] for c, idx in behaviour_columns.items()})
+
+    def append_fills(self, experiment, fold, msize, occlusion, bars_type, tolerances, fills,
+            precision, recall, entropies, total_precision, total_recall, mismatches) -> int:
+        """ Appends the measures of memories filled at every level, for every tolerance.
+
+        Precision and recall are fills x tolerances x memories, entropies are
+        fills x memories, and total precision and recall fills x tolerances.
+        """
+        tolerances = np.asarray(tolerances)
+        fills = np.asarray(fills)[:, np.newaxis]
+        keys = dict(experiment=experiment, fold=fold, msize=msize,
+            occlusion=occlusion, bars_type=bars_type)
+        n = self.append(**keys, fill=fills[:, :, np.newaxis],
+            tolerance=tolerances[:, np.newaxis], memory=np.arange(np.shape(precision)[-1]),
+            precision=precision, recall=recall, entropy=np.asarray(entropies)[:, np.newaxis, :])
+        return n + self.append(**keys, fill=fills, tolerance=tolerances, memory=SYSTEM,
+            precision=total_precision, recall=total_recall,
+            mismatches=np.asarray(mismatches)[:, np.newaxis])
+
+    def select(self, wanted = None, **where):
+        """ Returns the columns wanted of the rows matching where, as arrays.
+
+        Conditions are equalities, or membership when given a list, and
+        undefined values are matched with None.
+        """
+        wanted = columns if wanted is None else wanted
+        _check(wanted)
+        condition, parameters = _condition(where)
+        query = 'SELECT ' + ', '.join(wanted) + ' FROM measures' + condition
+        rows = self.connection.execute(query, parameters).fetchall()
+        selected = list(zip(*rows)) if rows else [()]*len(wanted)
+        return {c: np.array(selected[i]) for i, c in enumerate(wanted)}
+
+    def summary(self, value, by, **where):
+        """ Returns the mean and standard deviation of a value, per group of rows.
+
+        Rows matching where are grouped by the columns in by, and undefined
+        values are left out. The result has the columns of by, in order, and
+        the mean and standard deviation (as numpy.std) of every group.
+        """
+        _check([value] + list(by))
+        condition, parameters = _condition(where, [value + ' IS NOT NULL'])
+        aggregates = ['AVG(' + value + ')', 'AVG(' + value + '*' + value + ')']
+        query = 'SELECT ' + ', '.join(list(by) + aggregates) + ' FROM measures' + condition
+        if by:
+            query += ' GROUP BY ' + ', '.join(by) + ' ORDER BY ' + ', '.join(by)
+        rows = self.connection.execute(query, parameters).fetchall()
+        selected = list(zip(*rows)) if rows else [()]*(len(by) + 2)
+        summary = {c: np.array(selected[i]) for i, c in enumerate(by)}
+        mean = np.array(selected[-2], dtype=float)
+        summary['mean'] = mean
+        summary['stdev'] = np.sqrt(np.maximum(np.array(selected[-1], dtype=float) - mean**2, 0))
+        return summary
+
+    def graph(self, experiment, run = None, tolerance = 0, occlusion = None, bars_type = None):
+        """ Describes the graph of precision and recall of the memories as a whole,
+        and of the entropy of memories, in an experiment of a run (the last one
+        by default), over the folds.
+
+        Experiments 1 and 2 are shown per memory size, and the rest per fill.
+        """
+        run = self.runs()[-1] if run is None else run
+        x = 'msize' if experiment < constants.EXP_3 else 'fill'
+        where = dict(run=run, experiment=experiment, tolerance=tolerance,
+            occlusion=occlusion, bars_type=bars_type)
+        precision = self.summary('precision', [x], memory=SYSTEM, **where)
+        recall = self.summary('recall', [x], memory=SYSTEM, **where)
+        entropy = self.summary('entropy', [x], **where)
+        xtitle = None if x == 'msize' else _('Percentage of memory corpus')
+        return plotting.pre_graph(precision['mean']*100, recall['mean']*100, entropy['mean'],
+            precision['stdev']*100, recall['stdev']*100, entropy['stdev'], 'store-' + run + '-',
+            precision[x], xtitle, action=experiment, occlusion=occlusion,
+            bars_type=bars_type, tolerance=tolerance)
+
+    def runs(self):
+        rows = self.connection.execute('SELECT DISTINCT run FROM measures ORDER BY run').fetchall()
+        return [r[0] for r in rows]
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def _check(names):
+    for c in names:
+        if c not in columns:
+            raise ValueError('Unknown column ' + str(c))
+
+
+def _condition(where, conditions = ()):
+    """ Returns the WHERE clause of the conditions given, and its parameters.
+
+    Conditions are equalities, or membership when given a list, and
+    undefined values are matched with None.
+    """
+    _check(where)
+    conditions = list(conditions)
+    parameters = []
+    for c, v in where.items():
+        if v is None:
+            conditions.append(c + ' IS NULL')
+        elif isinstance(v, (list, tuple)):
+            conditions.append(c + ' IN (' + ', '.join('?'*len(v)) + ')')
+            parameters += [_plain(x) for x in v]
+        else:
+            conditions.append(c + ' = ?')
+            parameters.append(_plain(v))
+    if not conditions:
+        return '', parameters
+    return ' WHERE ' + ' AND '.join(conditions), parameters
+
+
+def _plain(value):
+    """ Turns numpy scalars into Python ones, which is what SQLite takes.
+    """
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+if __name__ == "__main__" :
+    parser = argparse.ArgumentParser(description='Selects measures from the results store.')
+    parser.add_argument('columns', nargs='*',
+                        help='columns to show (all by default), or to group rows by (with --table).')
+    parser.add_argument('-w', dest='where', nargs='+', default=[],
+                        help='conditions column=value, with comma separated values for alternatives.')
+    parser.add_argument('-f', dest='filename',
+                        help='results store (the one in the runs directory by default).')
+    group = parser.add_mutually_exclusive_group(required=False)
+    group.add_argument('--runs', action='store_true',
+                        help='list the runs in the store.')
+    group.add_argument('--table', dest='table', choices=value_columns,
+                        help='show the mean and standard deviation over folds of the value given, '
+                            + 'per group of rows.')
+    group.add_argument('--graph', action='store_true',
+                        help='draw the graph of precision, recall and entropy of the experiment '
+                            + '(and run, tolerance, occlusion or bars type) chosen with -w.')
+    args = parser.parse_args()
+    gettext.install('ame', localedir=None, names=None)
+
+    store = ResultsStore(args.filename)
+    if args.runs:
+        print('\n'.join(store.runs()))
+        exit(0)
+
+    where = {}
+    for condition in args.where:
+        if '=' not in condition:
+            print_error('Conditions must be of the form column=value:', condition)
+            exit(1)
+        column, value = condition.split('=', 1)
+        alternatives = [None if v == 'NULL' else (v if column == 'run' else float(v))
+            for v in value.split(',')]
+        where[column] = alternatives if len(alternatives) > 1 else alternatives[0]
+
+    if args.graph:
+        if (not isinstance(where.get('experiment'), float)) or (not store.runs()) \
+                or (set(where) - {'experiment', 'run', 'tolerance', 'occlusion', 'bars_type'}):
+            print_error('Graphs are drawn for an experiment (and run, tolerance, occlusion '
+                + 'or bars type) of a store with measures.')
+            exit(2)
+        bars_type = where.get('bars_type')
+        graph = store.graph(int(where['experiment']), where.get('run'),
+            int(where.get('tolerance', 0)), where.get('occlusion'),
+            None if bars_type is None else int(bars_type))
+        if len(graph['pre_mean']) == 0:
+            print_error('There are no measures of the experiment chosen.')
+            exit(2)
+        plotting.plot(graph)
+        print(plotting.picture_filename(graph, plotting.settings['format']))
+        exit(0)
+
+    if args.table is not None:
+        try:
+            summary = store.summary(args.table, args.columns, **where)
+        except ValueError as e:
+            print_error(e)
+            exit(1)
+        wanted = args.columns + ['mean', 'stdev']
+        print(','.join(wanted))
+        for row in zip(*[summary[c] for c in wanted]):
+            print(','.join('' if v is None else str(v) for v in row))
+        exit(0)
+
+    wanted = args.columns if args.columns else columns
+    try:
+        selected = store.select(wanted, **where)
+    except ValueError as e:
+        print_error(e)
+        exit(1)
+    print(','.join(wanted))
+    for row in zip(*[selected[c] for c in wanted]):
+        print(','.join('' if v is None else str(v) for v in row))
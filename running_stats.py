@@ -0,0 +1,96 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Running means and variances of features, per label.
+
+Statistics are updated chunk by chunk with the parallel algorithm of Chan
+et al. (Welford's, for a chunk of one), so data is never held in memory all
+at once, and partial statistics computed elsewhere can be merged.
+"""
+
+import numpy as np
+
+import constants
+
+# Rows read at once from the files of features.
+chunk_size = 8192
+
+
+class RunningStats(object):
+    """ Count, mean and sum of squared deviations of vectors, per label.
+    """
+
+    def __init__(self, n_labels, domain):
+        self.count = np.zeros(n_labels, dtype=np.int64)
+        self.mean = np.zeros((n_labels, domain), dtype=np.float64)
+        self.m2 = np.zeros((n_labels, domain), dtype=np.float64)
+
+    def add(self, features, labels) -> None:
+        """ Adds a chunk of feature vectors with their labels.
+        """
+        features = np.asarray(features, dtype=np.float64)
+        labels = np.asarray(labels).ravel()
+        n_labels = len(self.count)
+        members = (labels == np.arange(n_labels)[:, np.newaxis]).astype(np.float64)
+
+        count = np.bincount(labels, minlength=n_labels)
+        present = count > 0
+        mean = np.zeros(self.mean.shape)
+        mean[present] = (members[present] @ features) / count[present, np.newaxis]
+        m2 = members @ np.square(features - mean[labels])
+
+        other = RunningStats(n_labels, self.mean.shape[1])
+        other.count, other.mean, other.m2 = count, mean, m2
+        self.merge(other)
+
+    def merge(self, other) -> None:
+        """ Adds the statistics of other, computed with other vectors.
+        """
+        count = self.count + other.count
+        present = count > 0
+        weight = np.zeros(len(count))
+        weight[present] = other.count[present] / count[present]
+        delta = other.mean - self.mean
+        self.mean += delta * weight[:, np.newaxis]
+        self.m2 += other.m2 + np.square(delta) * (self.count * weight)[:, np.newaxis]
+        self.count = count
+
+    def variance(self):
+        """ Returns the (population) variance per label, as np.var does.
+        """
+        variance = np.full(self.m2.shape, np.nan)
+        present = self.count > 0
+        variance[present] = self.m2[present] / self.count[present, np.newaxis]
+        return variance
+
+    def std(self):
+        return np.sqrt(self.variance())
+
+
+def stats_from_files(features_prefix, labels_prefix, n_labels = constants.n_labels):
+    """ Computes the statistics of the features saved for every fold.
+
+    Files of features are read through memory maps, a chunk at a time.
+    """
+    stats = None
+    for fold in range(constants.training_stages):
+        features = np.load(constants.data_filename(features_prefix, fold), mmap_mode='r')
+        labels = np.load(constants.data_filename(labels_prefix, fold))
+        if stats is None:
+            stats = RunningStats(n_labels, features.shape[1])
+        for start in range(0, len(labels), chunk_size):
+            end = start + chunk_size
+            stats.add(features[start:end], labels[start:end])
+    return stats
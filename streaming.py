@@ -0,0 +1,210 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Memories that keep learning from a stream of feature vectors.
+
+Features arrive in micro-batches of (features, labels), already quantized
+to the range of the memories, from an iterator or a queue. Every batch is
+registered in copies of the memories it touches (copy on write), and the
+number of marked cells per feature and the entropy of those memories are
+updated from the cells the batch marks for the first time. The result is
+published as a new snapshot, so queries always see memories, counts and
+entropies of the same batch, and never wait for registration.
+
+    python streaming.py features.npy labels.npy -m 128 --batch 64 --out memories.amr
+"""
+
+import sys
+import argparse
+import threading
+import time
+
+import numpy as np
+
+import metrics
+from assignment import grouped
+from associative import AssociativeMemory, save_memories
+from recognition_server import MemoryService
+
+
+def print_error(*s):
+    print('Error:', *s, file = sys.stderr)
+
+
+def entropies(counts, n):
+    """ Returns the entropy of every memory, given its marked cells per feature.
+
+    It is the entropy property of AssociativeMemory, for every row of counts.
+    """
+    counts = np.atleast_2d(counts)
+    logs = np.log2(counts, out=np.zeros(counts.shape), where=counts > 0)
+    return logs.sum(axis=1) / n
+
+
+class Snapshot(object):
+    """ Memories, their marked cells per feature and entropies, after a batch.
+
+    Snapshots are never changed once published.
+    """
+
+    def __init__(self, version, ams, counts, entropies, vectors):
+        self.version = version
+        self.ams = ams
+        self.counts = counts
+        self.entropies = entropies
+        self.vectors = vectors
+
+    def service(self, policy = metrics.ENTROPY_POLICY, seed = None, top = None):
+        """ Returns a service answering queries against this snapshot.
+        """
+        return MemoryService(self.ams, policy, seed, self.entropies, top)
+
+
+class StreamingMemories(object):
+    """ Memories filled by micro-batches, queried through snapshots.
+
+    Labels are kept by the memories of the assignment (a memory per label
+    by default). Batches may be ingested by a single thread at a time,
+    while any number of threads take snapshots.
+    """
+
+    def __init__(self, n, m, tolerance = 0, assignment = None, ams = None):
+        self.n = n
+        self.m = m
+        self.assignment = grouped(1) if assignment is None else assignment
+        if ams is None:
+            ams = {k: AssociativeMemory(n, m, tolerance)
+                for k in range(self.assignment.n_memories)}
+        if sorted(ams) != list(range(self.assignment.n_memories)):
+            raise ValueError('There must be a memory per memory of the assignment')
+        counts = np.stack([ams[k].column_counts() for k in sorted(ams)])
+        self._snapshot = Snapshot(0, dict(ams), counts, entropies(counts, n), 0)
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> Snapshot:
+        """ Returns the memories as they were after the last batch ingested.
+        """
+        return self._snapshot
+
+    def ingest(self, features, labels) -> Snapshot:
+        """ Registers a micro-batch and publishes the snapshot that includes it.
+        """
+        features = np.asarray(features).reshape((-1, self.n))
+        labels = np.asarray(labels)
+        with self._lock:
+            current = self._snapshot
+            ams = dict(current.ams)
+            counts = current.counts.copy()
+            touched = []
+            for k, vectors in enumerate(self.assignment.split(features, labels)):
+                if len(vectors) == 0:
+                    continue
+                am = current.ams[k].copy()
+                counts[k] += am.unmarked_counts(vectors)
+                am.register_many(vectors)
+                ams[k] = am
+                touched.append(k)
+            entropy = current.entropies.copy()
+            entropy[touched] = entropies(counts[touched], self.n)
+            self._snapshot = Snapshot(current.version + 1, ams, counts, entropy,
+                current.vectors + len(features))
+            return self._snapshot
+
+    def consume(self, source, stop = None) -> Snapshot:
+        """ Ingests every batch from an iterator of (features, labels), or a queue.
+
+        A queue is read until it gives None (or stop is set); an iterator,
+        until it is exhausted.
+        """
+        if hasattr(source, 'get'):
+            source = iter(source.get, None)
+        for features, labels in source:
+            self.ingest(features, labels)
+            if (stop is not None) and stop.is_set():
+                break
+        return self._snapshot
+
+    def start(self, source, stop = None) -> threading.Thread:
+        """ Consumes the source in a thread of its own, which is returned.
+        """
+        thread = threading.Thread(target=self.consume, args=(source, stop), daemon=True)
+        thread.start()
+        return thread
+
+    def save(self, filename) -> None:
+        save_memories(self._snapshot.ams, filename)
+
+
+class StreamingService(MemoryService):
+    """ Service that answers every batch of cues with the latest snapshot.
+
+    It may take the place of MemoryService in recognition_server.
+    """
+
+    def __init__(self, memories, policy = metrics.ENTROPY_POLICY, seed = None, top = None):
+        self.memories = memories
+        self.labels = np.arange(memories.assignment.n_memories)
+        self.n = memories.n
+        self.m = memories.m
+        self.policy = policy
+        self.rng = None if seed is None else np.random.default_rng(seed)
+        self.top = top
+
+    def evaluate(self, cues, recall = False):
+        service = self.memories.snapshot().service(self.policy, self.rng, self.top)
+        return service.evaluate(cues, recall)
+
+
+def batches(features, labels, size):
+    """ Returns the micro-batches of features and labels, in order.
+    """
+    for start in range(0, len(features), size):
+        yield features[start:start + size], labels[start:start + size]
+
+
+if __name__ == "__main__" :
+    parser = argparse.ArgumentParser(description='Fills memories from a stream of micro-batches.')
+    parser.add_argument('features',
+                        help='.npy file with quantized feature vectors.')
+    parser.add_argument('labels',
+                        help='.npy file with their labels.')
+    parser.add_argument('-m', dest='msize', type=int, required=True,
+                        help='size of the range of the memories.')
+    parser.add_argument('-t', dest='tolerance', type=int, default=0,
+                        help='tolerance of the memories.')
+    parser.add_argument('--batch', type=int, default=64,
+                        help='number of vectors per micro-batch.')
+    parser.add_argument('--out',
+                        help='file where the memories are saved at the end.')
+    args = parser.parse_args()
+
+    if args.batch < 1:
+        print_error('Micro-batches must have at least a vector.')
+        exit(1)
+    features = np.load(args.features).astype(int)
+    labels = np.load(args.labels).astype(int)
+    if len(features) != len(labels):
+        print_error('There must be a label per feature vector.')
+        exit(2)
+
+    memories = StreamingMemories(features.shape[1], args.msize, args.tolerance)
+    start = time.perf_counter()
+    snapshot = memories.consume(batches(features, labels, args.batch))
+    elapsed = time.perf_counter() - start
+    print(f'Batches: {snapshot.version}, vectors: {snapshot.vectors}, ' \
+        + f'{snapshot.vectors/elapsed:.1f} vectors/s')
+    print('Entropies:', ', '.join(f'{e:.3f}' for e in snapshot.entropies))
+    if args.out is not None:
+        memories.save(args.out)
@@ -0,0 +1,77 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Memories saved and loaded back, memory mapped (packed) or not, are the
+# memories saved: same cells, mismatches and recalls.
+
+import os
+import tempfile
+import numpy as np
+from associative import AssociativeMemory, AssociativeMemoryError, \
+    PackedAssociativeMemory, SparseAssociativeMemory, load_memories, save_memories
+
+# A number of features that does not fill the last byte of packed rows.
+n, m = 45, 16
+rng = np.random.default_rng(11)
+ams = {}
+for key, tolerance in [(3, 0), (0, 2), (7, 5)]:
+    am = AssociativeMemory(n, m, tolerance)
+    am.register_many(rng.integers(0, m, (30 + 10*key, n)))
+    am.fill = 30 + 10*key
+    ams[key] = am
+sparse = SparseAssociativeMemory(n, m, 1)
+sparse.register_many(rng.integers(0, 2, (5, n)))
+ams[9] = sparse
+cues = np.concatenate((rng.integers(0, m, (40, n)), np.full((1, n), m)))
+
+filename = os.path.join(tempfile.mkdtemp(), 'memories.amr')
+save_memories(ams, filename)
+for mmap in [False, True]:
+    loaded = load_memories(filename, mmap)
+    assert list(loaded) == list(ams)
+    for key in ams:
+        am, other = ams[key], loaded[key]
+        assert isinstance(other, PackedAssociativeMemory if mmap else AssociativeMemory)
+        assert (other.n, other.m, other.t, other.fill) == (am.n, am.m, am.t, am.fill)
+        assert np.array_equal(other.relation, am.relation)
+        assert np.array_equal(other.mismatches_many(cues), am.mismatches_many(cues))
+        assert all(other.recognize(c) == am.recognize(c) for c in cues)
+        for i in range(n):
+            assert np.array_equal(other.column(i), am.column(i))
+        recalls, accepted = other.recall_many(cues, np.random.default_rng(5))
+        expected, expected_accepted = am.recall_many(cues, np.random.default_rng(5))
+        assert np.array_equal(accepted, expected_accepted)
+        assert np.array_equal(recalls, expected, equal_nan=True)
+    del loaded
+
+# Packed memories are read only, but their copies are not.
+packed = load_memories(filename)[3]
+try:
+    packed.register(cues[0])
+    assert False
+except AssociativeMemoryError:
+    pass
+copy = packed.copy()
+copy.register(cues[0])
+assert copy.recognize(cues[0])
+assert np.array_equal(packed.relation, ams[3].relation)
+del packed
+
+# A single memory is saved in the same format.
+single = os.path.join(os.path.dirname(filename), 'memory.amr')
+ams[7].save(single)
+assert np.array_equal(AssociativeMemory.load(single, mmap=False).relation, ams[7].relation)
+
+print('Memories loaded back as they were saved.')
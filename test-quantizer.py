@@ -0,0 +1,89 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Quantizers are calibrated with the bounds of every calibration, whatever
+# the chunks features are processed in, and map features into the range of
+# the memories and back.
+
+import os
+import tempfile
+import numpy as np
+
+import quantizer
+from quantizer import Quantizer, GLOBAL_CALIBRATION, FEATURE_CALIBRATION, \
+    QUANTILE_CALIBRATION
+
+msize = 16
+rng = np.random.default_rng(13)
+# Features with bounds of their own, and a constant one.
+training = rng.normal(size=(1000, 6)).astype(np.float32) * np.arange(1, 7, dtype=np.float32)
+training[:, 5] = 2.5
+testing = rng.normal(size=(300, 6)).astype(np.float32)
+testing[:, 5] = 2.5
+every = np.concatenate((training, testing))
+
+q = Quantizer(msize, GLOBAL_CALIBRATION).fit(training, testing)
+assert q.min_value == every.min() and q.max_value == every.max()
+assert q.min_value.dtype == np.float32
+
+q = Quantizer(msize, FEATURE_CALIBRATION).fit(training, testing)
+assert np.array_equal(q.min_value, every.min(axis=0))
+assert np.array_equal(q.max_value, every.max(axis=0))
+
+q = Quantizer(msize, QUANTILE_CALIBRATION, tail=0.01).fit(training, testing)
+assert np.allclose(q.min_value, np.quantile(every, 0.01, axis=0))
+assert np.allclose(q.max_value, np.quantile(every, 0.99, axis=0))
+
+# Bounds and values do not depend on the size of chunks.
+chunked = []
+for size in [quantizer.chunk_size, 7]:
+    quantizer.chunk_size = size
+    q = Quantizer(msize, FEATURE_CALIBRATION).fit(training, testing)
+    chunked.append((q.min_value, q.max_value, q.quantize(testing), q.dequantize(q.quantize(testing))))
+for a, b in zip(*chunked):
+    assert np.array_equal(a, b)
+
+# Values are in range, features within bounds come back within half a step,
+# and constant features are mapped to zero.
+for calibration in [GLOBAL_CALIBRATION, FEATURE_CALIBRATION]:
+    q = Quantizer(msize, calibration).fit(training, testing)
+    values = q.quantize(testing)
+    assert values.dtype == np.int16
+    assert (values.min() >= 0) and (values.max() <= msize - 1)
+    step = (q.max_value - q.min_value) / (msize - 1)
+    error = np.abs(q.dequantize(values) - testing)
+    assert np.all(error <= step/2 + 1e-5)
+q = Quantizer(msize, FEATURE_CALIBRATION).fit(training, testing)
+assert np.all(q.quantize(testing)[:, 5] == 0)
+q = Quantizer(msize, QUANTILE_CALIBRATION).fit(training, testing)
+values = q.quantize(every)
+assert (values.min() == 0) and (values.max() == msize - 1)
+
+# Undefined values stay undefined.
+values = q.quantize(testing).astype(float)
+values[0, 1] = np.nan
+assert np.isnan(q.dequantize(values)[0, 1])
+
+# Saved quantizers, and those resized, keep their calibration.
+filename = os.path.join(tempfile.mkdtemp(), 'quantizer.npz')
+q.save(filename)
+loaded = Quantizer.load(filename)
+assert (loaded.msize, loaded.calibration, loaded.tail) == (q.msize, q.calibration, q.tail)
+assert np.array_equal(loaded.quantize(testing), q.quantize(testing))
+resized = q.resized(2*msize)
+assert np.array_equal(resized.min_value, q.min_value)
+assert resized.quantize(every).max() == 2*msize - 1
+
+print('Quantizers calibrated and quantize as expected.')
@@ -0,0 +1,74 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Recalls written fill by fill are selected back from the store by fill,
+# label and acceptance, and read as they were written.
+
+import tempfile
+import numpy as np
+
+import constants
+from recall_store import RecallWriter, RecallStore
+
+constants.run_path = tempfile.mkdtemp()
+
+n_fills, n_cues, domain, fold = 4, 37, 5, 2
+rng = np.random.default_rng(17)
+labels = rng.integers(0, 10, n_cues)
+features = rng.random((n_fills, n_cues, domain)).astype(np.float32)
+# Cues are accepted more often as memories are filled.
+accepted = rng.random((n_fills, n_cues)) < np.linspace(0.2, 0.9, n_fills)[:, np.newaxis]
+
+writer = RecallWriter('recalls', fold, n_fills, labels, domain)
+for fill in range(n_fills):
+    writer.write(fill, features[fill], accepted[fill])
+writer.close()
+
+store = RecallStore('recalls', fold)
+assert store.n_fills == n_fills and store.n_cues == n_cues
+assert np.array_equal(store.labels, labels)
+assert np.array_equal(store.accepted, accepted)
+
+# All rows, in order of fill and cue.
+rows = store.select()
+assert np.array_equal(rows, np.arange(n_fills*n_cues))
+fills, cues, row_labels = store.tags(rows)
+assert np.array_equal(fills, np.repeat(np.arange(n_fills), n_cues))
+assert np.array_equal(cues, np.tile(np.arange(n_cues), n_fills))
+assert np.array_equal(row_labels, labels[cues])
+assert np.array_equal(store.is_accepted(rows), accepted.ravel())
+
+# Selection by fill, label and acceptance.
+for chosen_fills, chosen_labels, acceptance in [(None, None, True), (2, None, None),
+        ([0, 3], [1, 4, 7], None), ([1, 2], 3, False), (3, [0, 9], True)]:
+    rows = store.select(chosen_fills, chosen_labels, acceptance)
+    fills, cues, row_labels = store.tags(rows)
+    expected = np.ones((n_fills, n_cues), dtype=bool)
+    if chosen_fills is not None:
+        expected[np.setdiff1d(np.arange(n_fills), chosen_fills)] = False
+    if chosen_labels is not None:
+        expected[:, ~np.isin(labels, chosen_labels)] = False
+    if acceptance is not None:
+        expected &= accepted == acceptance
+    assert np.array_equal(rows, np.flatnonzero(expected))
+
+# Only accepted rows were written.
+rows = store.select(accepted=True)
+fills, cues, _ = store.tags(rows)
+assert np.array_equal(store.read(rows), features[fills, cues])
+rows = store.select(accepted=False)
+assert np.all(store.read(rows) == 0)
+
+print('Recalls selected and read as they were written.')
@@ -0,0 +1,82 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Measures of sweeps over several tolerances are read back from the
+# results store with the keys they were measured with.
+
+import os
+import tempfile
+import numpy as np
+
+import constants
+from results_store import ResultsStore, SYSTEM
+
+directory = tempfile.mkdtemp()
+store = ResultsStore(os.path.join(directory, 'results.sqlite'), 'check')
+
+msizes = np.array(constants.memory_sizes)
+fills = np.array(constants.memory_fills)
+n_memories = 10
+
+# Values tell the tolerance, size (or fill) and memory they belong to.
+for fold, n_tolerances in enumerate([2, len(msizes)]):
+    tolerances = np.arange(n_tolerances)*5
+    t, s, m = np.meshgrid(np.arange(n_tolerances), np.arange(len(msizes)),
+        np.arange(n_memories), indexing='ij')
+    precision = 10000*t + 100*s + m
+    behaviours = np.zeros((n_tolerances, len(msizes), constants.n_behaviours))
+    behaviours[:, :, constants.precision_idx] = 100*t[:, :, 0] + s[:, :, 0]
+    store.append_sizes(1, fold, tolerances, msizes, precision, precision,
+        np.zeros((len(msizes), n_memories)), behaviours)
+
+    rows = store.select(['tolerance', 'msize', 'memory', 'precision'], experiment=1, fold=fold)
+    memories = rows['memory'] >= 0
+    assert memories.sum() == n_tolerances*len(msizes)*n_memories
+    expected = 10000*(rows['tolerance']//5) + 100*np.searchsorted(msizes, rows['msize']) \
+        + rows['memory']
+    assert np.array_equal(rows['precision'][memories], expected[memories])
+    system = rows['memory'] == SYSTEM
+    assert system.sum() == n_tolerances*len(msizes)
+    expected = 100*(rows['tolerance']//5) + np.searchsorted(msizes, rows['msize'])
+    assert np.array_equal(rows['precision'][system], expected[system])
+
+    t, f, m = np.meshgrid(np.arange(len(fills)), np.arange(n_tolerances),
+        np.arange(n_memories), indexing='ij')
+    precision = 10000*f + 100*t + m
+    totals = precision[:, :, 0]
+    store.append_fills(3, fold, 16, None, None, tolerances, fills, precision, precision,
+        np.zeros((len(fills), n_memories)), totals, totals, np.zeros(len(fills)))
+
+    rows = store.select(['tolerance', 'fill', 'memory', 'precision'], experiment=3, fold=fold)
+    expected = 10000*(rows['tolerance']//5) + 100*np.searchsorted(fills, rows['fill']) \
+        + np.maximum(rows['memory'], 0)
+    assert len(rows['memory']) == n_tolerances*len(fills)*(n_memories + 1)
+    assert np.array_equal(rows['precision'], expected)
+
+# Summaries over folds are those of the rows selected.
+rows = store.select(['fold', 'msize', 'precision'], experiment=1, tolerance=5, memory=SYSTEM)
+summary = store.summary('precision', ['msize'], experiment=1, tolerance=5, memory=SYSTEM)
+assert np.array_equal(summary['msize'], msizes)
+for i, msize in enumerate(msizes):
+    values = rows['precision'][rows['msize'] == msize]
+    assert len(values) == 2
+    assert np.isclose(summary['mean'][i], values.mean())
+    assert np.isclose(summary['stdev'][i], values.std())
+summary = store.summary('mismatches', ['fold', 'fill'], experiment=3)
+assert len(summary['fold']) == 2*len(fills)
+assert np.all(summary['mean'] == 0)
+
+store.close()
+print('Measures read back as they were appended.')
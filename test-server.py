@@ -0,0 +1,128 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Concurrent requests to the recognition server are answered in batches
+# with what the service answers for every cue, and wrong requests get an
+# error row of their own without failing the batch they would join. The
+# memories with less mismatches are ranked with ties in the order of labels.
+
+import asyncio
+import json
+import os
+import tempfile
+import numpy as np
+
+from associative import AssociativeMemory, rank_memories
+from recognition_server import MemoryService, open_connection, serve
+
+n, m = 16, 32
+rng = np.random.default_rng(29)
+vectors = rng.integers(0, m, (5, 40, n))
+ams = {}
+for k in range(5):
+    ams[k] = AssociativeMemory(n, m, 2)
+    ams[k].register_many(vectors[k])
+# Cues some memories recognize, and some none does.
+cues = np.concatenate((vectors[:, 0], rng.integers(0, m, (25, n))))
+
+
+class CountingService(MemoryService):
+    """ Service that keeps the size of every batch it evaluates.
+    """
+
+    def __init__(self, ams):
+        super().__init__(ams, top=3)
+        self.batches = []
+
+    def evaluate(self, cues, recall = False):
+        self.batches.append(len(cues))
+        return super().evaluate(cues, recall)
+
+
+service = CountingService(ams)
+labels, recognized, mismatches, _, _ = MemoryService(ams).evaluate(cues)
+_, _, top, top_mismatches = rank_memories(ams, cues, 3)
+
+# Memories with the same mismatches come in the order of their keys, even
+# when there are more of them than are ranked.
+many = {}
+for key in rng.permutation(500)[:300]:
+    many[key] = AssociativeMemory(n, m, 2)
+    many[key].register_many(rng.integers(0, 4, (3, n)))
+near = rng.integers(0, 4, (50, n))
+for k in [1, 3, 17, 100, 300]:
+    keys, ranked, top_keys, top_ranked = rank_memories(many, near, k)
+    assert np.array_equal(keys, np.sort(list(many)))
+    order = np.lexsort((np.broadcast_to(keys, ranked.shape), ranked), axis=1)[:, :k]
+    assert np.array_equal(top_keys, keys[order])
+    assert np.array_equal(top_ranked, np.take_along_axis(ranked, order, axis=1))
+socket_path = os.path.join(tempfile.mkdtemp(), 'memories.sock')
+
+
+async def ask(requests):
+    """ Sends requests in order through a connection and returns their answers.
+    """
+    reader, writer = await open_connection(socket_path)
+    answers = []
+    for request in requests:
+        line = request if isinstance(request, str) else json.dumps(request)
+        writer.write((line + '\n').encode())
+        await writer.drain()
+        answers.append(json.loads(await reader.readline()))
+    writer.close()
+    return answers
+
+
+async def check():
+    server = asyncio.ensure_future(serve(service, socket_path, max_batch=8, max_delay=0.05))
+    while not os.path.exists(socket_path):
+        await asyncio.sleep(0.01)
+
+    # A client per cue, all at once.
+    answers = await asyncio.gather(*[ask([{'cue': c.tolist()}]) for c in cues])
+    for i, [answer] in enumerate(answers):
+        assert answer['labels'] == [labels[i]]
+        assert answer['recognized'] == [service.labels[recognized[i]].tolist()]
+        assert answer['mismatches'] == [mismatches[i].tolist()]
+        assert answer['top'] == [top[i].tolist()]
+        assert answer['top_mismatches'] == [top_mismatches[i].tolist()]
+        assert 'recalls' not in answer
+    assert sum(service.batches) == len(cues)
+    assert len(service.batches) < len(cues)
+    assert max(service.batches) <= 8
+
+    # Wrong requests, alongside right ones that share their batches.
+    wrong = ['{"cue": [1, 2', {'cue': [1, 2, 3]}, {'cues': [[m + 1]*n]},
+        {'cues': [[-1]*n]}, {'cue': 'abc'}, {'queue': []}]
+    right = {'cues': cues[:10].tolist(), 'recall': True}
+    answers = await asyncio.gather(*[ask([w]) for w in wrong], ask([right, wrong[1], right]))
+    for [answer] in answers[:-1]:
+        assert list(answer) == ['error']
+    first, error, last = answers[-1]
+    assert list(error) == ['error']
+    for answer in [first, last]:
+        assert answer['labels'] == labels[:10].tolist()
+        assert answer['mismatches'] == mismatches[:10].tolist()
+        for label, recall in zip(answer['labels'], answer['recalls']):
+            assert (recall is None) == (label < 0)
+            if recall is not None:
+                assert len(recall) == n
+                assert all((v is None) or (0 <= v < m) for v in recall)
+
+    server.cancel()
+
+
+asyncio.run(check())
+print('Requests answered in batches, and wrong ones with errors.')
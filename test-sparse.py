@@ -0,0 +1,85 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Sparse memories behave as dense ones filled with the same vectors, while
+# sparse and once promoted, and registering vectors one by one is the same
+# as registering them at once.
+
+import numpy as np
+from associative import AssociativeMemory, SparseAssociativeMemory
+
+n, m, tolerance = 64, 32, 4
+rng = np.random.default_rng(7)
+# Features take values near a few of the range, so memories stay sparse.
+centres = rng.integers(0, m, n)
+vectors = np.clip(centres + rng.integers(-1, 2, (200, n)), 0, m - 1)
+cues = np.concatenate((vectors[:20], rng.integers(0, m, (20, n)),
+    np.full((1, n), m)))
+
+dense = AssociativeMemory(n, m, tolerance)
+sparse = SparseAssociativeMemory(n, m, tolerance)
+dense.register_many(vectors)
+sparse.register_many(vectors)
+assert sparse.sparse
+assert np.array_equal(sparse.relation, dense.relation)
+assert np.array_equal(sparse.column_counts(), dense.column_counts())
+assert sparse.entropy == dense.entropy
+assert np.array_equal(sparse.mismatches_many(cues), dense.mismatches_many(cues))
+assert all(sparse.recognize(c) == dense.recognize(c) for c in cues)
+for i in range(n):
+    assert np.array_equal(sparse.column(i), dense.column(i))
+
+# Same random stream, same recalls.
+recalls, accepted = sparse.recall_many(cues, np.random.default_rng(3))
+expected, expected_accepted = dense.recall_many(cues, np.random.default_rng(3))
+assert np.array_equal(accepted, expected_accepted)
+assert np.array_equal(recalls, expected, equal_nan=True)
+
+# Registering one by one, and in two halves merged.
+one_by_one = SparseAssociativeMemory(n, m, tolerance)
+for v in vectors:
+    one_by_one.register(v)
+assert np.array_equal(one_by_one.relation, dense.relation)
+halves = [SparseAssociativeMemory(n, m, tolerance) for _ in range(2)]
+halves[0].register_many(vectors[:100])
+halves[1].register_many(vectors[100:])
+halves[0].merge(halves[1])
+assert np.array_equal(halves[0].relation, dense.relation)
+
+# Dense one by one is also dense at once.
+dense_one_by_one = AssociativeMemory(n, m, tolerance)
+for v in vectors:
+    dense_one_by_one.register(v)
+assert np.array_equal(dense_one_by_one.relation, dense.relation)
+
+# Over the density, the memory is promoted and stays equal to the dense one.
+noise = rng.integers(0, m, (200, n))
+dense.register_many(noise)
+sparse.register_many(noise)
+assert not sparse.sparse
+assert np.array_equal(sparse.relation, dense.relation)
+assert np.array_equal(sparse.mismatches_many(cues), dense.mismatches_many(cues))
+recalls, accepted = sparse.recall_many(cues, np.random.default_rng(3))
+expected, expected_accepted = dense.recall_many(cues, np.random.default_rng(3))
+assert np.array_equal(recalls, expected, equal_nan=True)
+
+# Copies do not share cells.
+copy = SparseAssociativeMemory(n, m, tolerance)
+copy.register_many(vectors[:10])
+other = copy.copy()
+other.register_many(vectors[10:20])
+assert not np.array_equal(copy.relation, other.relation)
+
+print('Sparse memories behave as dense ones.')
@@ -0,0 +1,93 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Memories filled by micro-batches are those filled at once, and every
+# snapshot keeps the memories, counts and entropies of its batch.
+
+import queue
+import numpy as np
+
+from assignment import grouped
+from associative import AssociativeMemory
+from recognition_server import MemoryService
+from streaming import StreamingMemories, StreamingService, batches
+
+n, m, n_labels = 20, 8, 6
+rng = np.random.default_rng(19)
+features = rng.integers(0, m, (300, n))
+labels = rng.integers(0, n_labels, 300)
+assignment = grouped(2, n_labels)
+
+
+def filled(count):
+    """ Memories filled at once with the first count vectors.
+    """
+    ams = {k: AssociativeMemory(n, m, 3) for k in range(assignment.n_memories)}
+    for k, vectors in enumerate(assignment.split(features[:count], labels[:count])):
+        ams[k].register_many(vectors)
+    return ams
+
+
+memories = StreamingMemories(n, m, 3, assignment)
+snapshots = [memories.snapshot()]
+for batch in batches(features, labels, 32):
+    snapshots.append(memories.ingest(*batch))
+
+# Every snapshot, old ones included, has the memories of its batch.
+for version, snapshot in enumerate(snapshots):
+    count = min(32*version, len(features))
+    assert (snapshot.version, snapshot.vectors) == (version, count)
+    ams = filled(count)
+    for k in ams:
+        assert np.array_equal(snapshot.ams[k].relation, ams[k].relation)
+        assert np.array_equal(snapshot.counts[k], ams[k].column_counts())
+        assert np.isclose(snapshot.entropies[k], ams[k].entropy)
+
+# Memories untouched by a batch are shared with the previous snapshot.
+memories = StreamingMemories(n, m, 3, assignment)
+first = memories.ingest(features[:10], np.zeros(10, dtype=int))
+second = memories.ingest(features[10:20], np.full(10, 5))
+assert second.ams[0] is first.ams[0]
+assert second.ams[2] is not first.ams[2]
+
+# Batches from a queue, consumed in a thread while snapshots are taken.
+memories = StreamingMemories(n, m, 3, assignment)
+source = queue.Queue()
+thread = memories.start(source)
+for batch in batches(features, labels, 16):
+    source.put(batch)
+    snapshot = memories.snapshot()
+    assert np.array_equal(snapshot.counts,
+        np.stack([snapshot.ams[k].column_counts() for k in sorted(snapshot.ams)]))
+source.put(None)
+thread.join()
+snapshot = memories.snapshot()
+assert snapshot.vectors == len(features)
+ams = filled(len(features))
+for k in ams:
+    assert np.array_equal(snapshot.ams[k].relation, ams[k].relation)
+
+# The streaming service answers as a service over the latest snapshot.
+cues = rng.integers(0, m, (40, n))
+streaming = StreamingService(memories, seed=23)
+labels_chosen, recognized, mismatches, recalls, top = streaming.evaluate(cues, True)
+expected = MemoryService(ams, seed=23).evaluate(cues, True)
+assert np.array_equal(labels_chosen, expected[0])
+assert np.array_equal(recognized, expected[1])
+assert np.array_equal(mismatches, expected[2])
+assert np.array_equal(recalls, expected[3], equal_nan=True)
+assert (top is None) and (expected[4] is None)
+
+print('Snapshots keep the memories of their batches.')